@@ -1,8 +1,20 @@
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request, Response, stream_with_context
 import requests
 from flask_cors import CORS
 from collections import Counter
+import csv
+import io
+import json
 import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+from http_client import get_client
+from call_store import GRANULARITIES, PHONE_MATCHES, CallStore, metrics_to_analysis
+from call_trace import call_tracer
 
 app = Flask(__name__)
 CORS(app)
@@ -10,147 +22,578 @@ CORS(app)
 # API configuration
 API_URL = "https://api.vapi.ai/call"
 ASSISTANT_ID = "c80f483e-16c1-4d12-a04a-a3c58d3c2dca"
+# Comma-separated assistants shown on the dashboard
+ASSISTANT_IDS = [assistant_id.strip() for assistant_id in os.getenv('ASSISTANT_IDS', ASSISTANT_ID).split(',')
+                 if assistant_id.strip()]
 API_KEY = "Bearer 71c0393e-fcfd-4147-ac15-42b68fdd53ff"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def fetch_calls():
-    """Fetch calls from external API and return as JSON."""
+vapi_client = get_client('vapi')
+
+INGEST_PAGE_SIZE = int(os.getenv('INGEST_PAGE_SIZE', '100'))
+# Seconds between background ingests; 0 leaves ingesting to `python analysis.py ingest`
+INGEST_INTERVAL = float(os.getenv('INGEST_INTERVAL', '30'))
+# How long a process may run one ingest before another may take it over
+INGEST_LEASE = float(os.getenv('INGEST_LEASE', '900'))
+# Assistants fetched from Vapi at the same time
+INGEST_CONCURRENCY = int(os.getenv('INGEST_CONCURRENCY', '4'))
+# Seconds a call that never reaches "ended" may hold back the ingest high-water mark
+INGEST_OPEN_CALL_MAX_AGE = float(os.getenv('INGEST_OPEN_CALL_MAX_AGE', '7200'))
+
+call_store = CallStore()
+_ingest_executor = ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="vapi-ingest")
+
+def fetch_calls(assistant_id=ASSISTANT_ID, created_at_gt=None, created_at_le=None, created_at_lt=None,
+                limit=INGEST_PAGE_SIZE):
+    """Fetch one page of calls (newest first) from external API and return as JSON."""
     headers = {"Authorization": API_KEY}
     params = {
-        "assistantId": ASSISTANT_ID,
-        "limit": "200"
+        "assistantId": assistant_id,
+        "limit": str(limit)
     }
-    response = requests.get(API_URL, headers=headers, params=params)
+    if created_at_gt:
+        params["createdAtGt"] = created_at_gt
+    if created_at_le:
+        params["createdAtLe"] = created_at_le
+    if created_at_lt:
+        params["createdAtLt"] = created_at_lt
+    try:
+        response = vapi_client.get(API_URL, headers=headers, params=params)
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch calls: {e}")
+        return None
     if response.status_code == 200:
         return response.json()
     else:
         return None
 
-def process_calls(response_data, search_number=None):
+def fetch_call(call_id):
+    """Fetch a single call object from the external API, or None if it can't be fetched."""
+    headers = {"Authorization": API_KEY}
+    try:
+        response = vapi_client.get(f"{API_URL}/{quote(call_id, safe='')}", headers=headers)
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch call {call_id}: {e}")
+        return None
+    if response.status_code == 200:
+        return response.json()
+    else:
+        return None
+
+def process_call(call):
+    """Extract the dashboard fields from a single Vapi call object."""
+    caller_number = call.get("customer", {}).get("number", "No number available")
+    
+    # Look for potential unique identifiers
+    potential_uuid = call.get("id") or call.get("call_id") or call.get("uuid") or "No UUID found"
+    
+    financial_details = None
+    tool_calls = []
+    
+    for message in call.get('messages', []):
+        if message.get('role') == 'tool_calls':
+            for tool_call in message.get('toolCalls', []):
+                function = tool_call.get('function', {})
+                tool_name = function.get('name')
+                tool_calls.append(tool_name)
+                if tool_name == 'sendFinancialDetails':
+                    financial_details = function.get('arguments')
+    
+    return {
+        "potential_uuid": potential_uuid,
+        "assistant_id": call.get("assistantId"),
+        "status": call.get("status"),
+        "campaign": campaign_of(call),
+        "created_at": call.get("createdAt", ""),
+        "caller_number": caller_number,
+        "call_summary": call.get("summary", "No summary available"),
+        "tools_used": tool_calls,
+        "financial_details": financial_details
+    }
+
+def campaign_of(call):
+    """Campaign label passed to the assistant via call metadata or variable values, if any."""
+    metadata = call.get("metadata") or {}
+    variable_values = (call.get("assistantOverrides") or {}).get("variableValues") or {}
+    return metadata.get("campaign") or variable_values.get("campaign")
+
+def summarize_calls(processed_calls):
+    """Compute tool usage and qualification metrics over processed calls."""
+    tool_usage = Counter()
+    for processed_call in processed_calls:
+        tool_usage.update(processed_call["tools_used"])
+    qualified_count = tool_usage['sendFinancialDetails']
+    
+    return {
+        "total_calls": len(processed_calls),
+        "tool_usage": dict(tool_usage),
+        "qualified_leads": qualified_count,
+        "qualification_rate": f"{(qualified_count / len(processed_calls)) * 100:.2f}%" if processed_calls else "0.00%"
+    }
+
+def process_calls(response_data, search_number=None, trace=None):
     """Extract specific fields from call data and perform analysis."""
     processed_calls = []
-    tool_usage = Counter()
-    qualified_count = 0
+    own_trace = trace is None
+    trace = trace or call_tracer.session()
     
     calls = response_data if isinstance(response_data, list) else [response_data]
     
     for call in calls:
-        logger.info(f"Full call data: {call}")  # Log the entire call data
-        
-        caller_number = call.get("customer", {}).get("number", "No number available")
-        
-        if search_number and search_number not in caller_number:
+        processed_call = process_call(call)
+        trace.trace(call, processed_call)
+        if search_number and search_number not in processed_call["caller_number"]:
             continue
-        
-        # Look for potential unique identifiers
-        potential_uuid = call.get("id") or call.get("call_id") or call.get("uuid") or "No UUID found"
-        
-        financial_details = None
-        tool_calls = []
-        
-        for message in call.get('messages', []):
-            if message.get('role') == 'tool_calls':
-                for tool_call in message.get('toolCalls', []):
-                    function = tool_call.get('function', {})
-                    tool_name = function.get('name')
-                    tool_calls.append(tool_name)
-                    tool_usage[tool_name] += 1
-                    if tool_name == 'sendFinancialDetails':
-                        financial_details = function.get('arguments')
-                        qualified_count += 1
-        
-        processed_call = {
-            "potential_uuid": potential_uuid,
-            "caller_number": caller_number,
-            "call_summary": call.get("summary", "No summary available"),
-            "tools_used": tool_calls,
-            "financial_details": financial_details
-        }
         processed_calls.append(processed_call)
-        
-        logger.info(f"Processed call: {processed_call}")  # Log the processed call data
+    if own_trace:
+        trace.finish()
     
-    analysis = {
-        "total_calls": len(processed_calls),
-        "tool_usage": dict(tool_usage),
-        "qualified_leads": qualified_count,
-        "qualification_rate": f"{(qualified_count / len(processed_calls)) * 100:.2f}%" if processed_calls else "0.00%"
-    }
+    return processed_calls, summarize_calls(processed_calls)
+
+def trace_call(call_id):
+    """Trace one call on demand, whether or not it is new. Returns False if the call is unknown.
+
+    Writes the call as Vapi returns it now, how process_call reads it, and
+    the row the call store holds for it.
+    """
+    stored = call_store.get_call(call_id)
+    call = fetch_call(call_id)
+    if call is None and stored is None:
+        return False
+    if call is not None:
+        call_tracer.write_call(call_id, call, process_call(call))
+    if stored is not None:
+        call_tracer.write(call_id, "stored", stored)
+    return True
+
+def vapi_timestamp(moment):
+    """Format a datetime the way Vapi writes createdAt, so the two compare as strings."""
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+def ingest_calls(assistant_id=ASSISTANT_ID, trace=None):
+    """Store every call newer than the assistant's high-water mark. Returns the number of new calls, or None on failure.
+
+    The first run pages back through the whole call history; later runs only
+    fetch calls created after the high-water mark. Each page ends at the
+    previous page's oldest createdAt inclusive, so calls sharing that
+    timestamp are not lost; the ones already seen are skipped. Calls that
+    have not ended yet are stored but hold the mark back, so they are fetched
+    again (and replaced) until their summary and messages are final, for at
+    most INGEST_OPEN_CALL_MAX_AGE seconds. The mark only moves once a run
+    reaches it; after every page the run saves its position as the
+    assistant's ingest cursor, so a run that fails or is killed part way is
+    resumed from there instead of starting again from the newest call.
+    ``trace`` is a call_trace session; by default the ANALYSIS_TRACE
+    settings apply.
+    """
+    if trace is None:
+        trace = call_tracer.session()
+        try:
+            return ingest_calls(assistant_id, trace)
+        finally:
+            trace.finish()
+    high_water = call_store.high_water(assistant_id)
+    open_cutoff = vapi_timestamp(datetime.now(timezone.utc) - timedelta(seconds=INGEST_OPEN_CALL_MAX_AGE))
+    cursor = call_store.ingest_cursor(assistant_id) or {}
+    created_at_le, created_at_lt = cursor.get("le"), cursor.get("lt")
+    # The newest settled createdAt the mark may move to, and the oldest call still open
+    mark, oldest_open = cursor.get("mark"), cursor.get("oldest_open")
+    if cursor:
+        logger.info(f"Resuming ingest for assistant {assistant_id} at {created_at_le or created_at_lt}")
+    boundary_ids = set()
+    inserted = 0
+    abandoned = 0
+    while True:
+        page = fetch_calls(assistant_id, created_at_gt=high_water, created_at_le=created_at_le,
+                           created_at_lt=created_at_lt)
+        if page is None:
+            # Keep the old high-water mark and the cursor so the next run resumes here
+            logger.error(f"Ingest for assistant {assistant_id} stopped after {inserted} new calls")
+            return None
+        if not page:
+            break
+        # Calls at the previous page's oldest timestamp come back on this page
+        new_calls = [call for call in page if call.get("id") is None or call.get("id") not in boundary_ids]
+        processed, _ = process_calls(new_calls, trace=trace)
+        inserted += call_store.upsert_calls(processed)
+        settled = []
+        for call in processed:
+            if call["status"] not in (None, "ended") and call["created_at"] >= open_cutoff:
+                oldest_open = min(oldest_open or call["created_at"], call["created_at"])
+            elif call["created_at"]:
+                if call["status"] not in (None, "ended"):
+                    abandoned += 1
+                settled.append(call["created_at"])
+        # Pages run newest first, so an open call found now is older than everything settled before it
+        mark = max((created_at for created_at in settled + [mark]
+                    if created_at and (oldest_open is None or created_at < oldest_open)), default=None)
+        created = [call["createdAt"] for call in page if call.get("createdAt")]
+        if len(page) < INGEST_PAGE_SIZE or not created:
+            break
+        oldest = min(created)
+        if oldest == created_at_le:
+            # A full page of calls created at one timestamp: step past it
+            logger.warning(f"{INGEST_PAGE_SIZE}+ calls for assistant {assistant_id} created at {oldest}; "
+                           f"raise INGEST_PAGE_SIZE if some of them are missing")
+            created_at_le, created_at_lt = None, oldest
+            boundary_ids = set()
+        else:
+            created_at_le, created_at_lt = oldest, None
+            boundary_ids = {call.get("id") for call in page if call.get("createdAt") == oldest}
+        call_store.save_ingest_cursor(assistant_id, {"le": created_at_le, "lt": created_at_lt,
+                                                     "mark": mark, "oldest_open": oldest_open})
+    if abandoned:
+        logger.warning(f"{abandoned} calls for assistant {assistant_id} still not ended after "
+                       f"{INGEST_OPEN_CALL_MAX_AGE:g}s no longer hold back the high-water mark")
+    call_store.finish_ingest(assistant_id, mark if mark and mark > (high_water or "") else None)
+    logger.info(f"Ingested {inserted} calls for assistant {assistant_id}")
+    return inserted
+
+def ingest_all(assistant_ids=None, trace=None):
+    """Ingest every assistant concurrently. Returns the total new calls, or None if every assistant failed.
+
+    Each assistant pages through its own calls on the ingest pool, so the run
+    takes about as long as the slowest assistant; all of them land in the same
+    call store and aggregates.
+    """
+    assistant_ids = ASSISTANT_IDS if assistant_ids is None else assistant_ids
+    own_trace = trace is None
+    trace = trace or call_tracer.session()
+    futures = {assistant_id: _ingest_executor.submit(ingest_calls, assistant_id, trace)
+               for assistant_id in assistant_ids}
+    results = {}
+    for assistant_id, future in futures.items():
+        try:
+            results[assistant_id] = future.result()
+        except Exception as e:
+            logger.error(f"Ingest for assistant {assistant_id} failed: {e}")
+            results[assistant_id] = None
+    if own_trace:
+        trace.finish()
+    succeeded = [inserted for inserted in results.values() if inserted is not None]
+    if len(succeeded) < len(results):
+        failed = [assistant_id for assistant_id, inserted in results.items() if inserted is None]
+        logger.warning(f"Ingest incomplete for assistants: {', '.join(failed)}")
+    if results and not succeeded:
+        return None
+    return sum(succeeded)
+
+class Ingester:
+    """Background thread that runs ingest_all every ``interval`` seconds, so no request waits on Vapi.
+
+    Every gunicorn worker runs one (see gunicorn.conf.py). A run first claims
+    the ingest in the call store for ``lease`` seconds, so one process ingests
+    at a time; when it finishes, the claim is held until the next run is due.
+    A process killed mid-run loses its claim after ``lease`` seconds, and
+    the next run resumes from the cursor that ingest_calls saved.
+    """
+
+    def __init__(self, interval=INGEST_INTERVAL, lease=INGEST_LEASE):
+        self.interval = interval
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+
+    def run_once(self):
+        """Ingest new calls unless another process is or just was. Returns ingest_all's result, or None."""
+        if not call_store.claim_ingest(self.lease):
+            return None
+        try:
+            result = ingest_all()
+        finally:
+            call_store.hold_ingest(self.interval)
+        self.runs += 1
+        if result is None:
+            self.failures += 1
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Ingest run failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the thread in this process unless it is disabled or already running (e.g. again after a fork)."""
+        if self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="vapi-ingester", daemon=True)
+            self._thread.start()
+        logger.info(f"Ingester started, fetching new calls every {self.interval:g}s")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+# Started per worker (gunicorn.conf.py post_worker_init) or below under `python analysis.py`
+ingester = Ingester()
+
+DASHBOARD_HTML = """
+<html>
+<head>
+    <style>
+        table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+        th, td { border: 1px solid black; padding: 8px; text-align: left; }
+        th { background-color: #f2f2f2; }
+        form { margin-bottom: 20px; }
+    </style>
+</head>
+<body>
+    <h1>Call Analysis Dashboard</h1>
+    
+    <form action="/" method="get">
+        <input type="text" name="search" placeholder="Search by phone number" value="{{ search_number }}">
+        <select name="match">
+            <option value="auto" {% if match == 'auto' %}selected{% endif %}>Auto</option>
+            <option value="exact" {% if match == 'exact' %}selected{% endif %}>Exact number</option>
+            <option value="suffix" {% if match == 'suffix' %}selected{% endif %}>Ends with</option>
+            <option value="prefix" {% if match == 'prefix' %}selected{% endif %}>Area code / prefix</option>
+        </select>
+        <input type="submit" value="Search">
+    </form>
+    
+    <h2>Call Analysis</h2>
+    <table>
+        <tr><th>Metric</th><th>Value</th></tr>
+        <tr><td>Total Calls</td><td>{{ analysis.total_calls }}</td></tr>
+        <tr><td>Qualified Leads</td><td>{{ analysis.qualified_leads }}</td></tr>
+        <tr><td>Qualification Rate</td><td>{{ analysis.qualification_rate }}</td></tr>
+    </table>
+    
+    <h2>Tool Usage</h2>
+    <table>
+        <tr><th>Tool</th><th>Count</th></tr>
+        {% for tool, count in analysis.tool_usage.items() %}
+        <tr><td>{{ tool }}</td><td>{{ count }}</td></tr>
+        {% endfor %}
+    </table>
     
-    return processed_calls, analysis
+    <h2>Call Details</h2>
+    <table>
+        <tr>
+            <th>Potential UUID</th>
+            <th>Caller Number</th>
+            <th>Summary</th>
+            <th>Tools Used</th>
+            <th>Financial Details</th>
+        </tr>
+        {% for call in calls %}
+        <tr>
+            <td>{{ call.potential_uuid }}</td>
+            <td>{{ call.caller_number }}</td>
+            <td>{{ call.call_summary }}{% if call.summary_truncated %}&hellip; <a href="/calls/{{ call.id | urlencode }}">more</a>{% endif %}</td>
+            <td>{{ ', '.join(call.tools_used) }}</td>
+            <td>{% if call.financial_details %}<a href="/calls/{{ call.id | urlencode }}">view</a>{% endif %}</td>
+        </tr>
+        {% endfor %}
+    </table>
+    {% if next_cursor %}
+    <a href="/?{{ {'search': search_number, 'match': match, 'cursor': next_cursor} | urlencode }}">Next page</a>
+    {% endif %}
+</body>
+</html>
+"""
+
+CALL_DETAIL_HTML = """
+<html>
+<head>
+    <style>
+        table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+        th, td { border: 1px solid black; padding: 8px; text-align: left; vertical-align: top; }
+        th { background-color: #f2f2f2; width: 15%; }
+        pre { white-space: pre-wrap; margin: 0; }
+    </style>
+</head>
+<body>
+    <a href="/">Back to dashboard</a>
+    <h1>Call {{ call.id }}</h1>
+    <table>
+        <tr><th>Created At</th><td>{{ call.created_at }}</td></tr>
+        <tr><th>Status</th><td>{{ call.status }}</td></tr>
+        <tr><th>Caller Number</th><td>{{ call.caller_number }}</td></tr>
+        <tr><th>Campaign</th><td>{{ call.campaign or '' }}</td></tr>
+        <tr><th>Tools Used</th><td>{{ ', '.join(call.tools_used) }}</td></tr>
+        <tr><th>Summary</th><td><pre>{{ call.call_summary }}</pre></td></tr>
+        <tr><th>Financial Details</th><td><pre>{{ call.financial_details }}</pre></td></tr>
+    </table>
+</body>
+</html>
+"""
+
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', '50'))
+# Summaries longer than this are cut in the table and shown in full on /calls/<id>
+DASHBOARD_SUMMARY_CHARS = int(os.getenv('DASHBOARD_SUMMARY_CHARS', '200'))
+
+# Compiled once at import; render_template_string would reparse the template on every request
+dashboard_template = app.jinja_env.from_string(DASHBOARD_HTML)
+call_detail_template = app.jinja_env.from_string(CALL_DETAIL_HTML)
 
 @app.route('/', methods=['GET'])
 def get_calls():
-    """API endpoint to get processed call data and analysis."""
+    """Dashboard: metrics over all matching calls plus one page of call rows."""
     search_number = request.args.get('search', '')
-    response_data = fetch_calls()
-    if response_data is not None:
-        summarized_calls, analysis = process_calls(response_data, search_number)
-        
-        html = """
-        <html>
-        <head>
-            <style>
-                table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
-                th, td { border: 1px solid black; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                form { margin-bottom: 20px; }
-            </style>
-        </head>
-        <body>
-            <h1>Call Analysis Dashboard</h1>
-            
-            <form action="/" method="get">
-                <input type="text" name="search" placeholder="Search by phone number" value="{{ search_number }}">
-                <input type="submit" value="Search">
-            </form>
-            
-            <h2>Call Analysis</h2>
-            <table>
-                <tr><th>Metric</th><th>Value</th></tr>
-                <tr><td>Total Calls</td><td>{{ analysis.total_calls }}</td></tr>
-                <tr><td>Qualified Leads</td><td>{{ analysis.qualified_leads }}</td></tr>
-                <tr><td>Qualification Rate</td><td>{{ analysis.qualification_rate }}</td></tr>
-            </table>
-            
-            <h2>Tool Usage</h2>
-            <table>
-                <tr><th>Tool</th><th>Count</th></tr>
-                {% for tool, count in analysis.tool_usage.items() %}
-                <tr><td>{{ tool }}</td><td>{{ count }}</td></tr>
-                {% endfor %}
-            </table>
-            
-            <h2>Call Details</h2>
-            <table>
-                <tr>
-                    <th>Potential UUID</th>
-                    <th>Caller Number</th>
-                    <th>Summary</th>
-                    <th>Tools Used</th>
-                    <th>Financial Details</th>
-                </tr>
-                {% for call in calls %}
-                <tr>
-                    <td>{{ call.potential_uuid }}</td>
-                    <td>{{ call.caller_number }}</td>
-                    <td>{{ call.call_summary }}</td>
-                    <td>{{ ', '.join(call.tools_used) }}</td>
-                    <td>{{ call.financial_details }}</td>
-                </tr>
-                {% endfor %}
-            </table>
-        </body>
-        </html>
-        """
-        
-        return render_template_string(html, calls=summarized_calls, analysis=analysis, search_number=search_number)
+    match = request.args.get('match', 'auto')
+    if match not in PHONE_MATCHES + ('auto',):
+        return jsonify({"error": f"Unknown match: {match}"}), 400
+    # With ANALYSIS_TRACE=1, ?trace_call=<id> traces that call, new or already stored
+    trace_call_id = request.args.get('trace_call')
+    if trace_call_id:
+        if not call_tracer.enabled:
+            return jsonify({"error": "Call tracing is off, set ANALYSIS_TRACE=1"}), 400
+        if not trace_call(trace_call_id):
+            return jsonify({"error": "Call not found"}), 404
+    # Served from the call store only; the ingester fills it in the background
+    try:
+        calls, next_cursor = call_store.search_calls(search_number, match, DASHBOARD_PAGE_SIZE,
+                                                     request.args.get('cursor'),
+                                                     summary_chars=DASHBOARD_SUMMARY_CHARS)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    if search_number:
+        analysis = metrics_to_analysis(call_store.search_metrics(search_number, match))
     else:
-        return jsonify({"error": "Failed to fetch data from API"}), 500
+        analysis = metrics_to_analysis(call_store.aggregate())
+
+    return dashboard_template.render(calls=calls, analysis=analysis, search_number=search_number,
+                                     match=match, next_cursor=next_cursor)
+
+@app.route('/calls/<call_id>', methods=['GET'])
+def get_call(call_id):
+    """Full summary and financial details of one call, loaded on demand from the dashboard."""
+    call = call_store.get_call(call_id)
+    if call is None:
+        return jsonify({"error": "Call not found"}), 404
+    if request.args.get('format') == 'json':
+        return jsonify(call), 200
+    return call_detail_template.render(call=call)
+
+@app.route('/api/calls', methods=['GET'])
+def search_calls():
+    """Paginated phone-number search over the ingested call history.
+
+    Query parameters: search (number or digits), match=auto|exact|prefix|suffix,
+    limit (default 100, max 1000) and cursor (the next_cursor of the previous page).
+    """
+    search_number = request.args.get('search', '')
+    match = request.args.get('match', 'auto')
+    if match not in PHONE_MATCHES + ('auto',):
+        return jsonify({"error": f"Unknown match: {match}"}), 400
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        calls, next_cursor = call_store.search_calls(search_number, match, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    return jsonify({"calls": calls, "next_cursor": next_cursor}), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Call metrics over a time window from the precomputed aggregates.
+
+    Query parameters: start, end (ISO timestamps, hour resolution), assistant_id,
+    campaign, and granularity=hour|day to also return a per-bucket series.
+    """
+    start = request.args.get('start')
+    end = request.args.get('end')
+    assistant_id = request.args.get('assistant_id')
+    campaign = request.args.get('campaign')
+    granularity = request.args.get('granularity')
+    try:
+        result = {"analysis": metrics_to_analysis(call_store.aggregate(start, end, assistant_id, campaign))}
+        if granularity in GRANULARITIES:
+            buckets = call_store.series(granularity, start, end, assistant_id, campaign)
+            result["series"] = {bucket: metrics_to_analysis(values) for bucket, values in sorted(buckets.items())}
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO timestamps"}), 400
+    return jsonify(result), 200
+
+EXPORT_COLUMNS = ["id", "assistant_id", "campaign", "status", "created_at", "caller_number", "call_summary",
+                  "tools_used", "financial_details"]
+
+def _export_args():
+    match = request.args.get('match', 'auto')
+    if match not in PHONE_MATCHES + ('auto',):
+        raise ValueError(f"Unknown match: {match}")
+    return {
+        "search_number": request.args.get('search') or None,
+        "match": match,
+        "start": request.args.get('start') or None,
+        "end": request.args.get('end') or None,
+    }
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+@app.route('/export/calls.ndjson', methods=['GET'])
+def export_calls_ndjson():
+    """Stream processed calls as newline-delimited JSON (filters: search, match, start, end)."""
+    try:
+        args = _export_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        for call in call_store.iter_calls(**args):
+            yield json.dumps({column: call[column] for column in EXPORT_COLUMNS}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/export/calls.csv', methods=['GET'])
+def export_calls_csv():
+    """Stream processed calls as CSV (filters: search, match, start, end)."""
+    try:
+        args = _export_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        yield _csv_line(EXPORT_COLUMNS)
+        for call in call_store.iter_calls(**args):
+            row = dict(call, tools_used=";".join(str(tool) for tool in call["tools_used"]))
+            yield _csv_line([row[column] for column in EXPORT_COLUMNS])
+
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={"Content-Disposition": "attachment; filename=calls.csv"})
+
+@app.route('/export/metrics.ndjson', methods=['GET'])
+def export_metrics_ndjson():
+    """Stream per-bucket metrics as newline-delimited JSON (granularity=hour|day, start, end, assistant_id, campaign)."""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"Unknown granularity: {granularity}"}), 400
+    try:
+        buckets = call_store.series(granularity, request.args.get('start'), request.args.get('end'),
+                                    request.args.get('assistant_id'), request.args.get('campaign'))
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO timestamps"}), 400
+
+    def generate():
+        for bucket in sorted(buckets):
+            yield json.dumps(dict(metrics_to_analysis(buckets[bucket]), bucket=bucket)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 if __name__ == '__main__':
+    if sys.argv[1:] == ['ingest']:
+        # One ingest run and exit, e.g. the first backfill from a shell or cron
+        sys.exit(0 if ingest_all() is not None else 1)
+    ingester.start()
     app.run(debug=True)
 
 
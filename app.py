@@ -2,96 +2,146 @@ import datetime
 from flask import Flask, request, jsonify, abort
 import requests
 import logging
-import json
 import os
 from dotenv import load_dotenv
+from call_index import CallIndexRefresher, call_index
+from call_listing_store import CallListingStore
+from call_pipeline import (
+    OMNIA_CALLS_URL,
+    SEND_FINANCIAL_DETAILS_SCHEMA,
+    SERVER_SECRET,
+    TRACKDRIVE_DELIVERY_MODE,
+    TRACKDRIVE_KEYPRESS_URL,
+    build_combined_data,
+    keypress_outbox,
+    newest_calls,
+    omnia_calls_params,
+    omnia_headers,
+    send_trackdrive_keypress,
+)
+from http_client import get_client
+from logging_setup import LazyJSON, configure_logging
+from tool_registry import ToolRegistry
+from timing import render_prometheus, set_call_id, span, timed_request
+from traffic_capture import capture_request
+from vapi_payload import VapiPayload
+from idempotency import flask_store, idempotency_key
+from webhook_auth import limit_body_size, require_webhook_auth
+from warmup import Warmup, trackdrive_urls, warm_connections
+import http_client
 
 # Enhanced logging configuration
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
 )
+configure_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 app = Flask(__name__)
+limit_body_size(app)
 
 logger.info("Starting application and loading environment variables")
 
-SERVER_SECRET = os.getenv('SERVER_SECRET')
 TEXTBACK_API_URL = os.getenv('TEXTBACK_API_URL')
 TEXTBACK_API_TOKEN = os.getenv('TEXTBACK_API_TOKEN')
 TEXTBACK_API_SECRET = os.getenv('TEXTBACK_API_SECRET')
 TRACKDRIVE_PUBLIC_KEY = os.getenv('TRACKDRIVE_PUBLIC_KEY')
 TRACKDRIVE_PRIVATE_KEY = os.getenv('TRACKDRIVE_PRIVATE_KEY')
-OMNIA_VOICE_API_KEY = os.getenv('OMNIA_VOICE_API_KEY')
-TRACKDRIVE_AUTH = os.getenv('TRACKDRIVE_AUTH')
+
+omnia_client = get_client('omnia')
+trackdrive_client = get_client('trackdrive')
+
+tools = ToolRegistry()
+# Replays tool responses to Vapi retries instead of re-sending keypresses
+idempotent_calls = flask_store()
 
 @app.route('/handle_incoming_call', methods=['POST'])
+@capture_request('handle_incoming_call')
+@timed_request('handle_incoming_call')
+@require_webhook_auth(lambda: SERVER_SECRET)
 def handle_incoming_call():
     logger.info("-------- NEW INCOMING CALL REQUEST --------")
     logger.info(f"Received request at /handle_incoming_call at {datetime.datetime.now()}")
+    logger.info("✅ Secret validation successful")
     
     # Log request details
-    data = request.json
+    with span('parse'):
+        if not request.is_json:
+            abort(415)
+        # Only message.type, functionCall and call.customer are decoded, not the transcript
+        payload = VapiPayload(request.get_data(cache=True))
+        try:
+            message_type = payload.message_type
+        except ValueError:
+            abort(400)
 
    
-    logger.info(f"Incoming Request Data: {json.dumps(data, indent=2)}")
-    logger.info(f"Request Headers: {dict(request.headers)}")
-
-    # Log secret validation
-    received_secret = request.headers.get('X-Vapi-Secret')
-    logger.info(f"Validating secret: {'*' * len(received_secret) if received_secret else 'None'}")
+    logger.info("Incoming Request Data: %s", LazyJSON(payload.body, size_hint=request.content_length))
+    logger.debug("Request Headers: %s", LazyJSON(request.headers))
 
-    if received_secret != SERVER_SECRET:
-        logger.warning("❌ Secret validation failed. Access denied.")
-        abort(403)
-    logger.info("✅ Secret validation successful")
+    set_call_id(payload.call_id)
 
-    message_type = data.get('message', {}).get('type')
     logger.info(f"Processing message type: {message_type}")
 
     if message_type == 'function-call':
-        function_call = data.get('message', {}).get('functionCall', {})
+        function_call = payload.function_call
         function_name = function_call.get('name')
         parameters = function_call.get('parameters')
         logger.info(f"Function call detected - Name: {function_name}")
-        logger.info(f"Parameters received: {json.dumps(parameters, indent=2)}")
+        logger.info("Parameters received: %s", LazyJSON(parameters))
 
-        if function_name == 'sendFinancialDetails':
-            return handle_send_financial_details(parameters, None, "global-telecom-investors", data)
-        else:
+        tool = tools.get(function_name)
+        if tool is None:
             logger.warning(f"❌ Unknown function name received: {function_name}")
             return jsonify({"error": f"Unknown function: {function_name}"}), 400
+        key = idempotency_key(function_call, payload.call_id)
+        return idempotent_calls.run(key, lambda: tool(parameters, None, "global-telecom-investors", payload))
     else:
         logger.warning(f"❌ Invalid request type received: {message_type}")
         return jsonify({"error": "Invalid request"}), 400
 
+def list_omnia_calls():
+    """Fetch Omnia's newest calls, newest call first"""
+    headers = omnia_headers()
+    logger.info("Making API request to Omnia Voice API")
+    with span('omnia_fetch'):
+        response = omnia_client.get(OMNIA_CALLS_URL, headers=headers, params=omnia_calls_params())
+        response.raise_for_status()
+        return newest_calls(response.json())
+
+# Keeps in-progress calls indexed so lookups don't list Omnia themselves; started per
+# worker (gunicorn.conf.py post_worker_init) or below under `python app.py`. The
+# workers share one listing per interval through the listing store.
+call_index_refresher = CallIndexRefresher(call_index, list_omnia_calls, store=CallListingStore())
+
+def refresh_call_index():
+    """Pull the recent calls from Omnia into the local call index. Returns the number of new calls."""
+    calls = list_omnia_calls()
+    with span('call_index'):
+        # Shared, so the other workers' refreshers pick up the newer listing too
+        added = call_index_refresher.publish(calls)
+    logger.info(f"Received {len(calls)} calls from API, {added} new calls indexed")
+    return added
+
 def fetch_webhook_data(phone_number):
-    """Fetch webhook data from API using phone number"""
+    """Fetch webhook data for a phone number, using the local call index before the Omnia API"""
     logger.info(f"-------- FETCHING WEBHOOK DATA --------")
     logger.info(f"Attempting to fetch webhook data for phone number: {phone_number}")
-    
+
+    with span('call_index'):
+        matching_call = call_index.get_by_phone(phone_number)
+    if matching_call:
+        logger.info(f"✅ Found call in local index - Call ID: {matching_call.get('call_id')}")
+        return matching_call
+
+    # Only calls Omnia listed after the refresher's last pass (or with the refresher off) get here
+    logger.info("Call not in local index, refreshing from Omnia Voice API")
     try:
-        headers = {
-            "X-API-Key": OMNIA_VOICE_API_KEY,
-            "Content-Type": "application/json"
-        }
-        logger.info("Making API request to Omnia Voice API")
-        response = requests.get(  # Changed to GET
-            "https://api.omnia-voice.com/api/calls",  # Changed endpoint
-            headers=headers
-        )
-        response.raise_for_status()
-        
-        calls = response.json()
-        logger.info(f"Received {len(calls)} calls from API")
-        
-        matching_call = next(
-            (call for call in calls 
-             if call['caller_phone_number'] == phone_number),
-            None
-        )
+        refresh_call_index()
+
+        matching_call = call_index.get_by_phone(phone_number)
         
         if matching_call:
             logger.info("✅ Found matching call data:")
@@ -104,12 +154,14 @@ def fetch_webhook_data(phone_number):
             
     except requests.RequestException as e:
         logger.error(f"❌ Failed to fetch webhook data: {str(e)}")
-        if hasattr(e, 'response'):
+        if getattr(e, 'response', None) is not None:
             logger.error(f"Response status: {e.response.status_code}")
-            logger.error(f"Response body: {e.response.text}")
+            logger.error("Response body: %s", LazyJSON(e.response.text))
         return None
 
-def handle_send_financial_details(parameters, td_uuid, subdomain, data):
+@tools.register('sendFinancialDetails', parameters=SEND_FINANCIAL_DETAILS_SCHEMA,
+                description="Sends collected financial details to TrackDrive.")
+def handle_send_financial_details(parameters, td_uuid, subdomain, payload):
     logger.info("-------- HANDLING FINANCIAL DETAILS --------")
     logger.info("Starting financial details processing")
     logger.info("-------- HANDLING FINANCIAL DETAILS --------")
@@ -121,8 +173,7 @@ def handle_send_financial_details(parameters, td_uuid, subdomain, data):
     logger.info(f"Has Checking Account: {parameters.get('valid_checking_account', 'NOT PROVIDED')}")  # Changed from hasCheckingAccount
     logger.info(f"Already Enrolled in Other Program: {parameters.get('already_enrolled_in_relief_program', 'NOT PROVIDED')}")  # Changed from alreadyEnrolledAnyOtherProgram
     # Extract phone number
-    call_object = data.get('message', {}).get('call', {})
-    from_number = call_object.get('customer', {}).get('number')
+    from_number = payload.customer_number
     logger.info(f"Extracted phone number: {from_number}")
     
     if not from_number:
@@ -150,24 +201,23 @@ def handle_send_financial_details(parameters, td_uuid, subdomain, data):
 
     # Prepare data
     logger.info("Preparing combined data for TrackDrive")
-    combined_data = {
-        "first_name": webhook_data.get('first_name', ''),
-        "last_name": webhook_data.get('last_name', ''),
-        "email": webhook_data.get('email', ''),
-        "address": webhook_data.get('address', ''),
-        "city": webhook_data.get('city', ''),
-        "state": webhook_data.get('state', ''),
-        "zip": webhook_data.get('zip', ''),
-        "campaign_title": webhook_data.get('campaign_title', ''),
-        "additional_data": webhook_data.get('additional_data', 'NA'),
-        "caller_phone_number": webhook_data.get('caller_phone_number', ''),
-        "total_estimated_debt": parameters.get('total_estimated_debt'),
-        "debt_type": parameters.get('debt_type'),
-        "monthly_income": parameters.get('monthly_income'),
-        "valid_checking_account": parameters.get('valid_checking_account'),
-        "already_enrolled_in_relief_program": parameters.get('already_enrolled_in_relief_program'),
-    }
-    logger.info(f"Combined data prepared: {json.dumps(combined_data, indent=2)}")
+    with span('build_payload'):
+        combined_data = build_combined_data(webhook_data, parameters)
+    logger.info("Combined data prepared: %s", LazyJSON(combined_data))
+
+    if TRACKDRIVE_DELIVERY_MODE == 'outbox':
+        logger.info(f"Queueing TrackDrive keypress in outbox for td_uuid: {td_uuid}")
+        with span('outbox_enqueue'):
+            queued = keypress_outbox.enqueue(td_uuid, '*', subdomain, combined_data)
+        if not queued:
+            logger.info(f"Keypress for td_uuid {td_uuid} was already queued")
+        return jsonify({
+            "status": "success",
+            "message": "Keypress and combined data queued",
+            "data_sent": True,
+            "queued": True,
+            "td_uuid": td_uuid
+        }), 200
 
     # Send to TrackDrive
     logger.info(f"Initiating TrackDrive keypress send for td_uuid: {td_uuid}")
@@ -190,50 +240,37 @@ def handle_send_financial_details(parameters, td_uuid, subdomain, data):
             "td_uuid": td_uuid
         }), 500
 
-def send_trackdrive_keypress(td_uuid, keypress, subdomain="global-telecom-investors", combined_data=None):
-    logger.info("-------- SENDING TO TRACKDRIVE --------")
-    logger.info(f"Preparing TrackDrive request for td_uuid: {td_uuid}")
-    
-    url = f"https://{subdomain}.trackdrive.com/api/v1/calls/send_key_press"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {TRACKDRIVE_AUTH}"
-    }
-    
-    if not td_uuid:
-        logger.error("❌ Missing td_uuid - Cannot proceed with TrackDrive update")
-        return False
-    
-    payload = {
-        "id": td_uuid,
-        "digits": keypress,
-        "data": combined_data
-    }
-    
-    logger.info("TrackDrive request details:")
-    logger.info(f"URL: {url}")
-    logger.info(f"Payload: {json.dumps(payload, indent=2)}")
+@app.route('/tool_stats', methods=['GET'])
+def tool_stats():
+    return jsonify(tools.stats()), 200
 
-    try:
-        logger.info("Sending request to TrackDrive")
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        logger.info(f"✅ Successfully sent data to TrackDrive")
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response body: {response.text}")
-        
-        if keypress == '*':
-            logger.info(f"✅ Call transfer initiated for td_uuid: {td_uuid}")
-        
-        return True
-    except requests.RequestException as e:
-        logger.error(f"❌ Failed to send data to TrackDrive: {str(e)}")
-        if hasattr(e, 'response'):
-            logger.error(f"Response status: {e.response.status_code}")
-            logger.error(f"Response body: {e.response.text}")
-        return False
+@app.route('/idempotency_stats', methods=['GET'])
+def idempotency_stats():
+    return jsonify(idempotent_calls.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus exposition of per-stage request timings, tool timings and HTTP client counters"""
+    body = render_prometheus(tools=tools, http_stats=http_client.stats())
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# Run in each worker before it reports ready (see gunicorn.conf.py and /ready)
+warmup = Warmup('app')
+
+@warmup.step('connections')
+def warm_upstream_connections():
+    return {"omnia": warm_connections(omnia_client, [OMNIA_CALLS_URL]),
+            "trackdrive": warm_connections(trackdrive_client, trackdrive_urls(TRACKDRIVE_KEYPRESS_URL))}
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until this worker's warm-up finished or ran out of time"""
+    warmup.start()
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
 
 if __name__ == '__main__':
     logger.info("Starting Flask application server")
-    app.run(debug=True, port=5000)
+    call_index_refresher.start()
+    warmup.start()
+    # Development server only; run under gunicorn in production (see DEPLOYMENT.md)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5000)
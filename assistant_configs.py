@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_CONFIG_PATH = os.getenv(
+    'ASSISTANT_CONFIG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assistant_configs.json')
+)
+# Seconds between mtime checks of the config file
+ASSISTANT_CONFIG_CHECK_INTERVAL = float(os.getenv('ASSISTANT_CONFIG_CHECK_INTERVAL', '5'))
+
+
+def _merge(base, override):
+    """Deep-merge override into base; nested objects merge, everything else is replaced."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class AssistantConfigs:
+    """assistant-request responses loaded from a versioned JSON file and kept as ready-to-send bytes.
+
+    The file maps a profile name (one per app) to a ``default`` assistant and
+    a list of ``variants``, each with an optional ``subdomain`` and/or
+    ``category`` and an ``override`` deep-merged over the default:
+
+        {"version": 2, "assistants": {"index": {"default": {...},
+            "variants": [{"subdomain": "acme", "override": {"firstMessage": "..."}}]}}}
+
+    Every variant is serialized once per load. The file is re-read when its
+    mtime changes; a file that fails to parse is logged and the previous
+    configs stay in service.
+    """
+
+    def __init__(self, path=ASSISTANT_CONFIG_PATH, check_interval=ASSISTANT_CONFIG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._functions = {}
+        self.reloads = 0
+        self.reload_errors = 0
+        self.reload()
+
+    def reload(self):
+        """Re-read the config file. Returns True if new configs were installed."""
+        mtime = None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'rb') as config_file:
+                config = json.load(config_file)
+            profiles = self._compile(config)
+            functions = self._declared_functions(config)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.reload_errors += 1
+            if not self._profiles:
+                raise
+            # Don't retry the same broken file on every check; wait for the next edit
+            self._mtime = mtime
+            logger.error(f"❌ Keeping assistant configs v{self.version}, reload of {self.path} failed: {str(e)}")
+            return False
+        with self._lock:
+            self._profiles = profiles
+            self._functions = functions
+            self._mtime = mtime
+            self.version = config["version"]
+            self.reloads += 1
+        logger.info(f"Loaded assistant configs v{self.version} from {self.path}")
+        return True
+
+    @staticmethod
+    def _compile(config):
+        """{profile: [(subdomain, category, response bytes)]}, most specific variants first."""
+        profiles = {}
+        for name, profile in config["assistants"].items():
+            default = profile["default"]
+            compiled = []
+            for variant in profile.get("variants", []):
+                assistant = _merge(default, variant["override"])
+                compiled.append((variant.get("subdomain"), variant.get("category"), _serialize(assistant)))
+            compiled.sort(key=lambda entry: (entry[0] is None) + (entry[1] is None))
+            compiled.append((None, None, _serialize(default)))
+            profiles[name] = compiled
+        return profiles
+
+    @staticmethod
+    def _declared_functions(config):
+        """{profile: {function name: definition}} from each default assistant's model.functions."""
+        declared = {}
+        for name, profile in config["assistants"].items():
+            functions = profile["default"].get("model", {}).get("functions", [])
+            declared[name] = {function["name"]: function for function in functions}
+        return declared
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.error(f"❌ Cannot stat assistant config {self.path}: {str(e)}")
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def response_bytes(self, profile, subdomain=None, category=None):
+        """Serialized {"assistant": ...} body for a call, picking the most specific matching variant."""
+        self._maybe_reload()
+        for variant_subdomain, variant_category, body in self._profiles[profile]:
+            if variant_subdomain not in (None, subdomain) or variant_category not in (None, category):
+                continue
+            return body
+
+    def functions(self, profile):
+        """{name: Vapi function definition} the profile's default assistant declares."""
+        self._maybe_reload()
+        return self._functions.get(profile, {})
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "variants": {name: len(variants) for name, variants in self._profiles.items()},
+        }
+
+
+def _serialize(assistant):
+    return json.dumps({"assistant": assistant}, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+assistant_configs = AssistantConfigs()
@@ -0,0 +1,307 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+
+import aiohttp
+from aiohttp import web
+from aiohttp_retry import ExponentialRetry, RetryClient
+
+from call_index import CALL_INDEX_REFRESH_INTERVAL, CallIndexRefresher, call_index
+from call_listing_store import CallListingStore
+from call_pipeline import (
+    OMNIA_CALLS_URL,
+    SEND_FINANCIAL_DETAILS_SCHEMA,
+    SERVER_SECRET,
+    TRACKDRIVE_DELIVERY_MODE,
+    TRACKDRIVE_KEYPRESS_URL,
+    build_combined_data,
+    build_trackdrive_request,
+    keypress_outbox,
+    newest_calls,
+    omnia_calls_params,
+    omnia_headers,
+)
+from logging_setup import configure_logging
+from timing import render_prometheus, set_call_id, span, timed_request
+from tool_registry import ToolRegistry
+from traffic_capture import capture_request
+from vapi_payload import VapiPayload
+from idempotency import aiohttp_store, idempotency_key
+from webhook_auth import WEBHOOK_MAX_BODY_BYTES, require_webhook_auth
+from warmup import Warmup, trackdrive_urls, warm_connections_async
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+ASYNC_CONNECTION_LIMIT = int(os.getenv('ASYNC_CONNECTION_LIMIT', '200'))
+ASYNC_CONNECTION_LIMIT_PER_HOST = int(os.getenv('ASYNC_CONNECTION_LIMIT_PER_HOST', '100'))
+
+# Shares each worker's Omnia listing with the others; the listing itself is fetched
+# with aiohttp by _refresh_call_index, not by the refresher's own thread
+call_listing = CallIndexRefresher(call_index, None, store=CallListingStore())
+
+tools = ToolRegistry()
+# Replays tool responses to Vapi retries instead of re-sending keypresses
+idempotent_calls = aiohttp_store()
+
+
+async def fetch_webhook_data(app, phone_number):
+    """Async twin of app.fetch_webhook_data; concurrent misses share one Omnia request"""
+    with span('call_index'):
+        matching_call = call_index.get_by_phone(phone_number)
+    if matching_call:
+        logger.info(f"✅ Found call in local index - Call ID: {matching_call.get('call_id')}")
+        return matching_call
+
+    logger.info("Call not in local index, refreshing from Omnia Voice API")
+    inflight = app['omnia_refresh']
+    refresh = inflight.get('task')
+    if refresh is None or refresh.done():
+        refresh = asyncio.ensure_future(_refresh_call_index(app))
+        inflight['task'] = refresh
+    try:
+        with span('omnia_fetch'):
+            await asyncio.shield(refresh)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # ValueError: a 200 whose body isn't JSON, which requests raises as a RequestException in app.py
+        logger.error(f"❌ Failed to fetch webhook data: {str(e)}")
+        return None
+
+    matching_call = call_index.get_by_phone(phone_number)
+    if not matching_call:
+        logger.warning(f"❌ No matching call found for phone number: {phone_number}")
+    return matching_call
+
+
+async def _refresh_call_index(app):
+    # requests silently drops None-valued headers, aiohttp does not
+    headers = {name: value for name, value in omnia_headers().items() if value is not None}
+    async with app['omnia_client'].get(OMNIA_CALLS_URL, headers=headers, params=omnia_calls_params()) as response:
+        response.raise_for_status()
+        calls = newest_calls(await response.json(content_type=None))
+    added = call_listing.publish(calls)
+    logger.info(f"Received {len(calls)} calls from API, {added} new calls indexed")
+
+
+async def _refresh_call_index_periodically(app, interval):
+    """Async counterpart of CallIndexRefresher._run: keep in-progress calls indexed."""
+    while True:
+        try:
+            if call_listing.claim():
+                await _refresh_call_index(app)
+            else:
+                call_listing.adopt()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            call_listing.failures += 1
+            logger.error(f"Call index refresh failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+async def send_trackdrive_keypress(app, td_uuid, keypress, subdomain, combined_data=None):
+    if not td_uuid:
+        logger.error("❌ Missing td_uuid - Cannot proceed with TrackDrive update")
+        return False
+
+    url, headers, payload = build_trackdrive_request(td_uuid, keypress, subdomain, combined_data)
+    try:
+        with span('trackdrive_post'):
+            async with app['trackdrive_client'].post(url, headers=headers, json=payload) as response:
+                response.raise_for_status()
+                body = await response.text()
+        logger.info(f"✅ Successfully sent data to TrackDrive - status {response.status}, body: {body}")
+        return True
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"❌ Failed to send data to TrackDrive: {str(e)}")
+        return False
+
+
+@capture_request('handle_incoming_call')
+@timed_request('handle_incoming_call')
+@require_webhook_auth(lambda: SERVER_SECRET)
+async def handle_incoming_call(request):
+    with span('parse'):
+        # Only message.type, functionCall and call.customer are decoded, not the transcript
+        payload = VapiPayload(await request.read())
+        try:
+            message_type = payload.message_type
+        except ValueError:
+            raise web.HTTPBadRequest()
+    set_call_id(payload.call_id)
+    logger.info(f"Processing message type: {message_type}")
+
+    if message_type == 'function-call':
+        function_call = payload.function_call
+        function_name = function_call.get('name')
+        parameters = function_call.get('parameters')
+        logger.info(f"Function call detected - Name: {function_name}")
+
+        tool = tools.get(function_name)
+        if tool is None:
+            logger.warning(f"❌ Unknown function name received: {function_name}")
+            return web.json_response({"error": f"Unknown function: {function_name}"}, status=400)
+        key = idempotency_key(function_call, payload.call_id)
+        return await idempotent_calls.run_async(
+            key, lambda: tool(parameters, request.app, "global-telecom-investors", payload))
+    else:
+        logger.warning(f"❌ Invalid request type received: {message_type}")
+        return web.json_response({"error": "Invalid request"}, status=400)
+
+
+@tools.register('sendFinancialDetails', parameters=SEND_FINANCIAL_DETAILS_SCHEMA,
+                description="Sends collected financial details to TrackDrive.")
+async def handle_send_financial_details(parameters, app, subdomain, payload):
+    from_number = payload.customer_number
+    logger.info(f"Extracted phone number: {from_number}")
+
+    if not from_number:
+        logger.error("❌ No phone number found in request data")
+        return web.json_response({
+            "status": "error",
+            "message": "No phone number provided",
+            "data_sent": False
+        }, status=400)
+
+    webhook_data = await fetch_webhook_data(app, from_number)
+    if not webhook_data:
+        logger.error(f"❌ No webhook data found for phone: {from_number}")
+        return web.json_response({
+            "status": "error",
+            "message": "No webhook data found",
+            "data_sent": False
+        }, status=404)
+
+    td_uuid = webhook_data['call_id']
+    logger.info(f"✅ Successfully mapped td_uuid: {td_uuid}")
+    with span('build_payload'):
+        combined_data = build_combined_data(webhook_data, parameters)
+
+    if TRACKDRIVE_DELIVERY_MODE == 'outbox':
+        loop = asyncio.get_running_loop()
+        with span('outbox_enqueue'):
+            await loop.run_in_executor(None, keypress_outbox.enqueue, td_uuid, '*', subdomain, combined_data)
+        return web.json_response({
+            "status": "success",
+            "message": "Keypress and combined data queued",
+            "data_sent": True,
+            "queued": True,
+            "td_uuid": td_uuid
+        })
+
+    success = await send_trackdrive_keypress(app, td_uuid, '*', subdomain, combined_data)
+    if success:
+        logger.info(f"✅ Successfully processed financial details for td_uuid: {td_uuid}")
+        return web.json_response({
+            "status": "success",
+            "message": "Keypress and combined data sent",
+            "data_sent": True,
+            "td_uuid": td_uuid
+        })
+    else:
+        logger.error(f"❌ Failed to process financial details for td_uuid: {td_uuid}")
+        return web.json_response({
+            "status": "error",
+            "message": "Failed to send keypress and combined data",
+            "data_sent": False,
+            "td_uuid": td_uuid
+        }, status=500)
+
+
+async def tool_stats(request):
+    return web.json_response(tools.stats())
+
+
+async def idempotency_stats(request):
+    return web.json_response(idempotent_calls.stats())
+
+
+async def metrics(request):
+    return web.Response(text=render_prometheus(tools=tools), content_type='text/plain',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+async def _start_clients(app):
+    connector = aiohttp.TCPConnector(limit=ASYNC_CONNECTION_LIMIT, limit_per_host=ASYNC_CONNECTION_LIMIT_PER_HOST,
+                                     keepalive_timeout=60)
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=15, sock_connect=3.05, sock_read=10),
+        json_serialize=json.dumps
+    )
+    app['http_session'] = session
+    app['omnia_client'] = RetryClient(
+        client_session=session,
+        retry_options=ExponentialRetry(attempts=3, statuses={429}, exceptions={aiohttp.ClientConnectionError})
+    )
+    # Keypresses are not idempotent: only retry when the connection could not be made
+    app['trackdrive_client'] = RetryClient(
+        client_session=session,
+        retry_options=ExponentialRetry(attempts=3, exceptions={aiohttp.ClientConnectorError},
+                                       retry_all_server_errors=False)
+    )
+
+
+def _warmup(app):
+    warmup = Warmup('async_app')
+
+    @warmup.step('connections')
+    async def warm_upstream_connections():
+        return await warm_connections_async(app['http_session'],
+                                            [OMNIA_CALLS_URL] + trackdrive_urls(TRACKDRIVE_KEYPRESS_URL))
+
+    return warmup
+
+
+async def _warm_up(app):
+    # Startup hooks finish before the worker accepts connections, so this gates traffic on warm-up
+    await app['warmup'].run_async()
+
+
+async def _start_call_index_refresh(app):
+    if CALL_INDEX_REFRESH_INTERVAL > 0:
+        app['call_index_refresh'] = asyncio.ensure_future(
+            _refresh_call_index_periodically(app, CALL_INDEX_REFRESH_INTERVAL))
+
+
+async def _stop_call_index_refresh(app):
+    task = app.get('call_index_refresh')
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def ready(request):
+    warmup = request.app['warmup']
+    return web.json_response(warmup.status(), status=200 if warmup.ready else 503)
+
+
+async def _close_clients(app):
+    await app['http_session'].close()
+
+
+def create_app():
+    app = web.Application(client_max_size=WEBHOOK_MAX_BODY_BYTES)
+    app['omnia_refresh'] = {}
+    app['warmup'] = _warmup(app)
+    app.router.add_post('/handle_incoming_call', handle_incoming_call)
+    app.router.add_get('/tool_stats', tool_stats)
+    app.router.add_get('/idempotency_stats', idempotency_stats)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/ready', ready)
+    app.on_startup.append(_start_clients)
+    app.on_startup.append(_warm_up)
+    app.on_startup.append(_start_call_index_refresh)
+    app.on_cleanup.append(_stop_call_index_refresh)
+    app.on_cleanup.append(_close_clients)
+    return app
+
+
+if __name__ == '__main__':
+    logger.info("Starting aiohttp application server")
+    web.run_app(create_app(), port=int(os.getenv('PORT', '5000')))
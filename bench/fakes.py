@@ -0,0 +1,136 @@
+"""Local stand-ins for the Omnia, TrackDrive and TextBack APIs.
+
+    python -m bench.fakes --port 8900 --omnia-latency-ms 120 --trackdrive-error-rate 0.02
+
+Point the apps at it with:
+
+    OMNIA_CALLS_URL=http://127.0.0.1:8900/api/calls
+    TRACKDRIVE_KEYPRESS_URL=http://127.0.0.1:8900/trackdrive/{subdomain}/api/v1/calls/send_key_press
+    TEXTBACK_FIND_PHONE_URL=http://127.0.0.1:8900/api/v2/contact/findPhone
+
+Each service sleeps for a normally distributed latency and answers 503 with
+its configured error rate. Request counts per service are served at /_stats.
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from aiohttp import web
+
+from bench.payloads import phone_pool
+
+SERVICES = ('omnia', 'trackdrive', 'textback')
+
+
+class ServiceProfile:
+    __slots__ = ('latency_ms', 'jitter_ms', 'error_rate')
+
+    def __init__(self, latency_ms=50.0, jitter_ms=10.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    async def delay(self):
+        """Sleep like the real service would. Returns False when this request should fail."""
+        latency = max(0.0, random.gauss(self.latency_ms, self.jitter_ms))
+        await asyncio.sleep(latency / 1000)
+        return random.random() >= self.error_rate
+
+
+def omnia_calls(phones):
+    """Omnia /api/calls records for every phone in the pool, newest first."""
+    return [{
+        "call_id": f"td-{index:07d}",
+        "caller_phone_number": phone,
+        "first_name": "Bench",
+        "last_name": f"Caller{index}",
+        "email": f"caller{index}@example.com",
+        "address": f"{index} Main St",
+        "city": "Springfield",
+        "state": "IL",
+        "zip": "62701",
+        "campaign_title": "Debt Relief",
+        "additional_data": "NA",
+    } for index, phone in enumerate(phones)]
+
+
+def create_app(profiles, phones):
+    counts = Counter()
+    calls = omnia_calls(phones)
+    known = {phone: index for index, phone in enumerate(phones)}
+
+    async def unavailable(service):
+        counts[f"{service}_errors"] += 1
+        return web.json_response({"error": f"{service} unavailable (injected)"}, status=503)
+
+    async def handle_omnia(request):
+        counts['omnia'] += 1
+        if not await profiles['omnia'].delay():
+            return await unavailable('omnia')
+        limit = int(request.query.get('limit') or 0)
+        return web.json_response(calls[:limit] if limit else calls)
+
+    async def handle_trackdrive(request):
+        counts['trackdrive'] += 1
+        await request.read()
+        if not await profiles['trackdrive'].delay():
+            return await unavailable('trackdrive')
+        return web.json_response({"status": "ok", "subdomain": request.match_info['subdomain']})
+
+    async def handle_textback(request):
+        counts['textback'] += 1
+        if not await profiles['textback'].delay():
+            return await unavailable('textback')
+        index = known.get(request.query.get('phone', ''))
+        if index is None:
+            return web.json_response({})
+        return web.json_response({"firstName": "Bench", "lastName": f"Caller{index}", "state": "IL"})
+
+    async def handle_stats(request):
+        return web.json_response(dict(counts))
+
+    app = web.Application()
+    app.router.add_get('/api/calls', handle_omnia)
+    app.router.add_post('/trackdrive/{subdomain}/api/v1/calls/send_key_press', handle_trackdrive)
+    app.router.add_get('/api/v2/contact/findPhone', handle_textback)
+    app.router.add_get('/_stats', handle_stats)
+    return app
+
+
+def upstream_env(port, host='127.0.0.1'):
+    """Environment variables that point the apps at fakes listening on ``port``."""
+    base = f"http://{host}:{port}"
+    return {
+        'OMNIA_CALLS_URL': f"{base}/api/calls",
+        'TRACKDRIVE_KEYPRESS_URL': f"{base}/trackdrive/{{subdomain}}/api/v1/calls/send_key_press",
+        'TEXTBACK_FIND_PHONE_URL': f"{base}/api/v2/contact/findPhone",
+    }
+
+
+def add_arguments(parser):
+    for service in SERVICES:
+        parser.add_argument(f'--{service}-latency-ms', type=float, default=50.0)
+        parser.add_argument(f'--{service}-jitter-ms', type=float, default=10.0)
+        parser.add_argument(f'--{service}-error-rate', type=float, default=0.0)
+    parser.add_argument('--phones', type=int, default=500, help="Size of the caller phone pool")
+
+
+def profiles_from_args(args):
+    return {service: ServiceProfile(getattr(args, f'{service}_latency_ms'), getattr(args, f'{service}_jitter_ms'),
+                                    getattr(args, f'{service}_error_rate'))
+            for service in SERVICES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(profiles_from_args(args), phone_pool(args.phones))
+    web.run_app(app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Open-loop load generator for /handle_incoming_call.
+
+Requests are scheduled at a fixed rate regardless of how fast the server
+answers, and latency is measured from each request's scheduled start. A slow
+server therefore shows up as tail latency instead of silently lowering the
+offered load. If ``max_in_flight`` requests are already outstanding, a
+scheduled request is counted as dropped.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import time
+from collections import Counter
+
+import aiohttp
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.dropped = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        completed = len(latencies)
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            "requests": completed + sum(self.errors.values()) + self.dropped,
+            "ok": ok,
+            "non_2xx": completed - ok,
+            "errors": sum(self.errors.values()),
+            "dropped": self.dropped,
+            "throughput_rps": round(completed / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+async def run_load(url, bodies, rps, duration, headers=None, max_in_flight=1000, timeout=30, schedule=None):
+    """Send ``bodies`` (cycled) to ``url`` at ``rps`` for ``duration`` seconds.
+
+    ``schedule`` may instead give explicit send offsets in seconds (used by
+    replay); it is zipped with ``bodies``.
+    """
+    result = LoadResult()
+    headers = dict(headers or {}, **{"Content-Type": "application/json"})
+    in_flight = 0
+    tasks = set()
+
+    if schedule is None:
+        total = int(rps * duration)
+        schedule = (index / rps for index in range(total))
+        bodies = itertools.cycle(bodies)
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def send(body, scheduled_at):
+            nonlocal in_flight
+            try:
+                async with session.post(url, data=body, headers=headers) as response:
+                    await response.read()
+                result.latencies.append(time.perf_counter() - scheduled_at)
+                result.statuses[response.status] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result.errors[type(e).__name__] += 1
+            finally:
+                in_flight -= 1
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for offset, body in zip(schedule, bodies):
+            scheduled_at = start + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= max_in_flight:
+                result.dropped += 1
+                continue
+            in_flight += 1
+            task = loop.create_task(send(body, scheduled_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main():
+    from bench.payloads import MIXES, generate, phone_pool
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000/handle_incoming_call')
+    parser.add_argument('--variant', choices=sorted(MIXES), default='app', help="Message mix to send")
+    parser.add_argument('--secret', default='', help="X-Vapi-Secret header value")
+    parser.add_argument('--rps', type=float, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--phones', type=int, default=500)
+    parser.add_argument('--transcript-turns', type=int, default=20)
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    args = parser.parse_args()
+
+    bodies = generate(args.variant, 1000, phone_pool(args.phones), args.transcript_turns)
+    result = asyncio.run(run_load(args.url, bodies, args.rps, args.duration, {"X-Vapi-Secret": args.secret},
+                                  args.max_in_flight))
+    print(json.dumps(result.summary(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
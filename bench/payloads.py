@@ -0,0 +1,91 @@
+"""Vapi webhook payloads shaped like production traffic, for the load generator."""
+import json
+import random
+import uuid
+
+SUBDOMAIN = "global-telecom-investors"
+
+FINANCIAL_DETAILS = {
+    "total_estimated_debt": 24500,
+    "debt_type": "credit card",
+    "monthly_income": 4200,
+    "valid_checking_account": True,
+    "already_enrolled_in_relief_program": False,
+}
+
+# Share of each message kind per app variant; index.py also answers assistant-requests
+MIXES = {
+    "app": {"sendFinancialDetails": 1.0},
+    "async_app": {"sendFinancialDetails": 1.0},
+    "index": {"assistant-request": 0.4, "extractCallerInfo": 0.4, "sendFinancialDetails": 0.2},
+}
+
+
+def phone_pool(size):
+    return [f"+1555{index:07d}" for index in range(size)]
+
+
+def _transcript(turns):
+    """Alternating assistant/user messages like Vapi's artifact.messages."""
+    messages = []
+    for turn in range(turns):
+        role = "assistant" if turn % 2 == 0 else "user"
+        text = ("Thanks, and roughly how much do you owe across all of your credit cards right now? "
+                if role == "assistant" else
+                "I think it's somewhere around twenty four thousand, maybe a little more with interest. ")
+        messages.append({"role": role, "message": text * 2, "time": 1717000000000 + turn * 4000,
+                         "secondsFromStart": turn * 4.0})
+    return messages
+
+
+def _call(phone, call_id):
+    return {
+        "id": call_id,
+        "orgId": "bench-org",
+        "type": "inboundPhoneCall",
+        "status": "in-progress",
+        "phoneCallProviderId": f"CA{call_id.replace('-', '')[:32]}",
+        "customer": {"number": phone},
+        "td_uuid": f"td-{call_id[:8]}",
+        "subdomain": SUBDOMAIN,
+        "category": "inbound",
+    }
+
+
+def assistant_request(phone, call_id):
+    return {"message": {"type": "assistant-request", "call": _call(phone, call_id)}}
+
+
+def function_call(name, parameters, phone, call_id, transcript_turns=20):
+    return {
+        "message": {
+            "type": "function-call",
+            "functionCall": {"name": name, "parameters": parameters},
+            "call": _call(phone, call_id),
+            "artifact": {"messages": _transcript(transcript_turns)},
+        }
+    }
+
+
+def build(kind, phone, call_id=None, transcript_turns=20):
+    call_id = call_id or str(uuid.uuid4())
+    if kind == "assistant-request":
+        return assistant_request(phone, call_id)
+    if kind == "sendFinancialDetails":
+        return function_call(kind, dict(FINANCIAL_DETAILS), phone, call_id, transcript_turns)
+    if kind == "extractCallerInfo":
+        return function_call(kind, {"td_uuid": f"td-{call_id[:8]}", "category": "inbound"}, phone, call_id,
+                             transcript_turns)
+    raise ValueError(f"Unknown payload kind: {kind}")
+
+
+def generate(variant, count, phones, transcript_turns=20, seed=0):
+    """``count`` encoded request bodies following the variant's message mix."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*MIXES[variant].items())
+    bodies = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        call_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        bodies.append(json.dumps(build(kind, rng.choice(phones), call_id, transcript_turns)).encode())
+    return bodies
@@ -0,0 +1,94 @@
+"""Replay a traffic capture (see traffic_capture.py) against a running app.
+
+    python -m bench.replay captures/handle_incoming_call.jsonl --url http://127.0.0.1:5000/handle_incoming_call \\
+        --secret "$SERVER_SECRET" --speed 4
+
+Requests are sent at their captured spacing divided by --speed. With
+--rps the capture's timing is ignored and bodies are sent at a fixed rate.
+Rotated files (capture.jsonl.1, .2, ...) are read oldest first when the base
+path is given. Captured phone numbers are redacted, so they match no real
+caller; against bench.fakes pass --phones N to map them onto the fakes'
+caller pool (the same captured caller always maps to the same pool number).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+
+from bench.loadgen import run_load
+from traffic_capture import PHONE_KEYS
+
+
+def capture_files(path):
+    """The capture file and its rotated backups, oldest first."""
+    backups = [name for name in glob.glob(f"{glob.escape(path)}.*") if name.rsplit('.', 1)[-1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit('.', 1)[-1]), reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def remap_phones(value, pool_size, key=None):
+    """Map every phone number in a body onto bench.payloads.phone_pool(pool_size)."""
+    if isinstance(value, dict):
+        return {k: remap_phones(v, pool_size, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [remap_phones(item, pool_size, key) for item in value]
+    if key in PHONE_KEYS and isinstance(value, str):
+        digits = ''.join(ch for ch in value if ch.isdigit())
+        if digits:
+            return f"+1555{int(digits) % pool_size:07d}"
+    return value
+
+
+def load_capture(paths, route=None, phones=None):
+    """[(ts, encoded body)] from capture files, in capture order."""
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as capture:
+            for line in capture:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("body") is None or (route and record.get("route") != route):
+                    continue
+                body = remap_phones(record["body"], phones) if phones else record["body"]
+                records.append((record["ts"], json.dumps(body).encode()))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', nargs='+', help="Capture file(s); a base path also picks up its rotated files")
+    parser.add_argument('--url', default='http://127.0.0.1:5000/handle_incoming_call')
+    parser.add_argument('--secret', default='', help="X-Vapi-Secret header value (captures never contain it)")
+    parser.add_argument('--route', help="Only replay records captured on this route")
+    parser.add_argument('--speed', type=float, default=1.0, help="Time compression factor for the captured spacing")
+    parser.add_argument('--rps', type=float, help="Ignore captured timing and send at this fixed rate")
+    parser.add_argument('--phones', type=int, help="Map captured phone numbers onto a bench.fakes pool of this size")
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    args = parser.parse_args()
+
+    paths = []
+    for capture in args.capture:
+        paths += capture_files(capture) or [capture]
+    records = load_capture(paths, args.route, args.phones)
+    if not records:
+        sys.exit("no replayable records found")
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    bodies = [body for _, body in records]
+    if args.rps:
+        schedule = [index / args.rps for index in range(len(records))]
+    else:
+        first = records[0][0]
+        schedule = [(ts - first) / args.speed for ts, _ in records]
+    result = asyncio.run(run_load(args.url, bodies, None, None, {"X-Vapi-Secret": args.secret},
+                                  args.max_in_flight, schedule=schedule))
+    print(json.dumps(dict(result.summary(), records=len(records), files=paths), indent=2))
+
+
+if __name__ == '__main__':
+    main()
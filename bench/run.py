@@ -0,0 +1,174 @@
+"""Benchmark the webhook apps against local fake upstreams.
+
+    python -m bench.run --variants app,async_app,index --rps 100 --duration 20
+
+Starts bench.fakes, then each app variant under gunicorn with its upstream
+URLs pointed at the fakes. It warms the variant up, replays Vapi payloads at
+the target rate, and prints p50/p95/p99 latency and throughput per variant.
+Run it from the repository root. Upstream latency and error rates take the
+same flags as bench.fakes (e.g. --omnia-latency-ms 150 --trackdrive-error-rate 0.05).
+gunicorn also picks up gunicorn.conf.py (preload, gc.freeze); the flags
+given here override its worker settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import fakes
+from bench.loadgen import run_load
+from bench.payloads import generate, phone_pool
+
+BENCH_SECRET = "bench-secret"
+
+# gunicorn target, worker class, gunicorn.conf.py worker model and the X-Vapi-Secret each variant expects
+VARIANTS = {
+    "app": {"target": "app:app", "worker_class": "gthread", "model": "gthread", "secret": BENCH_SECRET},
+    "async_app": {"target": "async_app:create_app()", "worker_class": "aiohttp.GunicornWebWorker",
+                  "model": "aiohttp", "secret": BENCH_SECRET},
+    "index": {"target": "index:app", "worker_class": "gthread", "model": "gthread",
+              "secret": "s3cr3tK3yExAmpl3SecReT"},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"process exited with {process.returncode} before listening on {port}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def start(command, env, log_path):
+    log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def stop(process):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def gunicorn_command(variant, port, workers, threads):
+    """gunicorn command line for a variant; workers=0 leaves the sizing to gunicorn.conf.py."""
+    spec = VARIANTS[variant]
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--worker-class', spec['worker_class'], '--timeout', '60']
+    if workers:
+        command += ['--workers', str(workers)]
+        if spec['worker_class'] == 'gthread':
+            command += ['--threads', str(threads)]
+    return command + [spec['target']]
+
+
+def bench_variant(variant, args, upstream_env, workdir):
+    port = free_port()
+    env = dict(os.environ, **upstream_env)
+    env.update({
+        'SERVER_SECRET': BENCH_SECRET,
+        'GUNICORN_WORKER_MODEL': VARIANTS[variant]['model'],
+        'TRACKDRIVE_AUTH': 'YmVuY2g6YmVuY2g=',
+        # Keep the SQLite stores of the apps out of the working tree
+        'CALLER_STORE_PATH': os.path.join(workdir, f'{variant}-caller_profiles.sqlite3'),
+        'OUTBOX_PATH': os.path.join(workdir, f'{variant}-outbox.sqlite3'),
+        'CALL_STORE_PATH': os.path.join(workdir, f'{variant}-calls.sqlite3'),
+    })
+    env.update(dict(item.split('=', 1) for item in args.env))
+    log_path = os.path.join(args.logs, f'{variant}.log') if args.logs else None
+    process = start(gunicorn_command(variant, port, args.workers, args.threads), env, log_path)
+    try:
+        wait_for_port(port, process=process)
+        url = f"http://127.0.0.1:{port}/handle_incoming_call"
+        headers = {"X-Vapi-Secret": VARIANTS[variant]['secret']}
+        # One body per request: repeated bodies would be answered from the idempotency store
+        count = max(2000, int(args.rps * (args.warmup + args.duration)) + 1)
+        bodies = generate(variant, count, phone_pool(args.phones), args.transcript_turns, seed=1)
+        if args.warmup > 0:
+            asyncio.run(run_load(url, bodies, args.rps, args.warmup, headers, args.max_in_flight))
+        result = asyncio.run(run_load(url, bodies, args.rps, args.duration, headers, args.max_in_flight))
+    finally:
+        stop(process)
+    return dict(result.summary(), variant=variant, target_rps=args.rps)
+
+
+def print_table(rows):
+    columns = ("variant", "target_rps", "throughput_rps", "requests", "ok", "non_2xx", "errors", "dropped",
+               "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    widths = {column: max(len(column), *(len(str(row.get(column))) for row in rows)) for column in columns}
+    print("  ".join(column.rjust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column)).rjust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', default='app,async_app,index')
+    parser.add_argument('--rps', type=float, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--workers', type=int, default=2, help="0 sizes workers and threads like gunicorn.conf.py")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--transcript-turns', type=int, default=20)
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="Extra environment for the app under test (repeatable)")
+    parser.add_argument('--logs', help="Directory for app and fake-upstream logs (default: discard)")
+    parser.add_argument('--json', help="Also write the results to this file")
+    fakes.add_arguments(parser)
+    args = parser.parse_args()
+
+    variants = [variant.strip() for variant in args.variants.split(',') if variant.strip()]
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(sorted(unknown))}")
+    if args.logs:
+        os.makedirs(args.logs, exist_ok=True)
+
+    fake_port = free_port()
+    fake_command = [sys.executable, '-m', 'bench.fakes', '--port', str(fake_port), '--phones', str(args.phones)]
+    for service in fakes.SERVICES:
+        for setting in ('latency_ms', 'jitter_ms', 'error_rate'):
+            fake_command += [f"--{service}-{setting.replace('_', '-')}", str(getattr(args, f'{service}_{setting}'))]
+    fake_process = start(fake_command, dict(os.environ), os.path.join(args.logs, 'fakes.log') if args.logs else None)
+    workdir = tempfile.mkdtemp(prefix='klas-bench-')
+    rows = []
+    try:
+        wait_for_port(fake_port, process=fake_process)
+        for variant in variants:
+            print(f"benchmarking {variant} at {args.rps} rps for {args.duration}s...", file=sys.stderr)
+            rows.append(bench_variant(variant, args, fakes.upstream_env(fake_port), workdir))
+    finally:
+        stop(fake_process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(rows, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
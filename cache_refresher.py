@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Refresh lookups per second across every process running a refresher on this host; 0 disables it
+CACHE_REFRESH_RPS = float(os.getenv('CACHE_REFRESH_RPS', '2'))
+# Refresh profiles whose TTL runs out within this many seconds
+CACHE_REFRESH_WINDOW = float(os.getenv('CACHE_REFRESH_WINDOW', '3600'))
+CACHE_REFRESH_INTERVAL = float(os.getenv('CACHE_REFRESH_INTERVAL', '60'))
+# How often a refresher deletes expired profiles and claims from the shared store
+CACHE_PRUNE_INTERVAL = float(os.getenv('CACHE_PRUNE_INTERVAL', '3600'))
+
+
+class CacheRefresher:
+    """Background thread that re-fetches caller profiles shortly before they expire.
+
+    It asks the cache for profiles expiring within ``window`` seconds, most
+    frequently read first, and refreshes them paced by a token bucket at
+    ``rate / processes`` lookups per second, so the gunicorn workers that each
+    run one stay within ``rate`` together. Before each lookup the cache's
+    claim_refresh() checks the shared profile store: a profile another worker
+    already renewed, or is renewing, is skipped without spending a token.
+    A pass covers up to ``interval`` seconds' worth of lookups; when profiles
+    are left over the next pass starts straight away, otherwise the thread
+    sleeps ``interval`` seconds. A ``rate`` of 0 disables the refresher.
+    Every ``prune_interval`` seconds it also deletes the profiles and
+    claims the store can no longer serve, so the store stays bounded.
+    """
+
+    def __init__(self, cache, rate=CACHE_REFRESH_RPS, window=CACHE_REFRESH_WINDOW,
+                 interval=CACHE_REFRESH_INTERVAL, processes=1, prune_interval=CACHE_PRUNE_INTERVAL):
+        if rate < 0:
+            raise ValueError(f"Cache refresh rate must not be negative, got {rate!r}")
+        self.cache = cache
+        self.rate = rate
+        self.window = window
+        self.interval = interval
+        self.processes = processes
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._next_slot = 0.0
+        self.refreshed = 0
+        self.skipped = 0
+        self.backlog = 0
+        self.pruned = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    @property
+    def process_rate(self):
+        return self.rate / max(1, self.processes)
+
+    def _acquire(self):
+        """Wait for this process's next refresh slot. Returns False if stop() was called meanwhile."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1 / self.process_rate
+        if slot > now:
+            return not self._stop.wait(slot - now)
+        return not self._stop.is_set()
+
+    def run_once(self):
+        """Refresh due profiles until the list is done, the pass budget is spent, or stop() is called."""
+        if not self.enabled:
+            return 0
+        due = self.cache.expiring(self.window)
+        budget = max(1, int(self.process_rate * self.interval))
+        refreshed = skipped = 0
+        for phone_number in due:
+            if refreshed >= budget or self._stop.is_set():
+                break
+            if not self.cache.claim_refresh(phone_number):
+                skipped += 1
+                continue
+            if not self._acquire():
+                break
+            self.cache.refresh(phone_number)
+            refreshed += 1
+            self.refreshed += 1
+        self.skipped += skipped
+        self.backlog = len(due) - refreshed - skipped
+        if due:
+            logger.info(f"Refreshed {refreshed} of {len(due)} caller profiles nearing expiry, "
+                        f"{skipped} renewed by another worker")
+        return refreshed
+
+    def prune(self):
+        """Prune the shared store if ``prune_interval`` has passed since the last prune. Returns profiles removed."""
+        now = time.monotonic()
+        if now < self._next_prune:
+            return 0
+        self._next_prune = now + self.prune_interval
+        pruned = self.cache.prune_store()
+        self.pruned += pruned
+        if pruned:
+            logger.info(f"Pruned {pruned} expired caller profiles from the store")
+        return pruned
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.prune()
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Cache refresh pass failed: {str(e)}")
+                self.backlog = 0
+            if not self.backlog:
+                self._stop.wait(self.interval)
+
+    def start(self, processes=None):
+        """Start the thread in this process unless it is already running (e.g. again after a fork).
+
+        ``processes`` is how many processes share ``rate``, e.g. the gunicorn worker count.
+        """
+        if not self.enabled:
+            logger.info("Cache refresher disabled (CACHE_REFRESH_RPS=0)")
+            return
+        with self._start_lock:
+            if processes is not None:
+                self.processes = processes
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="cache-refresher", daemon=True)
+            self._thread.start()
+        logger.info(f"Cache refresher started at {self.process_rate:g} lookups/s "
+                    f"({self.rate:g}/s shared by {self.processes} processes)")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
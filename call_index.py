@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# How long an Omnia listing stays authoritative for a caller number. Omnia lists
+# a caller's newest call first, but a caller who rings back gets a new call_id,
+# so an entry may only answer for the call that was in progress when it was
+# listed. No caller hangs up, rings back and reaches a function-call within a
+# few seconds, while Vapi's retries and follow-up tool calls of the same call do.
+CALL_INDEX_TTL = float(os.getenv('CALL_INDEX_TTL', '15'))
+CALL_INDEX_MAX_SIZE = int(os.getenv('CALL_INDEX_MAX_SIZE', '50000'))
+# How often a CallIndexRefresher re-lists Omnia calls; must stay below CALL_INDEX_TTL so
+# listed calls never expire between passes. 0 disables the refresher. Workers sharing
+# a listing store fetch once per interval between them, and may index a listing up to
+# one interval later, so keep it below half the TTL.
+CALL_INDEX_REFRESH_INTERVAL = float(os.getenv('CALL_INDEX_REFRESH_INTERVAL', '5'))
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(phone_number):
+    """Normalize a phone number to E.164 (+<digits>), assuming US for 10-digit numbers."""
+    if not phone_number:
+        return None
+    digits = _NON_DIGITS.sub('', str(phone_number))
+    if not digits:
+        return None
+    if len(digits) == 10:
+        digits = '1' + digits
+    return '+' + digits
+
+
+class CallIndex:
+    """In-memory index of Omnia calls keyed by normalized caller number and by call_id.
+
+    Each listing from Omnia replaces what is indexed: every call in it is
+    re-stamped with the time it was listed, and a caller number maps to its
+    newest call in the latest listing that included it. Entries answer for
+    ``ttl`` seconds after they were last listed.
+    """
+
+    def __init__(self, ttl=CALL_INDEX_TTL, max_size=CALL_INDEX_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # call_id -> (listed_at, call, phone), oldest listing first
+        self._by_call_id = OrderedDict()
+        # phone -> call_id of the caller's newest listed call
+        self._by_phone = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._by_call_id)
+
+    def _is_fresh(self, entry, now):
+        return now - entry[0] < self.ttl
+
+    def _put(self, call_id, call, phone, now):
+        """Store ``call`` as listed at ``now``. Caller holds the lock. Returns True if the call_id is new."""
+        is_new = call_id not in self._by_call_id
+        self._by_call_id[call_id] = (now, call, phone)
+        self._by_call_id.move_to_end(call_id)
+        return is_new
+
+    def upsert(self, call, now=None):
+        """Add or replace a single call and make it its caller's current call. Returns True if new."""
+        call_id = call.get('call_id')
+        if not call_id:
+            return False
+        now = time.monotonic() if now is None else now
+        phone = normalize_phone(call.get('caller_phone_number'))
+        with self._lock:
+            is_new = self._put(call_id, call, phone, now)
+            if phone:
+                self._by_phone[phone] = call_id
+            self._prune(now)
+        return is_new
+
+    def upsert_many(self, calls, now=None):
+        """Index a call list as returned by Omnia, newest call first. Returns the number of new call_ids.
+
+        Calls already indexed are replaced by the listed record, and each
+        caller number is pointed at the first of its calls in the list. The
+        list is stored oldest call first, so a listing longer than
+        ``max_size`` evicts its oldest calls, never the ones in progress.
+        """
+        now = time.monotonic() if now is None else now
+        added = 0
+        with self._lock:
+            for call in reversed(calls):
+                call_id = call.get('call_id')
+                if not call_id:
+                    continue
+                entry = self._by_call_id.get(call_id)
+                if entry is not None and entry[1] == call:
+                    # Unchanged since it was last listed: keep the record, only re-stamp it
+                    phone = entry[2]
+                    self._put(call_id, entry[1], phone, now)
+                else:
+                    phone = normalize_phone(call.get('caller_phone_number'))
+                    added += self._put(call_id, call, phone, now)
+                # Later (newer) calls of the same caller overwrite this
+                if phone:
+                    self._by_phone[phone] = call_id
+            self._prune(now)
+        return added
+
+    def get_by_phone(self, phone_number, now=None):
+        """Return the indexed call for a caller number, or None on a miss or expired entry."""
+        phone = normalize_phone(phone_number)
+        if not phone:
+            return None
+        entry = self._by_call_id.get(self._by_phone.get(phone))
+        if entry is None or not self._is_fresh(entry, time.monotonic() if now is None else now):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def get_by_call_id(self, call_id, now=None):
+        entry = self._by_call_id.get(call_id)
+        if entry is None or not self._is_fresh(entry, time.monotonic() if now is None else now):
+            return None
+        return entry[1]
+
+    def _prune(self, now):
+        """Drop expired entries, then the oldest ones while over capacity. Caller holds the lock.
+
+        Entries are kept in listing order, so only the entries removed are visited.
+        """
+        while self._by_call_id:
+            call_id, entry = next(iter(self._by_call_id.items()))
+            if self._is_fresh(entry, now) and len(self._by_call_id) <= self.max_size:
+                break
+            del self._by_call_id[call_id]
+            phone = entry[2]
+            if phone and self._by_phone.get(phone) == call_id:
+                del self._by_phone[phone]
+
+    def stats(self):
+        return {
+            "calls": len(self._by_call_id),
+            "phones": len(self._by_phone),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class CallIndexRefresher:
+    """Background thread that re-lists Omnia calls into a CallIndex every ``interval`` seconds.
+
+    ``fetch_calls`` returns Omnia's call listing, newest first. With the
+    interval below the index TTL, a call in progress stays indexed and its
+    caller number points at it, so webhook lookups hit the index instead of
+    downloading the listing themselves. A failed pass is logged and retried
+    on the next one.
+
+    With a ``store`` (see call_listing_store.CallListingStore) the workers on
+    a host share one listing per interval: the worker that claims the store's
+    lease fetches and publishes it, and the others index the published copy
+    instead of fetching their own.
+    """
+
+    def __init__(self, index, fetch_calls, interval=CALL_INDEX_REFRESH_INTERVAL, store=None):
+        # A worker reading a shared listing may index it up to one interval after it was fetched
+        if interval * (2 if store is not None else 1) >= index.ttl:
+            logger.warning(f"Call index refresh interval {interval:g}s is too long for its TTL {index.ttl:g}s; "
+                           f"calls will expire between refreshes")
+        self.index = index
+        self.fetch_calls = fetch_calls
+        self.interval = interval
+        self.store = store
+        self._listed_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.refreshes = 0
+        self.adopted = 0
+        self.failures = 0
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def claim(self):
+        """Whether this process fetches the listing this pass, rather than reading another worker's."""
+        return self.store is None or self.store.claim(self.interval)
+
+    def publish(self, calls):
+        """Index a listing this process fetched and share it with the other workers. Returns new call_ids."""
+        if self.store is not None:
+            self._listed_at = self.store.publish(calls)
+        self.refreshes += 1
+        return self.index.upsert_many(calls)
+
+    def adopt(self):
+        """Index the shared listing if it is newer than the last one indexed here. Returns new call_ids."""
+        listing = self.store.latest(self._listed_at) if self.store is not None else None
+        if listing is None:
+            return 0
+        self._listed_at, calls = listing
+        # Entries answer for ttl seconds after the fetch, not after this worker read it
+        age = max(0.0, time.time() - self._listed_at)
+        self.adopted += 1
+        return self.index.upsert_many(calls, now=time.monotonic() - age)
+
+    def run_once(self):
+        """Fetch and index the listing, or index another worker's. Returns the number of new call_ids."""
+        if self.claim():
+            return self.publish(self.fetch_calls())
+        return self.adopt()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Call index refresh failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the thread in this process unless it is disabled or already running (e.g. again after a fork)."""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="call-index-refresher", daemon=True)
+            self._thread.start()
+        logger.info(f"Call index refresher started, listing Omnia calls every {self.interval:g}s")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"refreshes": self.refreshes, "adopted": self.adopted, "failures": self.failures,
+                "interval": self.interval}
+
+
+call_index = CallIndex()
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CALL_LISTING_STORE_PATH = os.getenv('CALL_LISTING_STORE_PATH', 'call_listing.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_listing (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    listed_at REAL NOT NULL,
+    calls TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS call_listing_claims (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    claimed_until REAL NOT NULL
+);
+"""
+
+
+class CallListingStore:
+    """SQLite-backed copy of the latest Omnia call listing, shared by every worker on the host.
+
+    One worker at a time claims the next fetch; it publishes the listing it
+    got and the others read it from here instead of downloading their own.
+    ``listed_at`` is wall-clock (``time.time()``) so every process can tell
+    how old the listing is.
+    """
+
+    def __init__(self, path=CALL_LISTING_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def claim(self, lease):
+        """Claim the next Omnia fetch for ``lease`` seconds. Returns False if another process holds it."""
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                "INSERT INTO call_listing_claims (id, claimed_until) VALUES (1, ?) "
+                "ON CONFLICT (id) DO UPDATE SET claimed_until = excluded.claimed_until "
+                "WHERE claimed_until <= ?",
+                (now + lease, now)
+            )
+        except sqlite3.Error as e:
+            # Without the store, fall back to fetching in this process
+            logger.warning(f"Could not claim the Omnia call listing fetch: {str(e)}")
+            return True
+        return cursor.rowcount == 1
+
+    def publish(self, calls):
+        """Replace the shared listing with ``calls``. Returns its listed_at."""
+        listed_at = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO call_listing (id, listed_at, calls) VALUES (1, ?, ?)",
+                (listed_at, json.dumps(calls))
+            )
+        except sqlite3.Error as e:
+            # The other workers fetch for themselves once their index runs dry
+            logger.warning(f"Could not share the Omnia call listing: {str(e)}")
+        return listed_at
+
+    def latest(self, after=0.0):
+        """Return (listed_at, calls) if the shared listing is newer than ``after``, else None."""
+        try:
+            row = self._connection().execute(
+                "SELECT listed_at, calls FROM call_listing WHERE id = 1 AND listed_at > ?", (after,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the shared Omnia call listing: {str(e)}")
+            return None
+        if row is None:
+            return None
+        listed_at, calls = row
+        return listed_at, json.loads(calls)
@@ -0,0 +1,149 @@
+"""The parts of the /handle_incoming_call pipeline that don't depend on a web framework.
+
+app.py (Flask) and async_app.py (aiohttp) both build on these: the upstream
+settings, the TrackDrive payload, the blocking keypress sender and the
+keypress outbox it feeds.
+"""
+import logging
+import os
+
+import requests
+from dotenv import load_dotenv
+
+from http_client import get_client
+from logging_setup import LazyJSON
+from outbox import KeypressOutbox
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SERVER_SECRET = os.getenv('SERVER_SECRET')
+OMNIA_VOICE_API_KEY = os.getenv('OMNIA_VOICE_API_KEY')
+TRACKDRIVE_AUTH = os.getenv('TRACKDRIVE_AUTH')
+
+OMNIA_CALLS_URL = os.getenv('OMNIA_CALLS_URL', "https://api.omnia-voice.com/api/calls")
+# Only the newest calls are listed; calls in progress are always among them. 0 lists every call.
+OMNIA_CALLS_LIMIT = int(os.getenv('OMNIA_CALLS_LIMIT', '1000'))
+TRACKDRIVE_KEYPRESS_URL = os.getenv('TRACKDRIVE_KEYPRESS_URL',
+                                    "https://{subdomain}.trackdrive.com/api/v1/calls/send_key_press")
+
+trackdrive_client = get_client('trackdrive')
+
+# 'sync' posts the keypress before answering Vapi; 'outbox' persists it locally
+# and answers immediately while a background dispatcher delivers it.
+TRACKDRIVE_DELIVERY_MODE = os.getenv('TRACKDRIVE_DELIVERY_MODE', 'sync')
+
+# The fields handle_send_financial_details and build_combined_data read
+SEND_FINANCIAL_DETAILS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "total_estimated_debt": {"type": "number", "description": "Total amount of debt."},
+        "debt_type": {"type": "string", "description": "Type of debt (e.g., credit card, student loan)."},
+        "monthly_income": {"type": "number", "description": "Monthly income of the caller."},
+        "valid_checking_account": {"type": "boolean", "description": "Whether the caller has a checking account."},
+        "already_enrolled_in_relief_program": {"type": "boolean",
+                                               "description": "Whether the caller is already in a debt relief program."}
+    },
+    "required": ["total_estimated_debt", "debt_type", "monthly_income", "valid_checking_account",
+                 "already_enrolled_in_relief_program"]
+}
+
+
+def omnia_headers():
+    return {
+        "X-API-Key": OMNIA_VOICE_API_KEY,
+        "Content-Type": "application/json"
+    }
+
+
+def omnia_calls_params():
+    """Query string asking Omnia for its newest OMNIA_CALLS_LIMIT calls only"""
+    return {"limit": str(OMNIA_CALLS_LIMIT)} if OMNIA_CALLS_LIMIT else {}
+
+
+def newest_calls(calls):
+    """Cut a listing down to OMNIA_CALLS_LIMIT calls, in case Omnia returned more than asked for"""
+    return calls[:OMNIA_CALLS_LIMIT] if OMNIA_CALLS_LIMIT else calls
+
+
+def build_combined_data(webhook_data, parameters):
+    """Merge the Omnia call record with the financial details collected by the assistant"""
+    return {
+        "first_name": webhook_data.get('first_name', ''),
+        "last_name": webhook_data.get('last_name', ''),
+        "email": webhook_data.get('email', ''),
+        "address": webhook_data.get('address', ''),
+        "city": webhook_data.get('city', ''),
+        "state": webhook_data.get('state', ''),
+        "zip": webhook_data.get('zip', ''),
+        "campaign_title": webhook_data.get('campaign_title', ''),
+        "additional_data": webhook_data.get('additional_data', 'NA'),
+        "caller_phone_number": webhook_data.get('caller_phone_number', ''),
+        "total_estimated_debt": parameters.get('total_estimated_debt'),
+        "debt_type": parameters.get('debt_type'),
+        "monthly_income": parameters.get('monthly_income'),
+        "valid_checking_account": parameters.get('valid_checking_account'),
+        "already_enrolled_in_relief_program": parameters.get('already_enrolled_in_relief_program'),
+    }
+
+
+def build_trackdrive_request(td_uuid, keypress, subdomain, combined_data):
+    """Return the (url, headers, payload) for a TrackDrive send_key_press call"""
+    url = TRACKDRIVE_KEYPRESS_URL.format(subdomain=subdomain)
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Basic {TRACKDRIVE_AUTH}"
+    }
+    payload = {
+        "id": td_uuid,
+        "digits": keypress,
+        "data": combined_data
+    }
+    return url, headers, payload
+
+
+def send_trackdrive_keypress(td_uuid, keypress, subdomain="global-telecom-investors", combined_data=None):
+    logger.info("-------- SENDING TO TRACKDRIVE --------")
+    logger.info(f"Preparing TrackDrive request for td_uuid: {td_uuid}")
+
+    if not td_uuid:
+        logger.error("❌ Missing td_uuid - Cannot proceed with TrackDrive update")
+        return False
+
+    url, headers, payload = build_trackdrive_request(td_uuid, keypress, subdomain, combined_data)
+
+    logger.info("TrackDrive request details:")
+    logger.info(f"URL: {url}")
+    logger.info("Payload: %s", LazyJSON(payload))
+
+    try:
+        logger.info("Sending request to TrackDrive")
+        with span('trackdrive_post'):
+            response = trackdrive_client.post(url, headers=headers, json=payload)
+        response.raise_for_status()
+
+        logger.info("✅ Successfully sent data to TrackDrive")
+        logger.info(f"Response status: {response.status_code}")
+        logger.info("Response body: %s", LazyJSON(response.text))
+
+        if keypress == '*':
+            logger.info(f"✅ Call transfer initiated for td_uuid: {td_uuid}")
+
+        return True
+    except requests.RequestException as e:
+        logger.error(f"❌ Failed to send data to TrackDrive: {str(e)}")
+        if getattr(e, 'response', None) is not None:
+            logger.error(f"Response status: {e.response.status_code}")
+            logger.error("Response body: %s", LazyJSON(e.response.text))
+        return False
+
+
+keypress_outbox = None
+if TRACKDRIVE_DELIVERY_MODE == 'outbox':
+    keypress_outbox = KeypressOutbox(send_trackdrive_keypress)
+    # Pick up keypresses left undelivered by a previous run. Under gunicorn the post_fork hook
+    # starts it in each worker instead, so the preloading master never sends (see gunicorn.conf.py).
+    if not os.getenv('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        keypress_outbox.ensure_started()
@@ -0,0 +1,493 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from call_index import normalize_phone
+
+CALL_STORE_PATH = os.getenv('CALL_STORE_PATH', 'calls.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id TEXT PRIMARY KEY,
+    assistant_id TEXT,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    caller_number TEXT,
+    call_summary TEXT,
+    tools_used TEXT NOT NULL,
+    financial_details TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_created_at ON calls (created_at);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    assistant_id TEXT PRIMARY KEY,
+    high_water TEXT NOT NULL
+);
+"""
+
+# Applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    SCHEMA,
+    """
+    ALTER TABLE calls ADD COLUMN campaign TEXT;
+    CREATE TABLE IF NOT EXISTS call_aggregates (
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        assistant_id TEXT NOT NULL,
+        campaign TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (granularity, bucket, assistant_id, campaign, metric)
+    ) WITHOUT ROWID;
+    """,
+    """
+    ALTER TABLE calls ADD COLUMN phone_e164 TEXT;
+    ALTER TABLE calls ADD COLUMN phone_reversed TEXT;
+    CREATE INDEX IF NOT EXISTS calls_phone_e164 ON calls (phone_e164, created_at);
+    CREATE INDEX IF NOT EXISTS calls_phone_reversed ON calls (phone_reversed, created_at);
+    CREATE INDEX IF NOT EXISTS calls_created_at_id ON calls (created_at, id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_cursors (
+        assistant_id TEXT PRIMARY KEY,
+        cursor TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ingest_claims (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        claimed_until REAL NOT NULL
+    );
+    """,
+]
+
+PHONE_MATCHES = ("exact", "prefix", "suffix")
+
+CALL_COLUMNS = ("id", "assistant_id", "campaign", "status", "created_at", "caller_number", "call_summary",
+                "tools_used", "financial_details")
+
+# Bucket keys are prefixes of the ISO createdAt timestamp: '2024-07-01T13' and '2024-07-01'
+GRANULARITIES = {"hour": 13, "day": 10}
+
+
+def _statements(script):
+    """Split a migration script into the single statements execute() accepts."""
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+def _as_text(value):
+    return value if value is None or isinstance(value, str) else json.dumps(value)
+
+
+def _call_metrics(tools_used):
+    metrics = Counter({"calls": 1})
+    for tool_name in tools_used:
+        metrics[f"tool:{tool_name}"] += 1
+    metrics["qualified_leads"] = metrics["tool:sendFinancialDetails"]
+    return metrics
+
+
+def metrics_to_analysis(metrics):
+    """Shape summed aggregate metrics like analysis.summarize_calls output."""
+    total = metrics.get("calls", 0)
+    qualified = metrics.get("qualified_leads", 0)
+    return {
+        "total_calls": total,
+        "tool_usage": {name[5:]: count for name, count in metrics.items() if name.startswith("tool:") and count},
+        "qualified_leads": qualified,
+        "qualification_rate": f"{(qualified / total) * 100:.2f}%" if total else "0.00%"
+    }
+
+
+def _phone_keys(caller_number):
+    """(E.164 form, reversed digits) for the phone index; reversed digits make suffix search a prefix scan."""
+    phone_e164 = normalize_phone(caller_number)
+    if phone_e164 is None:
+        return None, None
+    return phone_e164, phone_e164[:0:-1]
+
+
+def _prefix_range(prefix):
+    """Half-open [low, high) range of strings starting with prefix, so the B-tree index is used."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def encode_cursor(created_at, call_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, call_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, call_id) of a cursor from encode_cursor. Raises ValueError for anything else."""
+    value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not (isinstance(value, list) and len(value) == 2 and all(isinstance(part, str) for part in value)):
+        raise ValueError("cursor is not a [created_at, call_id] pair")
+    created_at, call_id = value
+    return created_at, call_id
+
+
+def _row_to_call(row):
+    call = dict(zip(CALL_COLUMNS, row))
+    call["potential_uuid"] = call["id"]
+    call["tools_used"] = json.loads(call["tools_used"])
+    return call
+
+
+class CallStore:
+    """SQLite store of processed Vapi calls for the analysis dashboard."""
+
+    def __init__(self, path=CALL_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._migrate()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        """Apply pending migrations, each with its user_version bump in one transaction.
+
+        executescript() would commit on its own, so a failing migration could
+        leave its schema changes half applied without the version recording
+        them. The version is re-read under the write lock, so workers starting
+        together apply each migration once.
+        """
+        conn = self._connection()
+        with self._write_lock:
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version >= len(MIGRATIONS):
+                        conn.execute("COMMIT")
+                        return
+                    number = version + 1
+                    for statement in _statements(MIGRATIONS[version]):
+                        conn.execute(statement)
+                    if number == 2:
+                        self._rebuild_aggregates(conn)
+                    if number == 3:
+                        self._backfill_phone_index(conn)
+                    conn.execute(f"PRAGMA user_version = {number}")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+    def _backfill_phone_index(self, conn):
+        rows = conn.execute("SELECT id, caller_number FROM calls").fetchall()
+        conn.executemany(
+            "UPDATE calls SET phone_e164 = ?, phone_reversed = ? WHERE id = ?",
+            [(*_phone_keys(caller_number), call_id) for call_id, caller_number in rows]
+        )
+
+    def _rebuild_aggregates(self, conn):
+        conn.execute("DELETE FROM call_aggregates")
+        rows = conn.execute("SELECT assistant_id, campaign, created_at, tools_used FROM calls").fetchall()
+        for assistant_id, campaign, created_at, tools_used in rows:
+            self._apply_aggregates(conn, assistant_id, campaign, created_at, json.loads(tools_used), 1)
+
+    def _apply_aggregates(self, conn, assistant_id, campaign, created_at, tools_used, sign):
+        """Add (sign=1) or remove (sign=-1) one call's contribution to every bucket it falls in."""
+        if not created_at:
+            return
+        metrics = _call_metrics(tools_used)
+        for granularity, width in GRANULARITIES.items():
+            bucket = created_at[:width]
+            conn.executemany(
+                "INSERT INTO call_aggregates (granularity, bucket, assistant_id, campaign, metric, value) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (granularity, bucket, assistant_id, campaign, metric) "
+                "DO UPDATE SET value = value + excluded.value",
+                [(granularity, bucket, assistant_id or "", campaign or "", metric, sign * value)
+                 for metric, value in metrics.items() if value]
+            )
+
+    def upsert_calls(self, calls):
+        """Insert processed calls, replacing ids already stored. Returns the number written."""
+        conn = self._connection()
+        written = 0
+        with self._write_lock:
+            conn.execute("BEGIN")
+            try:
+                for call in calls:
+                    previous = conn.execute(
+                        "SELECT assistant_id, campaign, created_at, tools_used FROM calls WHERE id = ?",
+                        (call["potential_uuid"],)
+                    ).fetchone()
+                    if previous is not None:
+                        assistant_id, campaign, created_at, tools_used = previous
+                        self._apply_aggregates(conn, assistant_id, campaign, created_at, json.loads(tools_used), -1)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO calls (id, assistant_id, campaign, status, created_at, caller_number, "
+                        "call_summary, tools_used, financial_details, phone_e164, phone_reversed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (call["potential_uuid"], call.get("assistant_id"), call.get("campaign"), call.get("status"),
+                         call["created_at"], call["caller_number"], call["call_summary"],
+                         json.dumps(call["tools_used"]), _as_text(call["financial_details"]),
+                         *_phone_keys(call["caller_number"]))
+                    )
+                    self._apply_aggregates(conn, call.get("assistant_id"), call.get("campaign"),
+                                           call["created_at"], call["tools_used"], 1)
+                    written += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return written
+
+    def high_water(self, assistant_id):
+        """createdAt of the newest call ingested for an assistant, or None before the first run."""
+        row = self._connection().execute(
+            "SELECT high_water FROM ingest_state WHERE assistant_id = ?", (assistant_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, assistant_id, created_at):
+        self._connection().execute(
+            "INSERT INTO ingest_state (assistant_id, high_water) VALUES (?, ?) "
+            "ON CONFLICT (assistant_id) DO UPDATE SET high_water = excluded.high_water",
+            (assistant_id, created_at)
+        )
+
+    def ingest_cursor(self, assistant_id):
+        """Where an unfinished ingest of an assistant stopped, as saved by save_ingest_cursor, or None."""
+        row = self._connection().execute(
+            "SELECT cursor FROM ingest_cursors WHERE assistant_id = ?", (assistant_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_ingest_cursor(self, assistant_id, cursor):
+        self._connection().execute(
+            "INSERT INTO ingest_cursors (assistant_id, cursor) VALUES (?, ?) "
+            "ON CONFLICT (assistant_id) DO UPDATE SET cursor = excluded.cursor",
+            (assistant_id, json.dumps(cursor))
+        )
+
+    def finish_ingest(self, assistant_id, high_water=None):
+        """Drop an assistant's ingest cursor and, if given, move its high-water mark, in one transaction."""
+        conn = self._connection()
+        with self._write_lock:
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM ingest_cursors WHERE assistant_id = ?", (assistant_id,))
+                if high_water is not None:
+                    self.set_high_water(assistant_id, high_water)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def claim_ingest(self, lease):
+        """Claim the next ingest for ``lease`` seconds. Returns False if another process holds the claim."""
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO ingest_claims (id, claimed_until) VALUES (1, ?) "
+            "ON CONFLICT (id) DO UPDATE SET claimed_until = excluded.claimed_until "
+            "WHERE claimed_until <= ?",
+            (now + lease, now)
+        )
+        return cursor.rowcount == 1
+
+    def hold_ingest(self, seconds):
+        """Keep the ingest claim for ``seconds`` from now, e.g. until the next run is due."""
+        self._connection().execute("UPDATE ingest_claims SET claimed_until = ? WHERE id = 1", (time.time() + seconds,))
+
+    def _phone_filter(self, search_number, match):
+        """SQL condition and parameters for a phone search, or (None, ()) to match everything."""
+        if not search_number:
+            return None, ()
+        digits = ''.join(ch for ch in search_number if ch.isdigit())
+        if not digits:
+            return "0", ()
+        if match == "auto":
+            # A full number is an exact lookup; a fragment is treated as its last digits
+            match = "exact" if len(digits) >= 10 else "suffix"
+        if match == "exact":
+            return "phone_e164 = ?", (normalize_phone(search_number),)
+        if match == "prefix":
+            # "+44..." is an E.164 prefix; bare digits are a US area code / exchange
+            prefix = "+" + digits if search_number.strip().startswith("+") else "+1" + digits
+            return "phone_e164 >= ? AND phone_e164 < ?", _prefix_range(prefix)
+        if match == "suffix":
+            return "phone_reversed >= ? AND phone_reversed < ?", _prefix_range(digits[::-1])
+        raise ValueError(f"Unknown phone match: {match}")
+
+    def search_calls(self, search_number=None, match="auto", limit=100, cursor=None, start=None, end=None,
+                     summary_chars=None):
+        """Calls newest first, optionally filtered by phone number, one page at a time.
+
+        ``match`` is "exact" (E.164), "prefix" (country/area code), "suffix"
+        (last N digits) or "auto". ``start``/``end`` bound createdAt to
+        [start, end) as ISO strings. Returns (calls, next_cursor); pass
+        next_cursor back to get the following page. ``limit=None`` returns
+        every match. With ``summary_chars`` only that much of each summary is
+        read, and ``summary_truncated`` says whether there is more.
+        """
+        condition, params = self._phone_filter(search_number, match)
+        conditions = [condition] if condition else []
+        params = list(params)
+        if start:
+            conditions.append("created_at >= ?")
+            params.append(start)
+        if end:
+            conditions.append("created_at < ?")
+            params.append(end)
+        if cursor:
+            created_at, call_id = decode_cursor(cursor)
+            conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params += [created_at, created_at, call_id]
+        columns = ', '.join(CALL_COLUMNS)
+        if summary_chars is not None:
+            columns = columns.replace("call_summary", f"substr(call_summary, 1, {int(summary_chars)})")
+            columns += ", length(call_summary)"
+        query = f"SELECT {columns} FROM calls"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+        calls = []
+        for row in self._connection().execute(query, params):
+            call = _row_to_call(row[:len(CALL_COLUMNS)])
+            if summary_chars is not None:
+                call["summary_truncated"] = (row[-1] or 0) > summary_chars
+            calls.append(call)
+        next_cursor = None
+        if limit is not None and len(calls) > limit:
+            calls = calls[:limit]
+            next_cursor = encode_cursor(calls[-1]["created_at"], calls[-1]["id"])
+        return calls, next_cursor
+
+    def iter_calls(self, search_number=None, match="auto", start=None, end=None, batch_size=500):
+        """Yield every matching call, newest first, reading ``batch_size`` rows at a time."""
+        cursor = None
+        while True:
+            calls, cursor = self.search_calls(search_number, match, batch_size, cursor, start, end)
+            yield from calls
+            if cursor is None:
+                return
+
+    def list_calls(self, search_number=None, match="auto"):
+        """Every stored call matching a phone search, newest first."""
+        return self.search_calls(search_number, match, limit=None)[0]
+
+    def get_call(self, call_id):
+        """A single stored call with its full summary, or None."""
+        row = self._connection().execute(
+            f"SELECT {', '.join(CALL_COLUMNS)} FROM calls WHERE id = ?", (call_id,)
+        ).fetchone()
+        return _row_to_call(row) if row else None
+
+    def search_metrics(self, search_number=None, match="auto"):
+        """Summed metrics over the calls matching a phone search, computed in SQLite."""
+        condition, params = self._phone_filter(search_number, match)
+        where = f" WHERE {condition}" if condition else ""
+        conn = self._connection()
+        metrics = Counter({"calls": conn.execute(f"SELECT COUNT(*) FROM calls{where}", params).fetchone()[0]})
+        tool_counts = conn.execute(
+            f"SELECT tool.value, COUNT(*) FROM calls, json_each(calls.tools_used) AS tool{where} GROUP BY tool.value",
+            params
+        )
+        for tool_name, count in tool_counts:
+            metrics[f"tool:{tool_name}"] += count
+        metrics["qualified_leads"] = metrics["tool:sendFinancialDetails"]
+        return metrics
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    def _sum_buckets(self, granularity, first, last, assistant_id, campaign, metrics):
+        query = ("SELECT metric, SUM(value) FROM call_aggregates "
+                 "WHERE granularity = ? AND bucket >= ? AND bucket <= ?")
+        params = [granularity, first, last]
+        if assistant_id is not None:
+            query += " AND assistant_id = ?"
+            params.append(assistant_id)
+        if campaign is not None:
+            query += " AND campaign = ?"
+            params.append(campaign)
+        for metric, value in self._connection().execute(query + " GROUP BY metric", params):
+            metrics[metric] += value
+
+    def aggregate(self, start=None, end=None, assistant_id=None, campaign=None):
+        """Summed metrics for calls created in [start, end), at hour resolution.
+
+        Whole days in the window are read from day buckets and only the partial
+        days at either end from hour buckets, so a query touches at most
+        ``days + 48`` rows per metric however many calls the window holds.
+        """
+        metrics = Counter()
+        if start is None and end is None:
+            self._sum_buckets("day", "", "\uffff", assistant_id, campaign, metrics)
+            return metrics
+        start = _floor_hour(start) if start else datetime(1970, 1, 1)
+        end = _floor_hour(end) if end else _floor_hour(datetime.now(timezone.utc)) + timedelta(hours=1)
+        if end <= start:
+            return metrics
+        first_full_day = (start + timedelta(hours=23)).replace(hour=0)
+        last_full_day = end.replace(hour=0)
+        if first_full_day < last_full_day:
+            self._sum_buckets("day", _day(first_full_day), _day(last_full_day - timedelta(days=1)),
+                              assistant_id, campaign, metrics)
+            if start < first_full_day:
+                self._sum_buckets("hour", _hour(start), _hour(first_full_day - timedelta(hours=1)),
+                                  assistant_id, campaign, metrics)
+            if last_full_day < end:
+                self._sum_buckets("hour", _hour(last_full_day), _hour(end - timedelta(hours=1)),
+                                  assistant_id, campaign, metrics)
+        else:
+            self._sum_buckets("hour", _hour(start), _hour(end - timedelta(hours=1)), assistant_id, campaign, metrics)
+        return metrics
+
+    def series(self, granularity, start=None, end=None, assistant_id=None, campaign=None):
+        """Per-bucket metrics for every hour or day bucket overlapping [start, end), for charts."""
+        width = GRANULARITIES[granularity]
+        first = _hour(_floor_hour(start))[:width] if start else ""
+        last = _hour(_floor_hour(end) - timedelta(hours=1))[:width] if end else "\uffff"
+        query = ("SELECT bucket, metric, SUM(value) FROM call_aggregates "
+                 "WHERE granularity = ? AND bucket >= ? AND bucket <= ?")
+        params = [granularity, first, last]
+        if assistant_id is not None:
+            query += " AND assistant_id = ?"
+            params.append(assistant_id)
+        if campaign is not None:
+            query += " AND campaign = ?"
+            params.append(campaign)
+        buckets = {}
+        for bucket, metric, value in self._connection().execute(query + " GROUP BY bucket, metric", params):
+            buckets.setdefault(bucket, Counter())[metric] += value
+        return buckets
+
+
+def _floor_hour(moment):
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def _hour(moment):
+    return moment.strftime("%Y-%m-%dT%H")
+
+
+def _day(moment):
+    return moment.strftime("%Y-%m-%d")
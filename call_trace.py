@@ -0,0 +1,116 @@
+import logging
+import logging.handlers
+import os
+import random
+import threading
+
+from logging_setup import LazyJSON
+
+ANALYSIS_TRACE = os.getenv('ANALYSIS_TRACE', '0') == '1'
+# Calls sampled at random per ingest run when no specific call id is targeted
+ANALYSIS_TRACE_SAMPLE = int(os.getenv('ANALYSIS_TRACE_SAMPLE', '5'))
+# Comma-separated call ids that are always traced while tracing is on
+ANALYSIS_TRACE_CALL_IDS = os.getenv('ANALYSIS_TRACE_CALL_IDS', '')
+ANALYSIS_TRACE_PATH = os.getenv('ANALYSIS_TRACE_PATH', 'analysis_trace.log')
+ANALYSIS_TRACE_MAX_BYTES = int(os.getenv('ANALYSIS_TRACE_MAX_BYTES', '65536'))
+
+
+class TraceSession:
+    """Decides which calls of one request or ingest run get traced.
+
+    Targeted call ids are written as soon as they are seen. Otherwise the
+    session keeps a uniform random sample of ``sample`` calls (reservoir
+    sampling), written when the run calls finish().
+    """
+
+    __slots__ = ('tracer', 'call_ids', 'sample', 'seen', '_reservoir', '_lock')
+
+    def __init__(self, tracer, call_ids, sample):
+        self.tracer = tracer
+        self.call_ids = call_ids
+        self.sample = sample
+        self.seen = 0
+        self._reservoir = []
+        # Sessions are shared by the per-assistant ingest threads
+        self._lock = threading.Lock()
+
+    def trace(self, call, processed_call):
+        """Write a targeted call now, or offer the call to the random sample."""
+        if self.call_ids:
+            call_id = processed_call.get("potential_uuid")
+            if call_id in self.call_ids:
+                self.tracer.write_call(call_id, call, processed_call)
+            return
+        with self._lock:
+            self.seen += 1
+            if len(self._reservoir) < self.sample:
+                self._reservoir.append((call, processed_call))
+            else:
+                slot = random.randrange(self.seen)
+                if slot < self.sample:
+                    self._reservoir[slot] = (call, processed_call)
+
+    def finish(self):
+        """Write the sampled calls. Safe to call more than once."""
+        with self._lock:
+            sampled, self._reservoir = self._reservoir, []
+        for call, processed_call in sampled:
+            self.tracer.write_call(processed_call.get("potential_uuid"), call, processed_call)
+
+
+class _NullSession:
+    __slots__ = ()
+
+    def trace(self, call, processed_call):
+        pass
+
+    def finish(self):
+        pass
+
+
+class CallTracer:
+    """Opt-in tracing of Vapi call objects through the analysis pipeline.
+
+    Off by default. When enabled, each session traces either a random sample
+    of ``sample`` calls or only the targeted call ids, and writes them to a
+    rotating file of its own instead of the application log.
+    """
+
+    def __init__(self, enabled=ANALYSIS_TRACE, sample=ANALYSIS_TRACE_SAMPLE, call_ids=ANALYSIS_TRACE_CALL_IDS,
+                 path=ANALYSIS_TRACE_PATH, max_bytes=ANALYSIS_TRACE_MAX_BYTES):
+        self.enabled = enabled
+        self.sample = sample
+        self.call_ids = frozenset(call_id.strip() for call_id in call_ids.split(',') if call_id.strip())
+        self.path = path
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger('analysis.trace')
+        self.logger.propagate = False
+        self._lock = threading.Lock()
+
+    def _ensure_handler(self):
+        if self.logger.handlers:
+            return
+        with self._lock:
+            if not self.logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=50 * 1024 * 1024, backupCount=3)
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self.logger.addHandler(handler)
+                self.logger.setLevel(logging.DEBUG)
+
+    def session(self, call_id=None, sample=None):
+        """Start a trace session; ``call_id`` targets one call instead of sampling."""
+        if not self.enabled:
+            return _NullSession()
+        call_ids = {call_id} if call_id else self.call_ids
+        return TraceSession(self, call_ids, self.sample if sample is None else sample)
+
+    def write(self, call_id, stage, payload):
+        self._ensure_handler()
+        self.logger.debug("call=%s stage=%s %s", call_id, stage, LazyJSON(payload, max_bytes=self.max_bytes))
+
+    def write_call(self, call_id, call, processed_call):
+        self.write(call_id, "raw", call)
+        self.write(call_id, "processed", processed_call)
+
+
+call_tracer = CallTracer()
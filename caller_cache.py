@@ -0,0 +1,273 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CALLER_CACHE_CAPACITY = int(os.getenv('CALLER_CACHE_CAPACITY', '10000'))
+CALLER_CACHE_HIT_TTL = float(os.getenv('CALLER_CACHE_HIT_TTL', '86400'))
+CALLER_CACHE_MISS_TTL = float(os.getenv('CALLER_CACHE_MISS_TTL', '3600'))
+CALLER_CACHE_ERROR_TTL = float(os.getenv('CALLER_CACHE_ERROR_TTL', '30'))
+# How long past its TTL an entry may still be served while a refresh runs
+CALLER_CACHE_STALE_TTL = float(os.getenv('CALLER_CACHE_STALE_TTL', '86400'))
+# How long a request waits on another thread's lookup of the same caller before giving up on it
+CALLER_CACHE_LOAD_WAIT = float(os.getenv('CALLER_CACHE_LOAD_WAIT', '10'))
+# How long a worker's claim on refreshing a caller holds off the other workers' refreshers
+CALLER_CACHE_REFRESH_LEASE = float(os.getenv('CALLER_CACHE_REFRESH_LEASE', '60'))
+
+HIT, MISS, ERROR = 'hit', 'miss', 'error'
+
+
+class _Entry:
+    __slots__ = ('value', 'kind', 'fresh_until', 'stale_until', 'hits', 'last_access')
+
+    def __init__(self, value, kind, fresh_until, stale_until, hits=0):
+        self.value = value
+        self.kind = kind
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.hits = hits
+        self.last_access = time.monotonic()
+
+
+class CallerProfileCache:
+    """LRU cache of caller profiles with per-outcome TTLs and stale-while-revalidate.
+
+    ``loader(phone)`` returns a profile (truthy), or a falsy value when the
+    caller is unknown, and raises when the lookup itself failed. Hits, misses
+    and errors are cached for their own TTL, so a TextBack outage is retried
+    after seconds instead of being remembered for a day. Concurrent lookups
+    of one caller share a single loader call; a request waits at most
+    ``load_wait`` seconds for it, then answers with whatever is cached
+    (None if nothing is) instead of blocking its worker thread. Once an entry's TTL
+    has passed it is still served for up to ``stale_ttl`` while a background
+    refresh replaces it, so the greeting never waits on a known caller.
+
+    With a ``store`` (see profile_store.ProfileStore), profiles missing from
+    memory are read from the shared on-disk store before calling the loader,
+    and every hit or miss the loader returns is written back to it.
+    """
+
+    def __init__(self, loader, capacity=CALLER_CACHE_CAPACITY, hit_ttl=CALLER_CACHE_HIT_TTL,
+                 miss_ttl=CALLER_CACHE_MISS_TTL, error_ttl=CALLER_CACHE_ERROR_TTL,
+                 stale_ttl=CALLER_CACHE_STALE_TTL, refresh_workers=4, store=None, load_wait=CALLER_CACHE_LOAD_WAIT):
+        self.loader = loader
+        self.store = store
+        self.load_wait = load_wait
+        self.capacity = capacity
+        self.ttls = {HIT: hit_ttl, MISS: miss_ttl, ERROR: error_ttl}
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="caller-cache")
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "store_hits": 0,
+            "load_errors": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "load_wait_timeouts": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def _count(self, name):
+        """Bump a stats counter. Caller holds the lock."""
+        self.counters[name] += 1
+
+    def get(self, phone_number):
+        """Return the cached profile, or None for unknown callers and failed lookups."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(phone_number)
+                entry.hits += 1
+                entry.last_access = now
+                if now < entry.fresh_until:
+                    self._count("hits" if entry.kind == HIT else "negative_hits")
+                else:
+                    self._count("stale_hits")
+                    self._refresh_in_background(phone_number)
+                return entry.value
+            self._count("misses")
+        if self.store is not None:
+            entry = self._from_store(phone_number, now)
+            if entry is not None:
+                return entry.value
+        return self._load(phone_number)
+
+    def _from_store(self, phone_number, now, refresh=True):
+        try:
+            record = self.store.get(phone_number)
+        except sqlite3.Error as e:
+            logger.warning(f"Caller profile store read failed for {phone_number}: {str(e)}")
+            return None
+        if record is None:
+            return None
+        value, kind, hits, fresh_until, stale_until = record
+        # The store keeps wall-clock expiry; memory entries use the monotonic clock
+        offset = now - time.time()
+        entry = _Entry(value, kind, fresh_until + offset, stale_until + offset, hits)
+        with self._lock:
+            self._insert(phone_number, entry)
+            self._count("store_hits")
+            if refresh and now >= entry.fresh_until:
+                self._refresh_in_background(phone_number)
+        return entry
+
+    def preload(self, limit):
+        """Copy the ``limit`` most-read profiles from the store into memory. Returns how many were loaded.
+
+        Entries past their TTL are loaded as they are, so a deploy doesn't
+        send a burst of lookups upstream. Start a CacheRefresher alongside:
+        it renews them at its paced rate, most-read first.
+        """
+        if self.store is None or limit <= 0:
+            return 0
+        try:
+            phones = self.store.hot(limit)
+        except sqlite3.Error as e:
+            logger.warning(f"Caller profile store read failed during preload: {str(e)}")
+            return 0
+        loaded = 0
+        now = time.monotonic()
+        for phone_number in phones:
+            with self._lock:
+                if phone_number in self._entries:
+                    continue
+            if self._from_store(phone_number, now, refresh=False) is not None:
+                loaded += 1
+        return loaded
+
+    def claim_refresh(self, phone_number, lease=CALLER_CACHE_REFRESH_LEASE):
+        """Return True if this process should look the caller up to refresh it.
+
+        With a store, a profile another worker already renewed is copied into
+        memory instead, and the refresh is claimed in the store so only one
+        worker on the host makes it. Returns False in both cases.
+        """
+        if self.store is None:
+            return True
+        now = time.monotonic()
+        try:
+            record = self.store.get(phone_number)
+        except sqlite3.Error as e:
+            logger.warning(f"Caller profile store read failed for {phone_number}: {str(e)}")
+            return True
+        if record is not None:
+            fresh_until = record[3] + now - time.time()
+            with self._lock:
+                entry = self._entries.get(phone_number)
+                # Converting between clocks drifts by microseconds; a renewal moves expiry by a whole TTL
+                renewed = entry is None or fresh_until > entry.fresh_until + 1
+            if renewed:
+                self._from_store(phone_number, now, refresh=False)
+                return False
+        return self.store.claim(phone_number, lease)
+
+    def prune_store(self):
+        """Delete profiles and refresh claims the store can no longer serve. Returns the number of profiles removed."""
+        if self.store is None:
+            return 0
+        try:
+            return self.store.prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Caller profile store prune failed: {str(e)}")
+            return 0
+
+    def refresh(self, phone_number):
+        """Reload an entry synchronously, keeping the old value if the lookup fails."""
+        return self._load(phone_number)
+
+    def _refresh_in_background(self, phone_number):
+        """Schedule a refresh unless one is already running. Caller holds the lock."""
+        if phone_number in self._loading:
+            return
+        self._loading[phone_number] = threading.Event()
+        self._count("refreshes")
+        self._executor.submit(self._load, phone_number, True)
+
+    def _load(self, phone_number, scheduled=False):
+        with self._lock:
+            pending = self._loading.get(phone_number)
+            if pending is not None and not scheduled:
+                owner = False
+            else:
+                pending = self._loading.setdefault(phone_number, threading.Event())
+                owner = True
+        if not owner:
+            # Another thread is already fetching this caller; share its result, but don't hang with it
+            if not pending.wait(self.load_wait):
+                with self._lock:
+                    self._count("load_wait_timeouts")
+                logger.warning(f"Caller profile lookup for {phone_number} still running after "
+                               f"{self.load_wait:g}s; answering without it")
+            entry = self._entries.get(phone_number)
+            return entry.value if entry is not None else None
+
+        try:
+            try:
+                value = self.loader(phone_number)
+                kind = HIT if value else MISS
+            except Exception as e:
+                logger.error(f"Caller profile lookup failed for {phone_number}: {str(e)}")
+                with self._lock:
+                    self._count("load_errors")
+                value, kind = None, ERROR
+            return self._store(phone_number, value, kind)
+        finally:
+            with self._lock:
+                self._loading.pop(phone_number, None)
+            pending.set()
+
+    def _store(self, phone_number, value, kind):
+        """Cache a lookup outcome and return the value callers should see."""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._entries.get(phone_number)
+            if kind == ERROR and previous is not None and previous.kind == HIT and now < previous.stale_until:
+                # Keep serving the last good profile; retry after error_ttl
+                previous.fresh_until = now + self.ttls[ERROR]
+                return previous.value
+            ttl = self.ttls[kind]
+            stale_ttl = self.stale_ttl if kind == HIT else 0
+            entry = _Entry(value, kind, now + ttl, now + ttl + stale_ttl, previous.hits if previous else 0)
+            self._insert(phone_number, entry)
+        if self.store is not None and kind != ERROR:
+            wall = time.time()
+            self.store.put(phone_number, value, kind, entry.hits, wall + ttl, wall + ttl + stale_ttl)
+        return value
+
+    def _insert(self, phone_number, entry):
+        """Add an entry, evicting least recently used ones over capacity. Caller holds the lock."""
+        self._entries[phone_number] = entry
+        self._entries.move_to_end(phone_number)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self._count("evictions")
+
+    def expiring(self, within):
+        """Keys of cached profiles whose TTL runs out within ``within`` seconds, most-read first."""
+        deadline = time.monotonic() + within
+        with self._lock:
+            due = [(entry.hits, key) for key, entry in self._entries.items()
+                   if entry.kind == HIT and entry.fresh_until <= deadline and key not in self._loading]
+        due.sort(reverse=True)
+        return [key for _, key in due]
+
+    def stats(self):
+        return dict(self.counters, size=len(self._entries), capacity=self.capacity)
@@ -1,16 +1,20 @@
-from flask import Flask, request, jsonify, abort
-import requests
-from requests.adapters import HTTPAdapter
+from flask import Flask, request, jsonify, Response
 import os
 from dotenv import load_dotenv
-from requests.packages.urllib3.util.retry import Retry
 import logging
-from cachetools import TTLCache, cached
 from time import time
-import threading
+from http_client import get_client
+from webhook_auth import limit_body_size, require_webhook_auth
+from warmup import WARMUP_HOT_PROFILES, Warmup, warm_connections
+from caller_cache import CallerProfileCache
+from cache_refresher import CacheRefresher
+from profile_store import ProfileStore, store_path
+import atexit
+from assistant_configs import assistant_configs
 
 load_dotenv()
 app = Flask(__name__)
+limit_body_size(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,73 +24,19 @@ SERVER_SECRET = os.getenv('SERVER_SECRET')
 TEXTBACK_API_URL = os.getenv('TEXTBACK_API_URL')
 TEXTBACK_API_TOKEN = os.getenv('TEXTBACK_API_TOKEN')
 TEXTBACK_API_SECRET = os.getenv('TEXTBACK_API_SECRET')
-#added session
-session = requests.Session()
-retry_strategy = Retry(
-    total=3,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["HEAD", "GET", "OPTIONS"],
-    backoff_factor=1
-)
-
-adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=10, pool_maxsize=100)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
-cache = TTLCache(maxsize=1000, ttl=86400)
+textback_client = get_client('textback')
 
 @app.route('/handle_incoming_call', methods=['POST'])
+@require_webhook_auth(lambda: SERVER_SECRET)
 def handle_incoming_call():
     data = request.json
 
     print(f"Incoming Request Data: {data}")
-    print(f"Headers: {request.headers}")
-
-    received_secret = request.headers.get('X-Vapi-Secret')
-    print(f"Received Secret: {received_secret}")
-
-    if received_secret != SERVER_SECRET:
-        abort(403) 
 
     message_type = data.get('message', {}).get('type')
 
     if message_type == 'assistant-request':
-        response = {
-            "assistant": {
-                "firstMessage": "Hi, thanks for calling in. My name is Jessica Miller. How can I assist you today?",
-                "model": {
-                    "provider": "openai",
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a helpful assistant. When a call is received, trigger the extractCallerInfo function and use the extracted information to personalize the conversation. Do not ask for the phone number, you have it already"
-                        }
-                    ],
-                    "functions": [
-                        {
-                            "name": "extractCallerInfo",
-                            "description": "Extracts the caller's phone number.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "callSid": {
-                                        "type": "string"
-                                    },
-                                    "from": {
-                                        "type": "string"
-                                    }
-                                },
-                                "required": [
-                                    "callSid",
-                                    "from"
-                                ]
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-        return jsonify(response), 200
+        return Response(assistant_configs.response_bytes('extracctname'), status=200, mimetype='application/json')
 
     elif message_type == 'function-call':
         function_call = data.get('message', {}).get('functionCall', {})
@@ -124,8 +74,10 @@ def handle_incoming_call():
 
     return jsonify({"error": "Invalid request"}), 400
 
-@cached(cache)
 def get_contact_info(phone_number):
+    return caller_cache.get(phone_number)
+
+def fetch_contact_info(phone_number):
     headers = {
         'accept': 'application/json',
         'token': TEXTBACK_API_TOKEN,
@@ -134,20 +86,44 @@ def get_contact_info(phone_number):
     params = {
         'phone': phone_number
     }
-    try:
-        response = session.get(TEXTBACK_API_URL, headers=headers, params=params, timeout=(5, 10)) 
-        response.raise_for_status()  
-        return response.json().get('info', {})
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
-        return None
+    response = textback_client.get(TEXTBACK_API_URL, headers=headers, params=params)
+    response.raise_for_status()  
+    return response.json().get('info', {})
+
+caller_cache = CallerProfileCache(fetch_contact_info, store=ProfileStore(store_path('extracctname')))
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(caller_cache.stats()), 200
     
-def refresh_cache():
-    while True:
-        # Get all cached phone numbers
-        for phone_number in list(cache.keys()):
-            get_contact_info(phone_number)
-        # time.sleep(86400)  # Refresh cache every 24 hours
+cache_refresher = CacheRefresher(caller_cache)
+
+# Run in each worker before it reports ready (see gunicorn.conf.py and /ready)
+warmup = Warmup('extracctname')
+
+@warmup.step('connections')
+def warm_upstream_connections():
+    return {"textback": warm_connections(textback_client, [TEXTBACK_API_URL])}
+
+@warmup.step('caller_profiles')
+def warm_caller_profiles():
+    # Preloaded profiles past their TTL are renewed by the refresher, whatever started this process
+    cache_refresher.start()
+    loaded = {"loaded": caller_cache.preload(WARMUP_HOT_PROFILES)}
+    if not cache_refresher.enabled:
+        # The refresher prunes the store; with it off, do it once per worker start
+        loaded["pruned"] = caller_cache.prune_store()
+    return loaded
+
+@warmup.step('assistant_configs')
+def warm_assistant_configs():
+    return {"version": assistant_configs.version, "bytes": len(assistant_configs.response_bytes('extracctname'))}
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until this worker's warm-up finished or ran out of time"""
+    warmup.start()
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
 
 
 # @app.route('/trigger_keypress', methods=['POST'])
@@ -171,6 +147,8 @@ def refresh_cache():
 
 if __name__ == '__main__':
     # Start cache refresh thread
-    cache_refresh_thread = threading.Thread(target=refresh_cache, daemon=True)
-    cache_refresh_thread.start()
-    app.run(debug=True, port=5000)
+    cache_refresher.start()
+    atexit.register(cache_refresher.stop)
+    warmup.start()
+    # Development server only; run under gunicorn in production (see DEPLOYMENT.md)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5000)
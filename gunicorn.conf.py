@@ -0,0 +1,110 @@
+"""Production gunicorn profile for the webhook apps. See DEPLOYMENT.md.
+
+    gunicorn                                    # app:app on gthread workers
+    GUNICORN_WORKER_MODEL=aiohttp gunicorn      # async_app on aiohttp workers
+    GUNICORN_APP=index:app gunicorn             # another Flask app, same profile
+
+gunicorn reads this file automatically from the working directory. Command
+line flags (e.g. --workers) still override it.
+"""
+import gc
+import math
+import os
+import sys
+
+# 'gthread' (Flask apps, a thread per in-flight call) or 'aiohttp' (async_app, one event loop per worker)
+WORKER_MODEL = os.getenv('GUNICORN_WORKER_MODEL', 'gthread')
+if WORKER_MODEL not in ('gthread', 'aiohttp'):
+    raise ValueError(f"GUNICORN_WORKER_MODEL must be gthread or aiohttp, not {WORKER_MODEL!r}")
+
+try:
+    CPU_COUNT = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPU_COUNT = os.cpu_count() or 1
+# Webhook calls in flight per instance at peak: rps x upstream latency (Omnia + TrackDrive round trips)
+EXPECTED_INFLIGHT = int(os.getenv('GUNICORN_EXPECTED_INFLIGHT', '64'))
+
+wsgi_app = os.getenv('GUNICORN_APP', 'async_app:create_app()' if WORKER_MODEL == 'aiohttp' else 'app:app')
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+if WORKER_MODEL == 'aiohttp':
+    worker_class = 'aiohttp.GunicornWebWorker'
+    # One event loop per core; concurrency comes from the loop, not from more processes
+    workers = int(os.getenv('GUNICORN_WORKERS', str(CPU_COUNT)))
+else:
+    worker_class = 'gthread'
+    # Handlers hold the GIL only briefly between upstream calls, so a couple of processes per
+    # core keep the CPU busy; threads cover the calls waiting on Omnia and TrackDrive
+    workers = int(os.getenv('GUNICORN_WORKERS', str(2 * CPU_COUNT + 1)))
+    threads = int(os.getenv('GUNICORN_THREADS', str(max(4, math.ceil(EXPECTED_INFLIGHT * 1.25 / workers)))))
+
+# Import the app once in the master so workers share its code, configs and caches copy-on-write
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# Longer than the load balancer's idle timeout, so it never reuses a connection we just closed
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '75'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def _app_modules():
+    return [sys.modules[name] for name in ('app', 'async_app', 'index', 'extracctname', 'urls')
+            if name in sys.modules]
+
+
+def when_ready(server):
+    # Threads don't survive fork; the outbox dispatcher runs in each worker, never in the master.
+    # call_pipeline.py doesn't start it at import under gunicorn; this stops one started anyway.
+    for module in _app_modules():
+        outbox = getattr(module, 'keypress_outbox', None)
+        if outbox is not None:
+            outbox.stop()
+    # Collect import-time garbage, then move everything left to the permanent generation so the
+    # collector never writes to (and un-shares) the preloaded objects' pages in the workers
+    gc.collect()
+    gc.freeze()
+    cfg = server.cfg
+    server.log.info(f"{cfg.worker_class_str}: {cfg.workers} workers x {cfg.threads} threads on {CPU_COUNT} CPUs, "
+                    f"preload={cfg.preload_app}, {gc.get_freeze_count()} objects frozen")
+
+
+def pre_fork(server, worker):
+    # Objects created since when_ready (e.g. when a worker is replaced) are shared too
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master would be shared by every worker; start from empty pools
+    if 'http_client' in sys.modules:
+        sys.modules['http_client'].reset_pools()
+    for module in _app_modules():
+        outbox = getattr(module, 'keypress_outbox', None)
+        if outbox is not None:
+            outbox.ensure_started()
+
+
+def post_worker_init(worker):
+    module = sys.modules.get((worker.app.app_uri or '').split(':', 1)[0])
+    # The app is loaded by now even without preload. Its caller-profile refresher only starts
+    # itself under `python index.py`; every worker runs one, sharing CACHE_REFRESH_RPS.
+    refresher = getattr(module, 'cache_refresher', None)
+    if refresher is not None:
+        refresher.start(processes=worker.cfg.workers)
+    # app.py's call index is filled by a periodic Omnia listing in each worker
+    call_index_refresher = getattr(module, 'call_index_refresher', None)
+    if call_index_refresher is not None:
+        call_index_refresher.start()
+    # analysis.py ingests Vapi calls in the background; its call store lets one worker run each ingest
+    ingester = getattr(module, 'ingester', None)
+    if ingester is not None:
+        ingester.start()
+    # Warm the Flask app's upstream connections and caches before this worker accepts requests;
+    # async_app does the same from its own startup hook. See warmup.py.
+    warmup = getattr(module, 'warmup', None)
+    if warmup is not None:
+        warmup.start()
+        if not warmup.wait():
+            worker.log.warning(f"Warm-up still running after {warmup.budget:g}s; accepting requests anyway")
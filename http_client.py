@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class RetryBudget:
+    """Token bucket capping retries to a fraction of recent traffic.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, so a
+    struggling upstream gets at most ``ratio`` extra load instead of a retry storm.
+    ``min_per_sec`` keeps a trickle of retries available at low traffic.
+    """
+
+    def __init__(self, ratio=0.2, min_per_sec=1.0, capacity=20.0):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_sec)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class BudgetedRetry(Retry):
+    """urllib3 Retry that stops retrying once the client's RetryBudget is exhausted."""
+
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.budget = self.budget
+        return retry
+
+    def increment(self, *args, **kwargs):
+        # urllib3 raises here when the error can't be retried (e.g. a POST read timeout) or the
+        # counters ran out; only an attempt that will really be made spends a budget token
+        retry = super().increment(*args, **kwargs)
+        if self.budget is not None and not self.budget.try_spend():
+            logger.warning("Retry budget exhausted, not retrying")
+            return Retry(total=0, raise_on_status=self.raise_on_status).increment(*args, **kwargs)
+        return retry
+
+
+class HTTPClient:
+    """A pooled keep-alive ``requests.Session`` for one upstream integration.
+
+    urllib3 keeps one connection pool per host inside the session, so every
+    TrackDrive subdomain gets its own pool of up to ``pool_maxsize`` connections.
+    """
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=10, retries=2,
+                 retry_methods=("HEAD", "GET", "OPTIONS"), backoff_factor=0.3,
+                 pool_connections=10, pool_maxsize=100, retry_budget=None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.budget = retry_budget or RetryBudget()
+        retry_strategy = BudgetedRetry(
+            total=retries,
+            # Connection errors happen before the request is sent, so they are
+            # always safe to retry. Read/status retries only for allowed_methods.
+            connect=retries,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=list(retry_methods),
+            backoff_factor=backoff_factor,
+            budget=self.budget
+        )
+        self.adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self.requests_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.latency_seconds_total = 0.0
+
+    def request(self, method, url, **kwargs):
+        """Send a request with the client's default timeout. Raises requests.RequestException like requests does."""
+        kwargs.setdefault('timeout', self.timeout)
+        self.budget.deposit()
+        with self._lock:
+            self.requests_total += 1
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors_total += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.latency_seconds_total += elapsed
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def reset_pools(self):
+        """Drop every pooled connection, e.g. ones a forked process inherited from its parent."""
+        self.adapter.poolmanager.clear()
+
+    def pool_stats(self):
+        """Per-host connection pool usage from the adapter's urllib3 pool manager."""
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": idle,
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+            }
+        return pools
+
+    def stats(self):
+        return {
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "in_flight": self.in_flight,
+            "latency_seconds_total": round(self.latency_seconds_total, 6),
+            "retries_total": self.budget.spent,
+            "retries_denied_total": self.budget.denied,
+            "pools": self.pool_stats(),
+        }
+
+
+def _env(name, key, default, cast=float):
+    return cast(os.getenv(f"HTTP_{name.upper()}_{key}", default))
+
+
+def _build_client(name, connect_timeout, read_timeout, retries, **kwargs):
+    return HTTPClient(
+        name,
+        connect_timeout=_env(name, 'CONNECT_TIMEOUT', connect_timeout),
+        read_timeout=_env(name, 'READ_TIMEOUT', read_timeout),
+        retries=_env(name, 'RETRIES', retries, int),
+        pool_maxsize=_env(name, 'POOL_MAXSIZE', kwargs.pop('pool_maxsize', 100), int),
+        **kwargs
+    )
+
+
+# One client per integration. TrackDrive keypresses are not idempotent, so only
+# connection errors are retried for POSTs; everything else retries safe methods.
+CLIENTS = {
+    "omnia": _build_client("omnia", 3.05, 10, 2),
+    "trackdrive": _build_client("trackdrive", 3.05, 10, 2),
+    "textback": _build_client("textback", 5, 10, 3, backoff_factor=1),
+    "vapi": _build_client("vapi", 5, 30, 3, backoff_factor=1),
+}
+
+
+def get_client(name):
+    return CLIENTS[name]
+
+
+def reset_pools():
+    """Drop the pooled connections of every integration client. Call in a process right after fork()."""
+    for client in CLIENTS.values():
+        client.reset_pools()
+
+
+def stats():
+    """Metrics for every integration client, keyed by client name."""
+    return {name: client.stats() for name, client in CLIENTS.items()}
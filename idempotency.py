@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from timing import status_of
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_CAPACITY = int(os.getenv('IDEMPOTENCY_CAPACITY', '10000'))
+# How long a completed tool response is replayed to retries of the same call
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '600'))
+# How long a duplicate waits for the first execution before it is told to retry later
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '30'))
+IN_PROGRESS_BODY = {"status": "error", "message": "This tool call is still being processed, retry later",
+                    "data_sent": False}
+
+
+def idempotency_key(function_call, call_id):
+    """Key identifying one tool invocation across Vapi retries, or None if it can't be identified.
+
+    The tool call id is used when Vapi sends one. Otherwise the call id,
+    function name and parameters are combined, so a retry matches but a
+    second, different sendKeypress in the same call does not.
+    """
+    tool_call_id = function_call.get('id')
+    if tool_call_id:
+        return f"tool:{tool_call_id}"
+    name = function_call.get('name')
+    if not call_id or not name:
+        return None
+    parameters = json.dumps(function_call.get('parameters'), sort_keys=True, default=str)
+    return f"call:{call_id}:{name}:{hashlib.sha256(parameters.encode()).hexdigest()[:16]}"
+
+
+class _Entry:
+    __slots__ = ('done', 'value', 'expires_at')
+
+    def __init__(self, done):
+        self.done = done
+        self.value = None
+        self.expires_at = None
+
+
+class IdempotencyStore:
+    """Bounded, TTL'd record of tool executions, so a retried webhook doesn't repeat upstream I/O.
+
+    The first request for a key runs the tool. A duplicate that arrives
+    while it is still running waits for its result; one that arrives after
+    it finished gets the stored result without running anything. Only 2xx
+    results are kept: a 404 because Omnia hasn't listed the call yet, a
+    failed TrackDrive send, or an execution that raised leaves nothing
+    behind, so a later retry runs the tool again. Entries live for ``ttl``
+    seconds, with the least recently used evicted beyond ``capacity``.
+
+    A duplicate that is still waiting after ``wait_timeout`` seconds gets
+    ``in_progress(key)``, a 409 asking it to retry, rather than running the
+    tool a second time alongside the first execution.
+
+    ``freeze`` turns a view result into something that can be stored and
+    ``thaw`` builds a fresh response from it for each duplicate. The store
+    is per process; duplicates landing on different workers each execute.
+    """
+
+    def __init__(self, capacity=IDEMPOTENCY_CAPACITY, ttl=IDEMPOTENCY_TTL, wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT,
+                 freeze=None, thaw=None, in_progress=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.freeze = freeze or (lambda result: result)
+        self.thaw = thaw or (lambda frozen: frozen)
+        self.in_progress = in_progress or (lambda key: (dict(IN_PROGRESS_BODY), 409, {'Retry-After': '1'}))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "executions": 0,
+            "replayed": 0,
+            "waited": 0,
+            "wait_timeouts": 0,
+            "not_stored": 0,
+            "evictions": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _claim(self, key, new_done):
+        """(entry, owner) for ``key``; the caller runs the tool when owner is True."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry, False
+            entry = _Entry(new_done())
+            self._entries[key] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self.counters["executions"] += 1
+            return entry, True
+
+    def _finish(self, key, entry, frozen, status):
+        with self._lock:
+            # Duplicates already waiting share the result either way
+            entry.value = frozen
+            if 200 <= status < 300:
+                entry.expires_at = time.monotonic() + self.ttl
+            else:
+                self.counters["not_stored"] += 1
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+
+    def _forget(self, key, entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def run(self, key, fn):
+        """Result of ``fn()``, executed at most once per key while its result is stored."""
+        if key is None:
+            return fn()
+        entry, owner = self._claim(key, threading.Event)
+        if not owner:
+            return self._await_sync(key, entry, fn)
+        frozen = None
+        try:
+            result = fn()
+            frozen = self.freeze(result)
+            self._finish(key, entry, frozen, status_of(result))
+        except BaseException:
+            self._forget(key, entry)
+            raise
+        finally:
+            entry.done.set()
+        return self.thaw(frozen)
+
+    def _timed_out(self, key):
+        self.counters["wait_timeouts"] += 1
+        logger.warning(f"Timed out waiting for in-flight tool execution {key}; asking the caller to retry")
+        return self.in_progress(key)
+
+    def _await_sync(self, key, entry, fn):
+        if not entry.done.is_set():
+            self.counters["waited"] += 1
+            if not entry.done.wait(self.wait_timeout):
+                return self._timed_out(key)
+        else:
+            self.counters["replayed"] += 1
+        if entry.value is None:
+            # The first execution raised; this retry gets its own attempt
+            return self.run(key, fn)
+        logger.info(f"Replaying stored tool response for {key}")
+        return self.thaw(entry.value)
+
+    async def run_async(self, key, fn):
+        """Async variant of run() for aiohttp handlers; ``fn`` returns an awaitable."""
+        if key is None:
+            return await fn()
+        entry, owner = self._claim(key, asyncio.Event)
+        if not owner:
+            if not entry.done.is_set():
+                self.counters["waited"] += 1
+                try:
+                    await asyncio.wait_for(entry.done.wait(), self.wait_timeout)
+                except asyncio.TimeoutError:
+                    return self._timed_out(key)
+            else:
+                self.counters["replayed"] += 1
+            if entry.value is None:
+                return await self.run_async(key, fn)
+            logger.info(f"Replaying stored tool response for {key}")
+            return self.thaw(entry.value)
+        frozen = None
+        try:
+            result = await fn()
+            frozen = self.freeze(result)
+            self._finish(key, entry, frozen, status_of(result))
+        except BaseException:
+            self._forget(key, entry)
+            raise
+        finally:
+            entry.done.set()
+        return self.thaw(frozen)
+
+    def stats(self):
+        return dict(self.counters, size=len(self._entries), capacity=self.capacity, ttl_seconds=self.ttl)
+
+
+def flask_store(**kwargs):
+    """IdempotencyStore whose stored results are (body, status, headers) of Flask responses."""
+    from flask import current_app
+
+    def freeze(result):
+        response = current_app.make_response(result)
+        return response.get_data(), response.status_code, list(response.headers.items())
+
+    def thaw(frozen):
+        body, status, headers = frozen
+        return current_app.response_class(body, status=status, headers=headers)
+
+    return IdempotencyStore(freeze=freeze, thaw=thaw, **kwargs)
+
+
+def aiohttp_store(**kwargs):
+    """IdempotencyStore whose stored results are (body, status, headers) of aiohttp responses."""
+    from aiohttp import web
+
+    def freeze(result):
+        return result.body, result.status, list(result.headers.items())
+
+    def thaw(frozen):
+        body, status, headers = frozen
+        return web.Response(body=body, status=status, headers=headers)
+
+    def in_progress(key):
+        return web.json_response(IN_PROGRESS_BODY, status=409, headers={'Retry-After': '1'})
+
+    return IdempotencyStore(freeze=freeze, thaw=thaw, in_progress=in_progress, **kwargs)
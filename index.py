@@ -1,23 +1,33 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, jsonify, Response
 import requests
-from requests.adapters import HTTPAdapter
 import os
 from dotenv import load_dotenv
-from requests.packages.urllib3.util.retry import Retry
 import logging
-from cachetools import TTLCache, cached
 from time import time
 import threading
-import json
 import base64
+from http_client import get_client
+from caller_cache import CallerProfileCache
+from cache_refresher import CacheRefresher
+from profile_store import ProfileStore, store_path
+import atexit
+from logging_setup import LazyJSON, configure_logging
+from assistant_configs import assistant_configs
+from tool_registry import ToolRegistry
+from traffic_capture import capture_request
+from idempotency import flask_store, idempotency_key
+from webhook_auth import limit_body_size, require_webhook_auth
+from warmup import WARMUP_HOT_PROFILES, WARMUP_TRACKDRIVE_SUBDOMAINS, Warmup, trackdrive_urls, warm_connections
 
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 app = Flask(__name__)
+limit_body_size(app)
 
 logger.info("Starting application")
 
@@ -27,37 +37,29 @@ TEXTBACK_API_TOKEN = "QJ0fzQzwBlx2DfqfRZpopS2NPYoQV7nE"
 TEXTBACK_API_SECRET = "PfVq2I-5Js4="
 TRACKDRIVE_PUBLIC_KEY = os.getenv('TRACKDRIVE_PUBLIC_KEY')
 TRACKDRIVE_PRIVATE_KEY = os.getenv('TRACKDRIVE_PRIVATE_KEY')
+TEXTBACK_FIND_PHONE_URL = os.getenv('TEXTBACK_FIND_PHONE_URL', "https://api.textback.ai/api/v2/contact/findPhone")
+TRACKDRIVE_KEYPRESS_URL = os.getenv('TRACKDRIVE_KEYPRESS_URL',
+                                    "https://{subdomain}.trackdrive.com/api/v1/calls/send_key_press")
 
 logger.info("Loaded environment variables")
 
-session = requests.Session()
-retry_strategy = Retry(
-    total=3,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["HEAD", "GET", "OPTIONS"],
-    backoff_factor=1
-)
-
-adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=10, pool_maxsize=100)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
-cache = TTLCache(maxsize=1000, ttl=86400)
+textback_client = get_client('textback')
+trackdrive_client = get_client('trackdrive')
+# Schemas come from the functions the assistant config declares to Vapi
+tools = ToolRegistry(definitions=lambda: assistant_configs.functions('index'))
+# Replays tool responses to Vapi retries instead of re-sending keypresses
+idempotent_calls = flask_store()
 
 logger.info("Configured session and cache")
 
 @app.route('/handle_incoming_call', methods=['POST'])
+@capture_request('handle_incoming_call')
+@require_webhook_auth(lambda: SERVER_SECRET)
 def handle_incoming_call():
     logger.info("Received request at /handle_incoming_call")
     data = request.json
-    logger.info(f"Incoming Request Data: {json.dumps(data, indent=2)}")
-    logger.info(f"Headers: {dict(request.headers)}")
-
-    received_secret = request.headers.get('X-Vapi-Secret')
-    logger.info(f"Received Secret: {'*' * len(received_secret) if received_secret else 'None'}")
-
-    if received_secret != SERVER_SECRET:
-        logger.warning("Secret mismatch. Access denied.")
-        abort(403) 
+    logger.info("Incoming Request Data: %s", LazyJSON(data, size_hint=request.content_length))
+    logger.debug("Headers: %s", LazyJSON(request.headers))
 
     message_type = data.get('message', {}).get('type')
     logger.info(f"Message Type: {message_type}")
@@ -71,66 +73,9 @@ def handle_incoming_call():
 
     if message_type == 'assistant-request':
         logger.info("Handling assistant-request")
-        response = {
-            "assistant": {
-                "firstMessage": "Hi, thanks for calling in. My name is Jessica Miller. How can I assist you today?",
-                "model": {
-                    "provider": "openai",
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a helpful assistant. When a call is received, trigger the extractCallerInfo function and use the extracted information to personalize the conversation. Do not ask for the phone number, you have it already"
-                        }
-                    ],
-                    "functions": [
-                        {
-                            "name": "extractCallerInfo",
-                            "description": "Extracts the caller's information for personalization.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "td_uuid": {"type": "string", "description": "Unique Call ID from TrackDrive"},
-                                    "caller_id": {"type": "string", "description": "Caller's phone number from TrackDrive"},
-                                    "from": {"type": "string", "description": "Caller's phone number from Twilio"},
-                                    "callSid": {"type": "string", "description": "Twilio Call SID"},
-                                    "category": {"type": "string", "description": "Type of call (inbound, outbound, or scheduled_callback)"},
-                                    "schedule_id": {"type": "string", "description": "ID for scheduled callbacks"}
-                                },
-                                "required": ["td_uuid", "category"]
-                            }
-                        },
-                        {
-                            "name": "sendFinancialDetails",
-                            "description": "Sends collected financial details to the server.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "debtAmount": {"type": "number", "description": "Total amount of debt."},
-                                    "debtType": {"type": "string", "description": "Type of debt (e.g., credit card, student loan)."},
-                                    "monthlyIncome": {"type": "number", "description": "Monthly income of the caller."},
-                                    "hasCheckingAccount": {"type": "boolean", "description": "Whether the caller has a checking account."},
-                                    "employmentStatus": {"type": "string", "description": "Current employment status."}
-                                },
-                                "required": ["debtAmount", "debtType", "monthlyIncome", "hasCheckingAccount", "employmentStatus"]
-                            }
-                        },
-                        {
-                            "name": "sendKeypress",
-                            "description": "Sends a keypress to TrackDrive.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "td_uuid": {"type": "string", "description": "Unique Call ID from TrackDrive"},
-                                    "keypress": {"type": "string", "description": "Keypress to send (e.g., '*', '#', '6', '7', '8', '9', '0')"}
-                                },
-                                "required": ["td_uuid", "keypress"]
-                            }
-                        }
-                    ]}}}
-        
-        logger.info("Sending assistant-request response")
-        return jsonify(response), 200
+        body = assistant_configs.response_bytes('index', subdomain, category)
+        logger.info(f"Sending assistant-request response (configs v{assistant_configs.version}, {len(body)} bytes)")
+        return Response(body, status=200, mimetype='application/json')
 
     elif message_type == 'function-call':
         logger.info("Handling function-call")
@@ -138,23 +83,30 @@ def handle_incoming_call():
         function_name = function_call.get('name')
         parameters = function_call.get('parameters')
         logger.info(f"Function Name: {function_name}")
-        logger.info(f"Parameters: {json.dumps(parameters, indent=2)}")
-
-        if function_name == 'extractCallerInfo':
-            return handle_extract_caller_info(data, td_uuid, category, subdomain)
-        elif function_name == 'sendFinancialDetails':
-            return handle_send_financial_details(parameters, td_uuid, subdomain)
-        elif function_name == 'sendKeypress':
-            financial_data = parameters.get('financial_data', {})  
-            return send_trackdrive_keypress(parameters, td_uuid, subdomain, financial_data)
-        else:
+        logger.info("Parameters: %s", LazyJSON(parameters))
+        tool = tools.get(function_name)
+        if tool is None:
             logger.warning(f"Unknown function name: {function_name}")
             return jsonify({"error": f"Unknown function: {function_name}"}), 400
+        key = idempotency_key(function_call, call_data.get('id'))
+        return idempotent_calls.run(key, lambda: tool(parameters, data, td_uuid, category, subdomain))
 
     else:
         logger.warning(f"Invalid request type: {message_type}")
         return jsonify({"error": "Invalid request"}), 400
 
+@tools.register('extractCallerInfo')
+def extract_caller_info_tool(parameters, data, td_uuid, category, subdomain):
+    return handle_extract_caller_info(data, td_uuid, category, subdomain)
+
+@tools.register('sendFinancialDetails')
+def send_financial_details_tool(parameters, data, td_uuid, category, subdomain):
+    return handle_send_financial_details(parameters, td_uuid, subdomain)
+
+@tools.register('sendKeypress')
+def send_keypress_tool(parameters, data, td_uuid, category, subdomain):
+    return handle_send_keypress(parameters, td_uuid, subdomain, parameters.get('financial_data', {}))
+
 def handle_extract_caller_info(data, td_uuid, category, subdomain):
     logger.info(f"Handling extractCallerInfo - TD_UUID: {td_uuid}, Category: {category}, Subdomain: {subdomain}")
     call_object = data.get('message', {}).get('call', {})
@@ -168,7 +120,7 @@ def handle_extract_caller_info(data, td_uuid, category, subdomain):
         return jsonify({"error": "No valid phone number provided"}), 400
 
     caller_info = get_contact_info(from_number)
-    logger.info(f"Processed caller info: {json.dumps(caller_info, indent=2)}")
+    logger.info("Processed caller info: %s", LazyJSON(caller_info))
 
     if caller_info:
         first_name = caller_info.get('firstName', '')
@@ -192,7 +144,7 @@ def handle_extract_caller_info(data, td_uuid, category, subdomain):
                 "subdomain": subdomain
             }
         }
-        logger.info(f"Returning personalized response: {json.dumps(response, indent=2)}")
+        logger.info("Returning personalized response: %s", LazyJSON(response))
         return jsonify(response), 200
     else:
         logger.warning(f"No caller info found for: {from_number}")
@@ -218,7 +170,7 @@ def handle_send_financial_details(parameters, td_uuid, subdomain):
         "employmentStatus": parameters.get('employmentStatus')
     }
 
-    logger.info(f"Received financial data: {json.dumps(financial_data, indent=2)}")
+    logger.info("Received financial data: %s", LazyJSON(financial_data))
 
     if td_uuid:
         logger.info(f"Attempting to send keypress '*' and financial data for TD_UUID: {td_uuid}")
@@ -274,11 +226,15 @@ def handle_send_keypress(parameters, td_uuid, subdomain, financial_data=None):
 
 import urllib.parse
 
-@cached(cache)
 def get_contact_info(phone_number):
+    """Return the caller's TextBack profile from the caller cache, or None"""
+    return caller_cache.get(phone_number)
+
+def fetch_contact_info(phone_number):
+    """Look up a caller in TextBack. Raises requests.RequestException if the lookup fails."""
     logger.info(f"Getting contact info for phone number: {phone_number}")
     
-    base_url = "https://api.textback.ai/api/v2/contact/findPhone"
+    base_url = TEXTBACK_FIND_PHONE_URL
     
     # Ensure the phone number is in the correct format (with '+' sign)
     formatted_phone = phone_number if phone_number.startswith('+') else f'+{phone_number}'
@@ -295,26 +251,67 @@ def get_contact_info(phone_number):
     }
     
     logger.info(f"Making API request to URL: {url}")
-    logger.info(f"Headers: {headers}")
     
-    try:
-        response = session.get(url, headers=headers, timeout=(5, 10))
-        logger.info(f"API Response Status Code: {response.status_code}")
-        logger.info(f"API Response Content: {response.text}")
-        
-        response.raise_for_status()
-        contact_info = response.json()
-        logger.info(f"Retrieved contact info: {json.dumps(contact_info, indent=2)}")
-        return contact_info
-    except requests.RequestException as e:
-        logger.error(f"Failed to get contact info: {str(e)}")
-        return None
+    response = textback_client.get(url, headers=headers)
+    logger.info(f"API Response Status Code: {response.status_code}")
+    logger.debug("API Response Content: %s", LazyJSON(response.text))
+    
+    response.raise_for_status()
+    contact_info = response.json()
+    logger.info("Retrieved contact info: %s", LazyJSON(contact_info))
+    return contact_info
+
+caller_cache = CallerProfileCache(fetch_contact_info, store=ProfileStore(store_path('index')))
+cache_refresher = CacheRefresher(caller_cache)
+
+# Run in each worker before it reports ready (see gunicorn.conf.py and /ready)
+warmup = Warmup('index')
+
+@warmup.step('connections')
+def warm_upstream_connections():
+    return {"textback": warm_connections(textback_client, [TEXTBACK_FIND_PHONE_URL]),
+            "trackdrive": warm_connections(trackdrive_client, trackdrive_urls(TRACKDRIVE_KEYPRESS_URL))}
+
+@warmup.step('caller_profiles')
+def warm_caller_profiles():
+    # Preloaded profiles past their TTL are renewed by the refresher, whatever started this process
+    cache_refresher.start()
+    loaded = {"loaded": caller_cache.preload(WARMUP_HOT_PROFILES)}
+    if not cache_refresher.enabled:
+        # The refresher prunes the store; with it off, do it once per worker start
+        loaded["pruned"] = caller_cache.prune_store()
+    return loaded
+
+@warmup.step('assistant_configs')
+def warm_assistant_configs():
+    # Picks up a config edited since the master preloaded it, and resolves each subdomain's body
+    sizes = [len(assistant_configs.response_bytes('index', subdomain))
+             for subdomain in [None] + WARMUP_TRACKDRIVE_SUBDOMAINS]
+    return {"version": assistant_configs.version, "bytes": sum(sizes)}
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until this worker's warm-up finished or ran out of time"""
+    warmup.start()
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(caller_cache.stats()), 200
+
+@app.route('/tool_stats', methods=['GET'])
+def tool_stats():
+    return jsonify(tools.stats()), 200
+
+@app.route('/idempotency_stats', methods=['GET'])
+def idempotency_stats():
+    return jsonify(idempotent_calls.stats()), 200
 
 import base64
 
 def send_trackdrive_keypress(td_uuid, keypress, subdomain, financial_data=None):
     logger.info(f"Attempting to send TrackDrive keypress and data. TD_UUID: {td_uuid}, Keypress: {keypress}, Subdomain: {subdomain}")
-    url = f"https://{subdomain}.trackdrive.com/api/v1/calls/send_key_press"
+    url = TRACKDRIVE_KEYPRESS_URL.format(subdomain=subdomain)
     
     # Combine and encode the public and private keys
     auth_string = f"{TRACKDRIVE_PUBLIC_KEY}:{TRACKDRIVE_PRIVATE_KEY}"
@@ -333,10 +330,10 @@ def send_trackdrive_keypress(td_uuid, keypress, subdomain, financial_data=None):
         payload["data"] = financial_data
 
     try:
-        logger.info(f"Sending POST request to TrackDrive API. URL: {url}, Payload: {json.dumps(payload)}")
-        response = requests.post(url, headers=headers, json=payload)
+        logger.info("Sending POST request to TrackDrive API. URL: %s, Payload: %s", url, LazyJSON(payload))
+        response = trackdrive_client.post(url, headers=headers, json=payload)
         response.raise_for_status()
-        logger.info(f"TrackDrive API response: Status Code {response.status_code}, Content: {response.text}")
+        logger.info("TrackDrive API response: Status Code %s, Content: %s", response.status_code, LazyJSON(response.text))
         logger.info(f"Keypress and data sent successfully for TD_UUID: {td_uuid}")
         return True
     except requests.RequestException as e:
@@ -345,10 +342,12 @@ def send_trackdrive_keypress(td_uuid, keypress, subdomain, financial_data=None):
 
 if __name__ == '__main__':
     logger.info("Starting cache refresh thread")
-    # cache_refresh_thread = threading.Thread(target=refresh_cache, daemon=True)
-    # cache_refresh_thread.start()
+    cache_refresher.start()
+    atexit.register(cache_refresher.stop)
+    warmup.start()
     logger.info("Starting Flask application")
-    app.run(debug=True, port=5000)
+    # Development server only; run under gunicorn in production (see DEPLOYMENT.md)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5000)
 
 
 
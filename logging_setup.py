@@ -0,0 +1,146 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+
+LOG_PAYLOAD_MAX_BYTES = int(os.getenv('LOG_PAYLOAD_MAX_BYTES', '4096'))
+# Fraction of payloads larger than LOG_PAYLOAD_MAX_BYTES that get logged at all
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+LOG_QUEUE = os.getenv('LOG_QUEUE', '0') == '1'
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+_encoder = json.JSONEncoder(default=str, ensure_ascii=False)
+
+
+class LazyJSON:
+    """Log argument that serializes its payload only if the record is emitted.
+
+    Serialization stops once ``max_bytes`` have been produced, so a 500 KB
+    transcript costs the same to log as a 4 KB one. When ``size_hint`` (e.g.
+    the request Content-Length) says the payload is over budget, only
+    ``sample_rate`` of such payloads are logged. Strings and bytes (e.g.
+    upstream response bodies, raw request bodies) are truncated but not
+    JSON-quoted.
+
+        logger.info("Incoming Request Data: %s", LazyJSON(data, size_hint=request.content_length))
+    """
+
+    __slots__ = ('obj', 'max_bytes', 'size_hint', 'sample_rate', '_text')
+
+    def __init__(self, obj, max_bytes=None, size_hint=None, sample_rate=None):
+        self.obj = obj
+        self.max_bytes = LOG_PAYLOAD_MAX_BYTES if max_bytes is None else max_bytes
+        self.size_hint = size_hint
+        self.sample_rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def _render(self):
+        if self.size_hint and self.size_hint > self.max_bytes and random.random() >= self.sample_rate:
+            return f"<{self.size_hint} bytes, not sampled>"
+        obj = self.obj
+        if isinstance(obj, (bytes, bytearray)):
+            # A raw request body; only the part that can be logged is decoded
+            obj = bytes(obj[:self.max_bytes + 1]).decode('utf-8', 'replace')
+        if isinstance(obj, str):
+            if len(obj) > self.max_bytes:
+                return f"{obj[:self.max_bytes]}... <truncated at {self.max_bytes} bytes>"
+            return obj
+        if not isinstance(obj, (dict, list, str, int, float, bool, type(None))) and hasattr(obj, 'items'):
+            obj = dict(obj.items())
+        chunks = []
+        size = 0
+        # iterencode lets us stop as soon as the budget is spent instead of
+        # serializing the whole transcript and slicing it afterwards.
+        for chunk in _encoder.iterencode(obj):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_bytes:
+                text = ''.join(chunks)[:self.max_bytes]
+                return f"{text}... <truncated at {self.max_bytes} bytes>"
+        return ''.join(chunks)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "where": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ForkSafeQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener thread and restarts it after a fork.
+
+    Records keep their unformatted msg/args, so LazyJSON payloads are rendered
+    on the listener thread. Callers must not mutate logged objects afterwards,
+    which holds for the request payloads logged on the webhook path.
+    """
+
+    def __init__(self, log_queue, handlers):
+        super().__init__(log_queue)
+        self._handlers = handlers
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._ensure_listener()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._listener = logging.handlers.QueueListener(self.queue, *self._handlers,
+                                                            respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference frames that are gone by the time the listener runs
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        super().enqueue(record)
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+
+
+def configure_logging():
+    """Apply LOG_FORMAT and LOG_QUEUE to the root logger's handlers (call after basicConfig)."""
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if LOG_FORMAT == 'json':
+        for handler in handlers:
+            handler.setFormatter(JsonFormatter())
+    if not LOG_QUEUE or any(isinstance(h, _ForkSafeQueueHandler) for h in handlers):
+        return
+    queue_handler = _ForkSafeQueueHandler(queue.SimpleQueue(), handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    atexit.register(queue_handler.stop)
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', 'outbox.sqlite3')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+# How long a claimed row is reserved for its sender. Must exceed the worst-case
+# TrackDrive send: 3 connect attempts x 3.05s plus backoff and a 10s read is ~20s.
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', '120'))
+# How long a delivered row is kept to de-duplicate retried webhooks. Vapi retries a
+# webhook within minutes, so a day is far past any retry of the same keypress.
+OUTBOX_RETENTION_SECONDS = float(os.getenv('OUTBOX_RETENTION_SECONDS', '86400'))
+# Failed rows are kept longer, for someone to look into or re-queue
+OUTBOX_FAILED_RETENTION_SECONDS = float(os.getenv('OUTBOX_FAILED_RETENTION_SECONDS', str(7 * 86400)))
+OUTBOX_SWEEP_INTERVAL = float(os.getenv('OUTBOX_SWEEP_INTERVAL', '300'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keypress_outbox (
+    td_uuid TEXT NOT NULL,
+    digits TEXT NOT NULL,
+    subdomain TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (td_uuid, digits)
+);
+CREATE INDEX IF NOT EXISTS keypress_outbox_due ON keypress_outbox (status, next_attempt_at);
+"""
+
+
+class KeypressOutbox:
+    """Durable SQLite outbox for TrackDrive keypresses with a background dispatcher.
+
+    Rows are keyed on (td_uuid, digits), so a retried webhook cannot queue the
+    same keypress twice. Several gunicorn workers can share one outbox file:
+    each row is claimed with a lease immediately before it is sent, and a
+    lease that runs out (e.g. the worker died mid-send) makes the row
+    deliverable again. ``lease_seconds`` must be longer than one send can
+    take, or a slow send is delivered twice. A sender whose lease was taken
+    over does not overwrite the new holder's outcome.
+
+    Every ``sweep_interval`` seconds the dispatcher deletes delivered rows
+    older than ``retention_seconds`` and failed rows older than
+    ``failed_retention_seconds``, so the table stays bounded.
+    """
+
+    def __init__(self, send, path=OUTBOX_PATH, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 base_backoff=1.0, max_backoff=60.0, lease_seconds=OUTBOX_LEASE_SECONDS, poll_interval=1.0,
+                 batch_size=20, retention_seconds=OUTBOX_RETENTION_SECONDS,
+                 failed_retention_seconds=OUTBOX_FAILED_RETENTION_SECONDS, sweep_interval=OUTBOX_SWEEP_INTERVAL):
+        self.send = send
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.retention_seconds = retention_seconds
+        self.failed_retention_seconds = failed_retention_seconds
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, td_uuid, digits, subdomain, data=None):
+        """Persist a keypress for delivery. Returns False if it was already queued."""
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO keypress_outbox "
+            "(td_uuid, digits, subdomain, payload, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (td_uuid, digits, subdomain, json.dumps(data), now, now, now)
+        )
+        self.ensure_started()
+        self._wakeup.set()
+        return cursor.rowcount == 1
+
+    def _claim_next(self):
+        """Lease the next due row to this dispatcher, or return None. The lease is the row's fencing token."""
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT td_uuid, digits, subdomain, payload, attempts FROM keypress_outbox "
+                "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'sending' AND lease_until <= ?) "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE keypress_outbox SET status = 'sending', lease_until = ?, updated_at = ? "
+                    "WHERE td_uuid = ? AND digits = ?",
+                    (lease_until, now, row[0], row[1])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else (row, lease_until)
+
+    def _finish(self, td_uuid, digits, lease_until, attempts, delivered, error=None):
+        """Record a send's outcome if this dispatcher still holds the row's lease. Returns the new status."""
+        now = time.time()
+        if delivered:
+            status, next_attempt_at = 'delivered', now
+        elif attempts >= self.max_attempts:
+            status, next_attempt_at = 'failed', now
+        else:
+            status = 'pending'
+            next_attempt_at = now + min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        cursor = self._connection().execute(
+            "UPDATE keypress_outbox SET status = ?, attempts = ?, next_attempt_at = ?, lease_until = NULL, "
+            "last_error = ?, updated_at = ? "
+            "WHERE td_uuid = ? AND digits = ? AND status = 'sending' AND lease_until = ?",
+            (status, attempts, next_attempt_at, error, now, td_uuid, digits, lease_until)
+        )
+        if cursor.rowcount != 1:
+            return 'lease_lost'
+        return status
+
+    def dispatch_once(self):
+        """Deliver up to ``batch_size`` due keypresses, one lease at a time. Returns the number attempted."""
+        attempted = 0
+        while attempted < self.batch_size and not self._stopping.is_set():
+            claimed = self._claim_next()
+            if claimed is None:
+                break
+            (td_uuid, digits, subdomain, payload, attempts), lease_until = claimed
+            attempted += 1
+            attempts += 1
+            try:
+                delivered = self.send(td_uuid, digits, subdomain, json.loads(payload))
+                error = None if delivered else "delivery failed"
+            except Exception as e:
+                delivered, error = False, str(e)
+            status = self._finish(td_uuid, digits, lease_until, attempts, delivered, error)
+            if status == 'failed':
+                logger.error(f"❌ Giving up on keypress '{digits}' for td_uuid {td_uuid} after {attempts} attempts")
+            elif status == 'pending':
+                logger.warning(f"Keypress '{digits}' for td_uuid {td_uuid} failed (attempt {attempts}), will retry")
+            elif status == 'lease_lost':
+                logger.error(f"❌ Send of keypress '{digits}' for td_uuid {td_uuid} outlived its "
+                             f"{self.lease_seconds:g}s lease; raise OUTBOX_LEASE_SECONDS")
+        return attempted
+
+    def sweep(self):
+        """Delete delivered and failed rows past their retention. Returns the number deleted."""
+        now = time.time()
+        # Finished rows have next_attempt_at set to when they finished, which the due index covers
+        cursor = self._connection().execute(
+            "DELETE FROM keypress_outbox WHERE (status = 'delivered' AND next_attempt_at <= ?) "
+            "OR (status = 'failed' AND next_attempt_at <= ?)",
+            (now - self.retention_seconds, now - self.failed_retention_seconds)
+        )
+        if cursor.rowcount:
+            logger.info(f"Swept {cursor.rowcount} finished keypresses from the outbox")
+        return cursor.rowcount
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep()
+
+    def _run(self):
+        logger.info(f"Outbox dispatcher started for {self.path}")
+        while not self._stopping.is_set():
+            try:
+                self._maybe_sweep()
+                attempted = self.dispatch_once()
+            except sqlite3.Error as e:
+                logger.error(f"❌ Outbox dispatch failed: {str(e)}")
+                attempted = 0
+            if not attempted:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        logger.info("Outbox dispatcher stopped")
+
+    def ensure_started(self):
+        """Start the dispatcher thread in this process if it is not running (e.g. after a fork)."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="keypress-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT status, COUNT(*) FROM keypress_outbox GROUP BY status"
+        ).fetchall()
+        return dict(rows)
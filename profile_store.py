@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CALLER_STORE_PATH = os.getenv('CALLER_STORE_PATH', 'caller_profiles.sqlite3')
+
+
+def store_path(app_name, path=CALLER_STORE_PATH):
+    """The store file of one app, e.g. caller_profiles.index.sqlite3.
+
+    Each app caches its own shape of profile (index the whole TextBack
+    response, extracctname only its ``info``), so they must not share a file.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{app_name}{ext}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS caller_profiles (
+    phone TEXT PRIMARY KEY,
+    value TEXT,
+    kind TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS caller_profiles_stale_until ON caller_profiles (stale_until);
+CREATE TABLE IF NOT EXISTS caller_profile_claims (
+    phone TEXT PRIMARY KEY,
+    claimed_until REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ProfileStore:
+    """SQLite-backed caller-profile store shared by every worker on the host.
+
+    Expiry times are wall-clock (``time.time()``) so they mean the same thing
+    in every process and across restarts. The database runs in WAL mode with a
+    memory-mapped file, so point reads by phone stay well under a millisecond
+    and never block on a writer.
+    """
+
+    def __init__(self, path=CALLER_STORE_PATH, mmap_size=64 * 1024 * 1024):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, phone_number):
+        """Return (value, kind, hits, fresh_until, stale_until) if the profile is still servable."""
+        row = self._connection().execute(
+            "SELECT value, kind, hits, fresh_until, stale_until FROM caller_profiles "
+            "WHERE phone = ? AND stale_until > ?",
+            (phone_number, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        value, kind, hits, fresh_until, stale_until = row
+        return json.loads(value), kind, hits, fresh_until, stale_until
+
+    def put(self, phone_number, value, kind, hits, fresh_until, stale_until):
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO caller_profiles "
+                "(phone, value, kind, hits, fetched_at, fresh_until, stale_until) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (phone_number, json.dumps(value), kind, hits, time.time(), fresh_until, stale_until)
+            )
+        except sqlite3.Error as e:
+            # The store is an optimisation; a locked or full disk must not fail the call
+            logger.warning(f"Could not persist caller profile for {phone_number}: {str(e)}")
+
+    def claim(self, phone_number, lease):
+        """Claim the next upstream lookup of a caller for ``lease`` seconds. Returns False if another process holds it.
+
+        Lets the workers' refreshers agree on who renews a profile, so each
+        due profile is looked up once per host instead of once per worker.
+        """
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                "INSERT INTO caller_profile_claims (phone, claimed_until) VALUES (?, ?) "
+                "ON CONFLICT (phone) DO UPDATE SET claimed_until = excluded.claimed_until "
+                "WHERE claimed_until <= ?",
+                (phone_number, now + lease, now)
+            )
+        except sqlite3.Error as e:
+            # Without the store, fall back to refreshing in this process
+            logger.warning(f"Could not claim caller profile refresh for {phone_number}: {str(e)}")
+            return True
+        return cursor.rowcount == 1
+
+    def hot(self, limit):
+        """Phone numbers of the most-read servable profiles, for preloading a fresh worker."""
+        rows = self._connection().execute(
+            "SELECT phone FROM caller_profiles WHERE stale_until > ? AND kind = 'hit' "
+            "ORDER BY hits DESC LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+        return [phone for phone, in rows]
+
+    def prune(self):
+        """Delete profiles that can no longer be served. Returns the number removed."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("DELETE FROM caller_profile_claims WHERE claimed_until <= ?", (now,))
+        cursor = conn.execute("DELETE FROM caller_profiles WHERE stale_until <= ?", (now,))
+        return cursor.rowcount
@@ -0,0 +1,198 @@
+import os
+from datetime import datetime, timedelta, timezone
+import tempfile
+
+import pytest
+
+pytest.importorskip("flask_cors")
+# analysis opens its call store at import; keep it out of the working tree
+os.environ.setdefault("CALL_STORE_PATH", os.path.join(tempfile.mkdtemp(), "calls.sqlite3"))
+
+import analysis  # noqa: E402
+from call_store import CallStore  # noqa: E402
+from call_trace import CallTracer  # noqa: E402
+
+
+def vapi_call(call_id, created_at, status="ended", number="+15550102000"):
+    return {"id": call_id, "assistantId": "a1", "status": status, "createdAt": created_at,
+            "customer": {"number": number}, "summary": f"summary of {call_id}", "messages": []}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CallStore(str(tmp_path / "calls.sqlite3"))
+    monkeypatch.setattr(analysis, "call_store", store)
+    return store
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = CallTracer(enabled=True)
+    tracer.written = []
+    tracer.write = lambda call_id, stage, payload: tracer.written.append((call_id, stage))
+    monkeypatch.setattr(analysis, "call_tracer", tracer)
+    return tracer
+
+
+def test_trace_call_traces_a_call_already_in_the_store(store, tracer, monkeypatch):
+    store.upsert_calls([analysis.process_call(vapi_call("c1", "2026-10-01T10:00:00.000Z"))])
+    monkeypatch.setattr(analysis, "fetch_call", lambda call_id: vapi_call(call_id, "2026-10-01T10:00:00.000Z"))
+    assert analysis.trace_call("c1")
+    assert tracer.written == [("c1", "raw"), ("c1", "processed"), ("c1", "stored")]
+
+
+def test_trace_call_of_an_unknown_call_is_reported(store, tracer, monkeypatch):
+    monkeypatch.setattr(analysis, "fetch_call", lambda call_id: None)
+    assert not analysis.trace_call("missing")
+    assert tracer.written == []
+
+
+def test_dashboard_trace_call_answers_404_and_400(store, tracer, monkeypatch):
+    monkeypatch.setattr(analysis, "fetch_call", lambda call_id: None)
+    client = analysis.app.test_client()
+    assert client.get("/?trace_call=missing").status_code == 404
+    tracer.enabled = False
+    assert client.get("/?trace_call=missing").status_code == 400
+
+
+class FakeVapi:
+    """Serves call pages the way Vapi's list endpoint does: newest first, filtered and limited."""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.requests = []
+
+    def fetch_calls(self, assistant_id, created_at_gt=None, created_at_le=None, created_at_lt=None, limit=100):
+        self.requests.append((created_at_gt, created_at_le, created_at_lt))
+        matching = [call for call in self.calls
+                    if (not created_at_gt or call["createdAt"] > created_at_gt)
+                    and (not created_at_le or call["createdAt"] <= created_at_le)
+                    and (not created_at_lt or call["createdAt"] < created_at_lt)]
+        matching.sort(key=lambda call: (call["createdAt"], call["id"]), reverse=True)
+        return matching[:int(limit)]
+
+
+@pytest.fixture
+def vapi(monkeypatch):
+    def install(calls, page_size=3):
+        fake = FakeVapi(calls)
+        monkeypatch.setattr(analysis, "INGEST_PAGE_SIZE", page_size)
+        monkeypatch.setattr(analysis, "fetch_calls",
+                            lambda assistant_id, created_at_gt=None, created_at_le=None, created_at_lt=None:
+                            fake.fetch_calls(assistant_id, created_at_gt, created_at_le, created_at_lt, page_size))
+        return fake
+    return install
+
+
+def test_ingest_keeps_calls_sharing_the_page_boundary_timestamp(store, vapi):
+    calls = [vapi_call("c1", "2026-10-01T10:00:01.000Z"),
+             vapi_call("c2", "2026-10-01T10:00:02.000Z"),
+             vapi_call("c3", "2026-10-01T10:00:02.000Z"),
+             vapi_call("c4", "2026-10-01T10:00:02.000Z"),
+             vapi_call("c5", "2026-10-01T10:00:03.000Z")]
+    vapi(calls)
+    assert analysis.ingest_calls("a1") == 5
+    assert store.count() == 5
+    assert store.high_water("a1") == "2026-10-01T10:00:03.000Z"
+
+
+def test_ingest_steps_past_a_full_page_of_one_timestamp(store, vapi):
+    calls = [vapi_call(f"c{n}", "2026-10-01T10:00:05.000Z") for n in range(3)]
+    calls.append(vapi_call("older", "2026-10-01T10:00:00.000Z"))
+    fake = vapi(calls, page_size=3)
+    assert analysis.ingest_calls("a1") == 4
+    assert fake.requests[-1] == (None, None, "2026-10-01T10:00:05.000Z")
+
+
+def test_open_call_holds_the_mark_back(store, vapi):
+    now = datetime.now(timezone.utc)
+    open_at = analysis.vapi_timestamp(now - timedelta(minutes=5))
+    vapi([vapi_call("c1", analysis.vapi_timestamp(now - timedelta(minutes=10))),
+          vapi_call("c2", open_at, status="in-progress"),
+          vapi_call("c3", analysis.vapi_timestamp(now - timedelta(minutes=1)))])
+    analysis.ingest_calls("a1")
+    assert store.high_water("a1") < open_at
+
+
+def test_stuck_open_call_stops_holding_the_mark_back(store, vapi):
+    now = datetime.now(timezone.utc)
+    latest = analysis.vapi_timestamp(now - timedelta(minutes=1))
+    vapi([vapi_call("c1", analysis.vapi_timestamp(now - timedelta(days=2)), status="in-progress"),
+          vapi_call("c2", latest)])
+    analysis.ingest_calls("a1")
+    assert store.high_water("a1") == latest
+
+
+def test_cursor_that_is_not_a_pair_answers_400(store, monkeypatch):
+    client = analysis.app.test_client()
+    # base64 of {}
+    assert client.get("/api/calls?cursor=e30=").status_code == 400
+    assert client.get("/?cursor=e30=").status_code == 400
+
+
+class FlakyVapi(FakeVapi):
+    """Fails the ``fail_on``-th page request once."""
+
+    def __init__(self, calls, fail_on):
+        super().__init__(calls)
+        self.fail_on = fail_on
+
+    def fetch_calls(self, *args, **kwargs):
+        page = super().fetch_calls(*args, **kwargs)
+        if len(self.requests) == self.fail_on:
+            return None
+        return page
+
+
+def test_failed_backfill_resumes_where_it_stopped(store, monkeypatch):
+    calls = [vapi_call(f"c{n}", f"2026-10-01T10:00:0{n}.000Z") for n in range(7)]
+    fake = FlakyVapi(calls, fail_on=2)
+    monkeypatch.setattr(analysis, "INGEST_PAGE_SIZE", 3)
+    monkeypatch.setattr(analysis, "fetch_calls", lambda assistant_id, **window: fake.fetch_calls(
+        assistant_id, limit=3, **window))
+    assert analysis.ingest_calls("a1") is None
+    assert store.count() == 3
+    assert store.high_water("a1") is None
+    assert store.ingest_cursor("a1")["le"] == "2026-10-01T10:00:04.000Z"
+
+    assert analysis.ingest_calls("a1") == 5
+    # The second run went on from the first page's oldest call, not from the newest
+    assert fake.requests[2] == (None, "2026-10-01T10:00:04.000Z", None)
+    assert store.count() == 7
+    assert store.high_water("a1") == "2026-10-01T10:00:06.000Z"
+    assert store.ingest_cursor("a1") is None
+
+
+def test_resumed_backfill_keeps_an_open_call_holding_the_mark(store, monkeypatch):
+    now = datetime.now(timezone.utc)
+    at = [analysis.vapi_timestamp(now - timedelta(minutes=minutes)) for minutes in range(6, 0, -1)]
+    calls = [vapi_call(f"c{n}", created_at) for n, created_at in enumerate(at)]
+    calls[1]["status"] = "in-progress"
+    fake = FlakyVapi(calls, fail_on=2)
+    monkeypatch.setattr(analysis, "INGEST_PAGE_SIZE", 3)
+    monkeypatch.setattr(analysis, "fetch_calls", lambda assistant_id, **window: fake.fetch_calls(
+        assistant_id, limit=3, **window))
+    assert analysis.ingest_calls("a1") is None
+    analysis.ingest_calls("a1")
+    assert store.high_water("a1") == at[0]
+
+
+def test_pages_are_served_from_the_store_without_calling_vapi(store, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise AssertionError("a page view called Vapi")
+
+    monkeypatch.setattr(analysis, "fetch_calls", unreachable)
+    store.upsert_calls([analysis.process_call(vapi_call("c1", "2026-10-01T10:00:00.000Z"))])
+    client = analysis.app.test_client()
+    assert client.get("/").status_code == 200
+    assert client.get("/api/metrics").status_code == 200
+    assert client.get("/api/calls").get_json()["calls"][0]["id"] == "c1"
+
+
+def test_one_ingester_runs_each_ingest(store, vapi):
+    vapi([vapi_call("c1", "2026-10-01T10:00:00.000Z")])
+    first, second = analysis.Ingester(interval=60), analysis.Ingester(interval=60)
+    assert first.run_once() == 1
+    # Held until the next run is due, not only while the first one ran
+    assert second.run_once() is None
+    assert (first.runs, second.runs) == (1, 0)
@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+
+from assistant_configs import ASSISTANT_CONFIG_PATH, AssistantConfigs
+
+CONFIG = {
+    "version": 1,
+    "assistants": {
+        "index": {
+            "default": {"firstMessage": "Hi", "model": {"provider": "openai", "model": "gpt-3.5-turbo"}},
+            "variants": [
+                {"category": "inbound", "override": {"firstMessage": "Hi, inbound"}},
+                {"subdomain": "acme", "category": "inbound", "override": {"firstMessage": "Hi, Acme inbound"}},
+                {"subdomain": "acme", "override": {"model": {"model": "gpt-4o"}}},
+            ],
+        },
+    },
+}
+
+
+def write(path, config, mtime_ns):
+    path.write_text(config if isinstance(config, str) else json.dumps(config))
+    # Set mtimes explicitly; two writes within the filesystem's timestamp resolution look unchanged
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def assistant(configs, subdomain=None, category=None):
+    return json.loads(configs.response_bytes('index', subdomain, category))["assistant"]
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "assistant_configs.json"
+    write(path, CONFIG, 1_000_000_000)
+    return path
+
+
+def test_most_specific_variant_is_served(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=3600)
+    assert assistant(configs, "acme", "inbound")["firstMessage"] == "Hi, Acme inbound"
+    assert assistant(configs, "other", "inbound")["firstMessage"] == "Hi, inbound"
+    assert assistant(configs, "other", "outbound") == CONFIG["assistants"]["index"]["default"]
+
+
+def test_overrides_deep_merge_over_the_default(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=3600)
+    assert assistant(configs, "acme", "outbound") == {
+        "firstMessage": "Hi", "model": {"provider": "openai", "model": "gpt-4o"}}
+
+
+def test_responses_are_serialized_once_per_load(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=3600)
+    assert configs.response_bytes('index', "acme") is configs.response_bytes('index', "acme")
+    assert configs.stats()["variants"] == {"index": 4}
+
+
+def test_changed_file_is_reloaded(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=0)
+    updated = json.loads(json.dumps(CONFIG))
+    updated["version"] = 2
+    updated["assistants"]["index"]["default"]["firstMessage"] = "Hello"
+    write(config_path, updated, 2_000_000_000)
+    assert assistant(configs)["firstMessage"] == "Hello"
+    assert configs.version == 2
+    assert configs.reloads == 2
+
+
+def test_malformed_reload_keeps_the_previous_configs_until_the_next_edit(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=0)
+    write(config_path, '{"version": 2, "assistants": {', 2_000_000_000)
+    assert assistant(configs)["firstMessage"] == "Hi"
+    assert assistant(configs)["firstMessage"] == "Hi"
+    # The broken file is parsed once, not on every check
+    assert (configs.version, configs.reload_errors) == (1, 1)
+
+    write(config_path, {"version": 3, "assistants": {"index": {"default": {"firstMessage": "Fixed"}}}},
+          3_000_000_000)
+    assert assistant(configs)["firstMessage"] == "Fixed"
+    assert configs.version == 3
+
+
+def test_config_missing_required_keys_keeps_the_previous_configs(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=0)
+    write(config_path, {"version": 2, "assistants": {"index": {"variants": []}}}, 2_000_000_000)
+    assert assistant(configs)["firstMessage"] == "Hi"
+    assert configs.reload_errors == 1
+
+
+def test_declared_functions_follow_reloads(config_path):
+    configs = AssistantConfigs(str(config_path), check_interval=0)
+    assert configs.functions('index') == {}
+    updated = json.loads(json.dumps(CONFIG))
+    updated["version"] = 2
+    lookup = {"name": "lookup", "parameters": {"type": "object", "required": ["phone"]}}
+    updated["assistants"]["index"]["default"]["model"]["functions"] = [lookup]
+    write(config_path, updated, 2_000_000_000)
+    assert configs.functions('index') == {"lookup": lookup}
+    assert configs.functions('missing') == {}
+
+
+def test_malformed_file_at_startup_raises(tmp_path):
+    path = tmp_path / "assistant_configs.json"
+    write(path, "not json", 1_000_000_000)
+    with pytest.raises(ValueError):
+        AssistantConfigs(str(path))
+
+
+def test_shipped_configs_load():
+    configs = AssistantConfigs(ASSISTANT_CONFIG_PATH)
+    assert json.loads(configs.response_bytes('index'))["assistant"]["firstMessage"]
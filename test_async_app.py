@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("aiohttp_retry")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+import async_app  # noqa: E402
+import call_pipeline  # noqa: E402
+from call_listing_store import CallListingStore  # noqa: E402
+from bench import fakes  # noqa: E402
+from bench.payloads import build, phone_pool  # noqa: E402
+from outbox import KeypressOutbox  # noqa: E402
+from warmup import Warmup  # noqa: E402
+from webhook_auth import WEBHOOK_SECRET_HEADER  # noqa: E402
+
+SECRET = "test-secret"
+PHONES = phone_pool(5)
+
+
+@pytest.fixture
+def serve(monkeypatch, tmp_path):
+    """Run ``scenario(client, upstream)`` against async_app wired to bench.fakes with no added latency."""
+
+    def run(scenario):
+        async def main():
+            profiles = {service: fakes.ServiceProfile(latency_ms=0, jitter_ms=0) for service in fakes.SERVICES}
+            async with TestClient(TestServer(fakes.create_app(profiles, PHONES))) as upstream:
+                env = fakes.upstream_env(upstream.port)
+                monkeypatch.setattr(async_app, 'SERVER_SECRET', SECRET)
+                monkeypatch.setattr(async_app, 'OMNIA_CALLS_URL', env['OMNIA_CALLS_URL'])
+                monkeypatch.setattr(async_app, 'TRACKDRIVE_KEYPRESS_URL', env['TRACKDRIVE_KEYPRESS_URL'])
+                monkeypatch.setattr(call_pipeline, 'TRACKDRIVE_KEYPRESS_URL', env['TRACKDRIVE_KEYPRESS_URL'])
+                monkeypatch.setattr(async_app.call_listing, 'store',
+                                    CallListingStore(str(tmp_path / "call_listing.sqlite3")))
+                async with TestClient(TestServer(async_app.create_app())) as client:
+                    return await scenario(client, upstream)
+        return asyncio.run(main())
+    return run
+
+
+async def post(client, body, secret=SECRET):
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    response = await client.post('/handle_incoming_call', data=data,
+                                 headers={WEBHOOK_SECRET_HEADER: secret, 'Content-Type': 'application/json'})
+    return response.status, await response.text()
+
+
+async def upstream_counts(upstream):
+    return await (await upstream.get('/_stats')).json()
+
+
+def test_requests_without_the_secret_are_rejected(serve):
+    async def scenario(client, upstream):
+        body = build('sendFinancialDetails', PHONES[0])
+        return [(await post(client, body, secret))[0] for secret in ("wrong", "")], await upstream_counts(upstream)
+
+    statuses, counts = serve(scenario)
+    assert statuses == [403, 403]
+    assert 'trackdrive' not in counts
+
+
+def test_function_call_is_dispatched_through_the_tool_registry(serve):
+    calls_before = async_app.tools.stats()['sendFinancialDetails']['calls']
+
+    async def scenario(client, upstream):
+        sent = await post(client, build('sendFinancialDetails', PHONES[1]))
+        unknown = await post(client, build('extractCallerInfo', PHONES[1]))
+        return sent, unknown, await upstream_counts(upstream)
+
+    (status, body), (unknown_status, unknown_body), counts = serve(scenario)
+    assert status == 200
+    assert json.loads(body) == {"status": "success", "message": "Keypress and combined data sent",
+                                "data_sent": True, "td_uuid": "td-0000001"}
+    assert counts['trackdrive'] == 1
+    assert async_app.tools.stats()['sendFinancialDetails']['calls'] == calls_before + 1
+    assert (unknown_status, json.loads(unknown_body)) == (400, {"error": "Unknown function: extractCallerInfo"})
+
+
+def test_malformed_or_non_object_json_is_a_bad_request(serve):
+    async def scenario(client, upstream):
+        return [(await post(client, body))[0] for body in (b'{"message": ', b'[1, 2]', b'"function-call"')]
+
+    assert serve(scenario) == [400, 400, 400]
+
+
+def test_outbox_mode_queues_the_keypress_for_the_dispatcher(serve, monkeypatch, tmp_path):
+    delivered = threading.Event()
+    sent = []
+
+    def send(td_uuid, digits, subdomain, data):
+        sent.append((td_uuid, digits, subdomain, data["caller_phone_number"]))
+        delivered.set()
+        return True
+
+    outbox = KeypressOutbox(send, path=str(tmp_path / "outbox.sqlite3"), poll_interval=0.05)
+    monkeypatch.setattr(async_app, 'TRACKDRIVE_DELIVERY_MODE', 'outbox')
+    monkeypatch.setattr(async_app, 'keypress_outbox', outbox)
+
+    async def scenario(client, upstream):
+        return await post(client, build('sendFinancialDetails', PHONES[2])), await upstream_counts(upstream)
+
+    try:
+        (status, body), counts = serve(scenario)
+        assert delivered.wait(5)
+    finally:
+        outbox.stop()
+    assert status == 200
+    body = json.loads(body)
+    assert body["queued"] is True and body["td_uuid"] == "td-0000002"
+    assert sent == [("td-0000002", "*", "global-telecom-investors", PHONES[2])]
+    # The dispatcher delivers it; the request itself never called TrackDrive
+    assert 'trackdrive' not in counts
+
+
+def test_omnia_answering_with_something_other_than_json_is_a_404(serve, monkeypatch):
+    async def not_json(request):
+        return web.Response(text="<html>maintenance</html>", content_type="text/html")
+
+    async def scenario(client, upstream):
+        omnia = web.Application()
+        omnia.router.add_get('/api/calls', not_json)
+        async with TestClient(TestServer(omnia)) as broken:
+            monkeypatch.setattr(async_app, 'OMNIA_CALLS_URL', str(broken.make_url('/api/calls')))
+            # A caller the periodic refresh has not indexed, so the lookup lists Omnia itself
+            return await post(client, build('sendFinancialDetails', "+15559990000"))
+
+    status, body = serve(scenario)
+    assert status == 404
+    assert json.loads(body)["message"] == "No webhook data found"
+
+
+def test_ready_once_warm_up_has_run(serve):
+    async def scenario(client, upstream):
+        response = await client.get('/ready')
+        return response.status, await response.json()
+
+    status, body = serve(scenario)
+    assert status == 200
+    assert body["state"] == "done"
+    assert body["steps"]["connections"]["ok"]
+
+
+def test_not_ready_before_warm_up_started():
+    async def scenario():
+        app = web.Application()
+        app['warmup'] = Warmup('test')
+        app.router.add_get('/ready', async_app.ready)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get('/ready')
+            return response.status, await response.json()
+
+    status, body = asyncio.run(scenario())
+    assert status == 503
+    assert body["state"] == "not_started"
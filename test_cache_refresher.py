@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from cache_refresher import CacheRefresher
+
+
+class FakeCache:
+    def __init__(self, due, renewed_elsewhere=()):
+        self.due = list(due)
+        self.renewed_elsewhere = set(renewed_elsewhere)
+        self.refreshed = []
+        self.prunes = 0
+
+    def prune_store(self):
+        self.prunes += 1
+        return 2
+
+    def expiring(self, within):
+        return list(self.due)
+
+    def claim_refresh(self, phone_number):
+        return phone_number not in self.renewed_elsewhere
+
+    def refresh(self, phone_number):
+        self.refreshed.append((phone_number, time.monotonic()))
+        self.due.remove(phone_number)
+
+
+def test_pass_is_paced_at_the_configured_rate():
+    cache = FakeCache(f"p{n}" for n in range(6))
+    refresher = CacheRefresher(cache, rate=50, interval=1)
+    start = time.monotonic()
+    assert refresher.run_once() == 6
+    # Five waits of 1/50s between six lookups, with no extra sleep per pass
+    assert 0.09 <= time.monotonic() - start < 0.3
+    assert refresher.backlog == 0
+
+
+def test_pass_budget_leaves_a_backlog_for_the_next_pass():
+    cache = FakeCache(f"p{n}" for n in range(10))
+    refresher = CacheRefresher(cache, rate=100, interval=0.04)
+    assert refresher.run_once() == 4
+    assert refresher.backlog == 6
+
+
+def test_rate_is_shared_between_processes():
+    refresher = CacheRefresher(FakeCache([]), rate=8, processes=4)
+    assert refresher.process_rate == 2
+    assert CacheRefresher(FakeCache([]), rate=8, processes=0).process_rate == 8
+
+
+def test_thread_keeps_the_configured_rate_across_passes():
+    cache = FakeCache(f"p{n}" for n in range(100))
+    refresher = CacheRefresher(cache, rate=100, interval=0.5)
+    refresher.start()
+    try:
+        deadline = time.monotonic() + 5
+        while cache.due and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        refresher.stop()
+    assert not cache.due
+    times = [at for _, at in cache.refreshed]
+    # Two passes of 50 lookups at 100/s: ~1s, not 1.5s with an interval's sleep in between
+    assert times[-1] - times[0] < 1.25
+
+
+def test_start_is_idempotent_within_a_process():
+    refresher = CacheRefresher(FakeCache([]), interval=10)
+    refresher.start(processes=3)
+    thread = refresher._thread
+    refresher.start()
+    try:
+        assert refresher._thread is thread
+        assert refresher.processes == 3
+    finally:
+        refresher.stop()
+
+
+def test_profiles_renewed_by_another_worker_do_not_spend_the_budget():
+    cache = FakeCache([f"p{n}" for n in range(6)], renewed_elsewhere={"p0", "p1", "p2"})
+    refresher = CacheRefresher(cache, rate=100, interval=0.03)
+    assert refresher.run_once() == 3
+    assert [phone for phone, _ in cache.refreshed] == ["p3", "p4", "p5"]
+    assert refresher.skipped == 3
+    assert refresher.backlog == 0
+
+
+def test_zero_rate_disables_the_refresher():
+    cache = FakeCache(["p0"])
+    refresher = CacheRefresher(cache, rate=0)
+    assert refresher.run_once() == 0
+    refresher.start()
+    assert refresher._thread is None
+    assert not cache.refreshed
+
+
+def test_negative_rate_is_rejected():
+    with pytest.raises(ValueError):
+        CacheRefresher(FakeCache([]), rate=-1)
+
+
+def test_store_is_pruned_once_per_prune_interval():
+    cache = FakeCache([])
+    refresher = CacheRefresher(cache, rate=100, interval=0.01, prune_interval=3600)
+    assert refresher.prune() == 2
+    assert refresher.prune() == 0
+    assert (cache.prunes, refresher.pruned) == (1, 2)
+
+
+def test_thread_prunes_the_store():
+    cache = FakeCache([])
+    refresher = CacheRefresher(cache, rate=100, interval=0.01, prune_interval=0)
+    refresher.start()
+    try:
+        deadline = time.monotonic() + 2
+        while cache.prunes < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        refresher.stop()
+    assert cache.prunes >= 2
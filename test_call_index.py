@@ -0,0 +1,189 @@
+import threading
+import time
+
+from call_index import CallIndex, CallIndexRefresher, normalize_phone
+from call_listing_store import CallListingStore
+
+
+def call(call_id, phone, **fields):
+    return dict(fields, call_id=call_id, caller_phone_number=phone)
+
+
+def test_normalize_phone():
+    assert normalize_phone('(555) 010-2000') == '+15550102000'
+    assert normalize_phone('+1 555 010 2000') == '+15550102000'
+    assert normalize_phone('') is None
+    assert normalize_phone('n/a') is None
+
+
+def test_lookup_by_phone_and_call_id():
+    index = CallIndex(ttl=15)
+    assert index.upsert_many([call('a', '5550102000'), call('b', '+15550103000')], now=0) == 2
+    assert index.get_by_phone('+1 (555) 010-2000', now=1)['call_id'] == 'a'
+    assert index.get_by_call_id('b', now=1)['call_id'] == 'b'
+    assert index.get_by_phone('5550109999', now=1) is None
+
+
+def test_returning_caller_gets_the_new_call_after_the_ttl():
+    index = CallIndex(ttl=15)
+    index.upsert_many([call('old', '5550102000')], now=0)
+    assert index.get_by_phone('5550102000', now=20) is None
+    # Omnia lists the caller's newest call first
+    index.upsert_many([call('new', '5550102000'), call('old', '5550102000')], now=20)
+    assert index.get_by_phone('5550102000', now=21)['call_id'] == 'new'
+
+
+def test_new_listing_replaces_known_calls_and_phone_mapping():
+    index = CallIndex(ttl=15)
+    index.upsert_many([call('old', '5550102000', first_name='')], now=0)
+    added = index.upsert_many([call('new', '5550102000'), call('old', '5550102000', first_name='Ann')], now=1)
+    assert added == 1
+    assert index.get_by_phone('5550102000', now=2)['call_id'] == 'new'
+    assert index.get_by_call_id('old', now=2)['first_name'] == 'Ann'
+
+
+def test_prune_drops_expired_calls_and_their_phones():
+    index = CallIndex(ttl=15)
+    index.upsert_many([call('a', '5550102000'), call('b', '5550103000')], now=0)
+    index.upsert_many([call('c', '5550104000')], now=16)
+    assert len(index) == 1
+    assert index.stats()["phones"] == 1
+    assert index.get_by_phone('5550104000', now=17)['call_id'] == 'c'
+
+
+def test_prune_keeps_a_phone_remapped_to_a_newer_call():
+    index = CallIndex(ttl=15)
+    index.upsert_many([call('old', '5550102000')], now=0)
+    index.upsert_many([call('new', '5550102000')], now=10)
+    index.upsert_many([], now=16)
+    assert index.get_by_phone('5550102000', now=16)['call_id'] == 'new'
+
+
+def test_capacity_evicts_the_oldest_listed_calls():
+    index = CallIndex(ttl=15, max_size=2)
+    index.upsert(call('a', '5550102000'), now=0)
+    index.upsert(call('b', '5550103000'), now=1)
+    index.upsert(call('c', '5550104000'), now=2)
+    assert index.get_by_call_id('a', now=3) is None
+    assert index.get_by_phone('5550102000', now=3) is None
+    assert len(index) == 2
+
+
+def test_listing_over_capacity_keeps_the_newest_calls():
+    index = CallIndex(ttl=15, max_size=3)
+    # Newest first, as Omnia lists them
+    added = index.upsert_many([call(f"c{n}", f"555010200{n}") for n in range(4, -1, -1)], now=0)
+    assert added == 5
+    assert len(index) == 3
+    assert [index.get_by_call_id(f"c{n}", now=1) is not None for n in range(5)] == [False, False, True, True, True]
+    assert index.get_by_phone('5550102004', now=1)['call_id'] == 'c4'
+    assert index.get_by_phone('5550102000', now=1) is None
+    assert index.stats()["phones"] == 3
+
+
+def test_listing_over_capacity_keeps_a_callers_newest_call():
+    index = CallIndex(ttl=15, max_size=2)
+    index.upsert_many([call('new', '5550102000'), call('other', '5550103000'), call('old', '5550102000')], now=0)
+    assert index.get_by_call_id('old', now=1) is None
+    assert index.get_by_phone('5550102000', now=1)['call_id'] == 'new'
+
+
+def test_concurrent_listings_keep_indexes_consistent():
+    index = CallIndex(ttl=15, max_size=500)
+
+    def listing(offset):
+        for round_ in range(50):
+            index.upsert_many([call(f"{offset}-{round_}-{n}", f"555010{n:04d}") for n in range(20)])
+
+    threads = [threading.Thread(target=listing, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(index) <= 500
+    for n in range(20):
+        assert index.get_by_phone(f"555010{n:04d}") is not None
+
+
+def test_refresher_keeps_listed_calls_indexed():
+    index = CallIndex(ttl=15)
+    listings = [[call('a', '5550102000')], [call('b', '5550102000'), call('a', '5550102000')]]
+    refresher = CallIndexRefresher(index, lambda: listings.pop(0), interval=5)
+    assert refresher.run_once() == 1
+    assert index.get_by_phone('5550102000')['call_id'] == 'a'
+    assert refresher.run_once() == 1
+    assert index.get_by_phone('5550102000')['call_id'] == 'b'
+    assert refresher.stats()["refreshes"] == 2
+
+
+def test_refresher_thread_survives_failed_listings():
+    index = CallIndex(ttl=15)
+    listed = threading.Event()
+    attempts = []
+
+    def fetch_calls():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("omnia down")
+        listed.set()
+        return [call('a', '5550102000')]
+
+    refresher = CallIndexRefresher(index, fetch_calls, interval=0.01)
+    refresher.start()
+    try:
+        assert listed.wait(2)
+    finally:
+        refresher.stop()
+    assert refresher.failures == 1
+    assert index.get_by_phone('5550102000')['call_id'] == 'a'
+
+
+def test_refresher_with_zero_interval_does_not_start():
+    refresher = CallIndexRefresher(CallIndex(ttl=15), lambda: [], interval=0)
+    refresher.start()
+    assert refresher._thread is None
+
+
+def test_unchanged_calls_keep_their_record_and_are_re_stamped():
+    index = CallIndex(ttl=15)
+    index.upsert_many([call('a', '5550102000', first_name='Ann')], now=0)
+    record = index.get_by_call_id('a', now=1)
+    assert index.upsert_many([call('a', '5550102000', first_name='Ann')], now=10) == 0
+    assert index.get_by_call_id('a', now=20) is record
+
+
+def test_workers_sharing_a_store_fetch_the_listing_once(tmp_path):
+    store = CallListingStore(str(tmp_path / "call_listing.sqlite3"))
+    fetches = []
+
+    def fetch_calls():
+        fetches.append(1)
+        return [call('a', '5550102000')]
+
+    workers = [CallIndexRefresher(CallIndex(ttl=15), fetch_calls, interval=5, store=store) for _ in range(3)]
+    for worker in workers:
+        worker.run_once()
+    assert len(fetches) == 1
+    assert [worker.index.get_by_phone('5550102000')['call_id'] for worker in workers] == ['a', 'a', 'a']
+    assert [worker.stats()["adopted"] for worker in workers] == [0, 1, 1]
+    # A listing is indexed once per worker, not again on every pass
+    assert workers[1].run_once() == 0 and workers[1].stats()["adopted"] == 1
+
+
+def test_shared_listing_expires_by_when_it_was_fetched(tmp_path, monkeypatch):
+    store = CallListingStore(str(tmp_path / "call_listing.sqlite3"))
+    store.claim(5)
+    store.publish([call('a', '5550102000')])
+    refresher = CallIndexRefresher(CallIndex(ttl=15), lambda: [], interval=5, store=store)
+    monkeypatch.setattr(time, 'time', lambda real=time.time: real() + 10)
+    refresher.adopt()
+    assert refresher.index.get_by_phone('5550102000') is not None
+    assert refresher.index.get_by_phone('5550102000', now=time.monotonic() + 6) is None
+
+
+def test_lapsed_claim_lets_another_worker_fetch(tmp_path, monkeypatch):
+    store = CallListingStore(str(tmp_path / "call_listing.sqlite3"))
+    assert store.claim(5)
+    assert not store.claim(5)
+    monkeypatch.setattr(time, 'time', lambda real=time.time: real() + 6)
+    assert store.claim(5)
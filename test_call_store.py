@@ -0,0 +1,93 @@
+import base64
+import json
+import sqlite3
+
+import pytest
+
+import call_store
+from call_store import CallStore, decode_cursor, encode_cursor
+
+
+def processed_call(call_id, created_at, number="+15550102000", tools=(), assistant_id="a1"):
+    return {"potential_uuid": call_id, "assistant_id": assistant_id, "campaign": None, "status": "ended",
+            "created_at": created_at, "caller_number": number, "call_summary": f"summary of {call_id}",
+            "tools_used": list(tools), "financial_details": None}
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CallStore(str(tmp_path / "calls.sqlite3"))
+
+
+def test_cursor_round_trips():
+    assert decode_cursor(encode_cursor("2026-10-01T10:00:00.000Z", "c1")) == ("2026-10-01T10:00:00.000Z", "c1")
+
+
+@pytest.mark.parametrize("cursor", [raw_cursor({}), raw_cursor(1), raw_cursor(["a"]), raw_cursor([1, 2]),
+                                    raw_cursor(None), "not base64!", base64.urlsafe_b64encode(b"\xff").decode()])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_search_pages_newest_first_with_cursors(store):
+    store.upsert_calls([processed_call(f"c{n}", f"2026-10-01T10:00:0{n}.000Z") for n in range(5)])
+    first, cursor = store.search_calls("", "auto", 2, None)
+    second, cursor = store.search_calls("", "auto", 2, cursor)
+    third, cursor = store.search_calls("", "auto", 2, cursor)
+    assert [call["id"] for call in first + second + third] == ["c4", "c3", "c2", "c1", "c0"]
+    assert cursor is None
+
+
+def test_phone_search_matches(store):
+    store.upsert_calls([processed_call("c1", "2026-10-01T10:00:00.000Z", "+15550102000"),
+                        processed_call("c2", "2026-10-01T10:00:01.000Z", "+14150109999")])
+    assert [call["id"] for call in store.search_calls("555-010-2000", "exact", 10, None)[0]] == ["c1"]
+    assert [call["id"] for call in store.search_calls("9999", "suffix", 10, None)[0]] == ["c2"]
+    assert [call["id"] for call in store.search_calls("+1415", "prefix", 10, None)[0]] == ["c2"]
+
+
+def test_aggregates_follow_replaced_calls(store):
+    store.upsert_calls([processed_call("c1", "2026-10-01T10:00:00.000Z", tools=["sendFinancialDetails"]),
+                        processed_call("c2", "2026-10-01T11:00:00.000Z")])
+    assert store.aggregate()["qualified_leads"] == 1
+    store.upsert_calls([processed_call("c1", "2026-10-01T10:00:00.000Z")])
+    metrics = store.aggregate()
+    assert metrics["calls"] == 2
+    assert metrics["qualified_leads"] == 0
+    assert store.search_metrics("", "auto")["calls"] == 2
+
+
+def test_old_database_is_migrated_and_backfilled(tmp_path):
+    path = str(tmp_path / "calls.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(call_store.SCHEMA)
+    conn.execute("INSERT INTO calls (id, assistant_id, status, created_at, caller_number, call_summary, tools_used) "
+                 "VALUES ('c1', 'a1', 'ended', '2026-10-01T10:00:00.000Z', '(555) 010-2000', '', "
+                 "'[\"sendFinancialDetails\"]')")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    store = CallStore(path)
+    assert store._connection().execute("PRAGMA user_version").fetchone()[0] == len(call_store.MIGRATIONS)
+    assert store.aggregate()["qualified_leads"] == 1
+    assert [call["id"] for call in store.search_calls("5550102000", "exact", 10, None)[0]] == ["c1"]
+
+
+def test_failed_migration_is_rolled_back_with_its_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "calls.sqlite3")
+    CallStore(path)
+    applied = len(call_store.MIGRATIONS)
+    monkeypatch.setattr(call_store, "MIGRATIONS", call_store.MIGRATIONS + [
+        "ALTER TABLE calls ADD COLUMN extra TEXT;\nALTER TABLE no_such_table ADD COLUMN broken TEXT;"
+    ])
+    with pytest.raises(sqlite3.OperationalError):
+        CallStore(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == applied
+    assert "extra" not in [row[1] for row in conn.execute("PRAGMA table_info(calls)")]
@@ -0,0 +1,58 @@
+import random
+from collections import Counter
+
+from call_trace import CallTracer
+
+
+def recording_tracer(**kwargs):
+    tracer = CallTracer(enabled=True, **kwargs)
+    tracer.written = []
+    tracer.write = lambda call_id, stage, payload: tracer.written.append((call_id, stage))
+    return tracer
+
+
+def calls(count):
+    return [({"id": f"c{n}"}, {"potential_uuid": f"c{n}"}) for n in range(count)]
+
+
+def test_disabled_tracer_traces_nothing():
+    session = CallTracer(enabled=False).session()
+    session.trace({"id": "c1"}, {"potential_uuid": "c1"})
+    session.finish()
+
+
+def test_targeted_call_is_written_immediately():
+    tracer = recording_tracer(sample=5)
+    session = tracer.session("c3")
+    for call, processed in calls(10):
+        session.trace(call, processed)
+    assert tracer.written == [("c3", "raw"), ("c3", "processed")]
+    session.finish()
+    assert len(tracer.written) == 2
+
+
+def test_sample_is_written_on_finish_once():
+    tracer = recording_tracer(sample=3)
+    session = tracer.session()
+    for call, processed in calls(10):
+        session.trace(call, processed)
+    assert tracer.written == []
+    session.finish()
+    session.finish()
+    assert len({call_id for call_id, _ in tracer.written}) == 3
+    assert len(tracer.written) == 6
+
+
+def test_sample_is_uniform_rather_than_the_first_calls():
+    random.seed(1234)
+    tracer = recording_tracer(sample=2)
+    picked = Counter()
+    for _ in range(2000):
+        tracer.written = []
+        session = tracer.session()
+        for call, processed in calls(10):
+            session.trace(call, processed)
+        session.finish()
+        picked.update(call_id for call_id, stage in tracer.written if stage == "raw")
+    # Each of the 10 calls is expected in 2000 * 2/10 = 400 samples
+    assert all(300 < picked[f"c{n}"] < 500 for n in range(10))
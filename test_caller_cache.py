@@ -0,0 +1,123 @@
+import threading
+import time
+
+from caller_cache import CallerProfileCache
+from profile_store import ProfileStore
+
+
+class Loader:
+    """Caller lookup that returns ``results`` in turn, optionally blocking until released."""
+
+    def __init__(self, *results, block=False):
+        self.results = list(results)
+        self.calls = 0
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, phone_number):
+        self.calls += 1
+        self.release.wait(5)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_hits_misses_and_errors_are_cached_for_their_own_ttl():
+    loader = Loader({"name": "Ann"}, None, RuntimeError("TextBack down"))
+    cache = CallerProfileCache(loader, hit_ttl=60, miss_ttl=60, error_ttl=0.05)
+    assert cache.get('+1') == {"name": "Ann"}
+    assert cache.get('+1') == {"name": "Ann"}
+    assert cache.get('+2') is None
+    assert cache.get('+2') is None
+    assert cache.get('+3') is None
+    time.sleep(0.06)
+    assert cache.get('+3') is None
+    assert loader.calls == 4
+    assert cache.stats()["load_errors"] == 2
+
+
+def test_stale_profile_is_served_while_it_refreshes():
+    loader = Loader({"v": 1}, {"v": 2})
+    cache = CallerProfileCache(loader, hit_ttl=0.05, stale_ttl=60)
+    assert cache.get('+1') == {"v": 1}
+    time.sleep(0.06)
+    assert cache.get('+1') == {"v": 1}
+    deadline = time.monotonic() + 2
+    while cache.get('+1') != {"v": 2} and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get('+1') == {"v": 2}
+
+
+def test_concurrent_lookups_share_one_loader_call():
+    loader = Loader({"name": "Ann"}, block=True)
+    cache = CallerProfileCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('+1'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    loader.release.set()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+    assert results == [{"name": "Ann"}] * 5
+
+
+def test_waiter_gives_up_on_a_hung_lookup():
+    loader = Loader({"name": "Ann"}, block=True)
+    cache = CallerProfileCache(loader, load_wait=0.05)
+    owner = threading.Thread(target=cache.get, args=('+1',))
+    owner.start()
+    time.sleep(0.02)
+    start = time.monotonic()
+    assert cache.get('+1') is None
+    assert time.monotonic() - start < 1
+    assert cache.stats()["load_wait_timeouts"] == 1
+    loader.release.set()
+    owner.join()
+    assert cache.get('+1') == {"name": "Ann"}
+
+
+def test_preload_copies_hot_profiles_from_the_store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.sqlite3"))
+    writer = CallerProfileCache(Loader({"name": "Ann"}), store=store)
+    writer.get('+1')
+    loader = Loader({"name": "Bob"})
+    reader = CallerProfileCache(loader, store=store)
+    assert reader.preload(10) == 1
+    assert reader.get('+1') == {"name": "Ann"}
+    assert loader.calls == 0
+
+
+def test_a_profile_renewed_by_another_worker_is_adopted_not_looked_up(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.sqlite3"))
+    CallerProfileCache(Loader({"name": "Ann"}), hit_ttl=60, store=store).get('+1')
+    first = CallerProfileCache(Loader({"name": "Ann B."}), hit_ttl=3600, store=store)
+    first.get('+1')
+    loader = Loader({"name": "Bob"})
+    second = CallerProfileCache(loader, hit_ttl=60, store=store)
+    second.get('+1')
+    # Both workers see '+1' due; the first claims and renews it, the second adopts the renewal
+    assert first.claim_refresh('+1')
+    assert not second.claim_refresh('+1')
+    first.refresh('+1')
+    assert not second.claim_refresh('+1')
+    assert second.get('+1') == {"name": "Ann B."}
+    assert loader.calls == 0
+
+
+def test_claim_refresh_without_a_store_always_refreshes():
+    cache = CallerProfileCache(Loader({"name": "Ann"}))
+    assert cache.claim_refresh('+1')
+
+
+def test_concurrent_load_errors_are_all_counted():
+    cache = CallerProfileCache(Loader(RuntimeError("TextBack down")), error_ttl=0)
+    threads = [threading.Thread(target=lambda n=n: [cache.get(f'+{n}-{i}') for i in range(50)]) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["load_errors"] == 400
@@ -0,0 +1,108 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from http_client import HTTPClient, RetryBudget  # noqa: E402
+
+
+class Upstream:
+    """Local HTTP server answering every request with ``status`` after ``delay`` seconds."""
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.hits = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self):
+                upstream.hits.append(self.command)
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                time.sleep(upstream.delay)
+                try:
+                    self.send_response(upstream.status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                except OSError:
+                    pass
+
+            do_GET = do_POST = _answer
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(Upstream(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_budget_refills_from_traffic_and_caps_at_capacity():
+    budget = RetryBudget(ratio=0.5, min_per_sec=0, capacity=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+    assert (budget.spent, budget.denied) == (2, 1)
+
+
+def test_post_read_timeout_is_not_retried_and_spends_no_budget(upstream):
+    server = upstream(delay=0.5)
+    client = HTTPClient('test', read_timeout=0.2, retries=2, backoff_factor=0)
+    with pytest.raises(requests.RequestException):
+        client.post(server.url, json={"digits": "*"})
+    time.sleep(0.4)
+    assert server.hits == ['POST']
+    assert client.stats()["retries_total"] == 0
+    assert client.stats()["retries_denied_total"] == 0
+
+
+def test_get_read_timeout_is_retried_and_spends_budget(upstream):
+    server = upstream(delay=0.5)
+    client = HTTPClient('test', read_timeout=0.2, retries=2, backoff_factor=0)
+    with pytest.raises(requests.RequestException):
+        client.get(server.url)
+    time.sleep(0.4)
+    assert server.hits == ['GET'] * 3
+    assert client.stats()["retries_total"] == 2
+
+
+def test_exhausted_budget_stops_status_retries(upstream):
+    server = upstream(status=503)
+    budget = RetryBudget(ratio=0, min_per_sec=0, capacity=1)
+    client = HTTPClient('test', retries=3, backoff_factor=0, retry_budget=budget)
+    with pytest.raises(requests.RequestException):
+        client.get(server.url)
+    assert server.hits == ['GET'] * 2
+    assert (budget.spent, budget.denied) == (1, 1)
+
+
+def test_reset_pools_drops_inherited_connections(upstream):
+    server = upstream()
+    client = HTTPClient('test')
+    client.get(server.url)
+    assert client.pool_stats()
+    client.reset_pools()
+    assert client.pool_stats() == {}
+    assert client.get(server.url).status_code == 200
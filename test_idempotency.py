@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from idempotency import IdempotencyStore, idempotency_key
+
+
+def test_key_prefers_the_tool_call_id():
+    assert idempotency_key({"id": "tc1", "name": "sendKeypress"}, "call1") == "tool:tc1"
+
+
+def test_key_separates_different_parameters_of_one_call():
+    first = idempotency_key({"name": "sendKeypress", "parameters": {"digits": "1"}}, "call1")
+    again = idempotency_key({"name": "sendKeypress", "parameters": {"digits": "1"}}, "call1")
+    other = idempotency_key({"name": "sendKeypress", "parameters": {"digits": "2"}}, "call1")
+    assert first == again != other
+    assert idempotency_key({"name": "sendKeypress"}, None) is None
+
+
+def test_completed_success_is_replayed():
+    store = IdempotencyStore()
+    runs = []
+    tool = lambda: runs.append(1) or ({"status": "success"}, 200)
+    assert store.run("k", tool) == ({"status": "success"}, 200)
+    assert store.run("k", tool) == ({"status": "success"}, 200)
+    assert len(runs) == 1
+    assert store.stats()["replayed"] == 1
+
+
+@pytest.mark.parametrize("status", [400, 404, 500, 502])
+def test_non_2xx_results_are_not_stored(status):
+    store = IdempotencyStore()
+    results = iter([({"status": "error"}, status), ({"status": "success"}, 200)])
+    assert store.run("k", lambda: next(results))[1] == status
+    # e.g. Omnia has listed the call by the time Vapi retries
+    assert store.run("k", lambda: next(results))[1] == 200
+    assert store.stats()["not_stored"] == 1
+
+
+def test_exception_is_not_stored():
+    store = IdempotencyStore()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        store.run("k", fail)
+    assert store.run("k", lambda: ({}, 200)) == ({}, 200)
+    assert len(store) == 1
+
+
+def test_concurrent_duplicates_execute_once():
+    store = IdempotencyStore()
+    runs = []
+    release = threading.Event()
+
+    def tool():
+        runs.append(1)
+        release.wait(5)
+        return {"status": "success"}, 200
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.run("k", tool))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1
+    assert results == [({"status": "success"}, 200)] * 5
+
+
+def test_duplicate_that_times_out_gets_409_without_running_again():
+    store = IdempotencyStore(wait_timeout=0.05)
+    runs = []
+    release = threading.Event()
+
+    def tool():
+        runs.append(1)
+        release.wait(5)
+        return {"status": "success"}, 200
+
+    first = threading.Thread(target=store.run, args=("k", tool))
+    first.start()
+    time.sleep(0.02)
+    body, status, headers = store.run("k", tool)
+    release.set()
+    first.join()
+    assert status == 409 and headers["Retry-After"]
+    assert len(runs) == 1
+    assert store.stats()["wait_timeouts"] == 1
+
+
+def test_entries_expire_and_are_evicted_beyond_capacity():
+    store = IdempotencyStore(ttl=0.05, capacity=2)
+    runs = []
+    tool = lambda: runs.append(1) or ({}, 200)
+    store.run("a", tool)
+    time.sleep(0.06)
+    store.run("a", tool)
+    assert len(runs) == 2
+    store.run("b", tool)
+    store.run("c", tool)
+    assert len(store) == 2
+    assert store.stats()["evictions"] == 1
+
+
+def test_run_async_replays_and_times_out():
+    async def scenario():
+        store = IdempotencyStore(wait_timeout=0.05)
+        runs = []
+        release = asyncio.Event()
+
+        async def tool():
+            runs.append(1)
+            await release.wait()
+            return {"status": "success"}, 200
+
+        first = asyncio.ensure_future(store.run_async("k", tool))
+        await asyncio.sleep(0.01)
+        timed_out = await store.run_async("k", tool)
+        release.set()
+        assert await first == ({"status": "success"}, 200)
+        assert await store.run_async("k", tool) == ({"status": "success"}, 200)
+        return timed_out[1], len(runs)
+
+    assert asyncio.run(scenario()) == (409, 1)
+
+
+def test_flask_store_retries_a_404_until_the_call_is_listed():
+    flask = pytest.importorskip("flask")
+    from idempotency import flask_store
+
+    app = flask.Flask(__name__)
+    store = flask_store()
+    listed = {"ready": False}
+    posts = []
+
+    @app.route('/hook', methods=['POST'])
+    def hook():
+        def tool():
+            if not listed["ready"]:
+                return flask.jsonify({"status": "error", "message": "No webhook data found"}), 404
+            posts.append(1)
+            return flask.jsonify({"status": "success"}), 200
+        return store.run("tool:tc1", tool)
+
+    client = app.test_client()
+    assert client.post('/hook').status_code == 404
+    listed["ready"] = True
+    assert client.post('/hook').status_code == 200
+    assert client.post('/hook').get_json() == {"status": "success"}
+    assert len(posts) == 1
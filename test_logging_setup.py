@@ -0,0 +1,66 @@
+import json
+import logging
+
+from logging_setup import JsonFormatter, LazyJSON
+
+
+class Unserializable:
+    def __str__(self):
+        return "unserializable"
+
+
+def test_small_payloads_render_as_json():
+    assert json.loads(str(LazyJSON({"a": [1, 2], "b": "é"}))) == {"a": [1, 2], "b": "é"}
+    assert str(LazyJSON({"when": Unserializable()})) == '{"when": "unserializable"}'
+
+
+def test_large_payloads_are_truncated_at_the_budget():
+    text = str(LazyJSON({"transcript": "x" * 10000}, max_bytes=100))
+    assert text.startswith('{"transcript": "xxx')
+    assert text.endswith("... <truncated at 100 bytes>")
+    assert len(text) == 100 + len("... <truncated at 100 bytes>")
+
+
+def test_strings_and_bytes_are_truncated_but_not_quoted():
+    assert str(LazyJSON("plain text")) == "plain text"
+    assert str(LazyJSON(b'{"raw": true}')) == '{"raw": true}'
+    assert str(LazyJSON(b"y" * 50, max_bytes=10)) == "y" * 10 + "... <truncated at 10 bytes>"
+
+
+def test_mappings_render_as_objects():
+    class Headers:
+        def items(self):
+            return [("Content-Type", "application/json")]
+
+    assert json.loads(str(LazyJSON(Headers()))) == {"Content-Type": "application/json"}
+
+
+def test_oversized_payloads_are_sampled_by_size_hint():
+    skipped = LazyJSON({"a": 1}, max_bytes=10, size_hint=500, sample_rate=0.0)
+    assert str(skipped) == "<500 bytes, not sampled>"
+    assert str(LazyJSON({"a": 1}, max_bytes=10, size_hint=5, sample_rate=0.0)) == '{"a": 1}'
+
+
+def test_nothing_is_rendered_when_the_record_is_filtered_out():
+    rendered = []
+
+    class Spy(LazyJSON):
+        __slots__ = ()
+
+        def _render(self):
+            rendered.append(1)
+            return super()._render()
+
+    logger = logging.getLogger("test_logging_setup.filtered")
+    logger.setLevel(logging.WARNING)
+    logger.info("Payload: %s", Spy({"a": 1}))
+    assert rendered == []
+
+
+def test_json_formatter_emits_one_object_per_record():
+    record = logging.LogRecord("svc", logging.INFO, "/app/app.py", 12, "Payload: %s", (LazyJSON({"a": 1}),), None)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "svc"
+    assert entry["where"] == "app.py:12"
+    assert entry["message"] == 'Payload: {"a": 1}'
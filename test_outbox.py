@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import Counter
+
+from outbox import KeypressOutbox
+
+
+def make_outbox(path, send=None, **kwargs):
+    outbox = KeypressOutbox(send or (lambda *args: True), path=str(path), **kwargs)
+    # Tests drive dispatch_once themselves instead of the background thread
+    outbox.ensure_started = lambda: None
+    return outbox
+
+
+def test_enqueue_is_idempotent_per_keypress(tmp_path):
+    outbox = make_outbox(tmp_path / 'outbox.sqlite3')
+    assert outbox.enqueue('td1', '*', 'sub', {"a": 1})
+    assert not outbox.enqueue('td1', '*', 'sub', {"a": 1})
+    assert outbox.enqueue('td1', '1', 'sub')
+    assert outbox.stats() == {"pending": 2}
+
+
+def test_dispatch_delivers_and_retries_with_backoff(tmp_path):
+    results = iter([False, True])
+    sent = []
+
+    def send(td_uuid, digits, subdomain, data):
+        sent.append((td_uuid, digits, subdomain, data))
+        return next(results)
+
+    outbox = make_outbox(tmp_path / 'outbox.sqlite3', send, base_backoff=0.05)
+    outbox.enqueue('td1', '*', 'sub', {"a": 1})
+    assert outbox.dispatch_once() == 1
+    assert outbox.stats() == {"pending": 1}
+    assert outbox.dispatch_once() == 0
+    time.sleep(0.06)
+    assert outbox.dispatch_once() == 1
+    assert outbox.stats() == {"delivered": 1}
+    assert sent == [('td1', '*', 'sub', {"a": 1})] * 2
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    def send(*args):
+        raise RuntimeError("boom")
+
+    outbox = make_outbox(tmp_path / 'outbox.sqlite3', send, max_attempts=1)
+    outbox.enqueue('td1', '*', 'sub')
+    outbox.dispatch_once()
+    assert outbox.stats() == {"failed": 1}
+
+
+def test_concurrent_dispatchers_deliver_each_keypress_once(tmp_path):
+    path = tmp_path / 'outbox.sqlite3'
+    sent = Counter()
+    sent_lock = threading.Lock()
+
+    def send(td_uuid, digits, subdomain, data):
+        # Slow enough that a batch of rows outlives one row's lease
+        time.sleep(0.05)
+        with sent_lock:
+            sent[(td_uuid, digits)] += 1
+        return True
+
+    producer = make_outbox(path)
+    for n in range(12):
+        producer.enqueue(f"td{n}", '*', 'sub')
+    dispatchers = [make_outbox(path, send, lease_seconds=0.2) for _ in range(2)]
+
+    def drain(outbox):
+        # Keep polling like the dispatcher thread does until every row is settled
+        deadline = time.monotonic() + 10
+        while set(outbox.stats()) - {"delivered"} and time.monotonic() < deadline:
+            if not outbox.dispatch_once():
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=drain, args=(outbox,)) for outbox in dispatchers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sent == Counter({(f"td{n}", '*'): 1 for n in range(12)})
+    assert producer.stats() == {"delivered": 12}
+
+
+def test_expired_lease_is_reclaimed_and_stale_sender_is_fenced(tmp_path):
+    path = tmp_path / 'outbox.sqlite3'
+    first = make_outbox(path, lease_seconds=0.05)
+    first.enqueue('td1', '*', 'sub')
+    (row, stale_lease) = first._claim_next()
+    time.sleep(0.06)
+
+    second = make_outbox(path, lease_seconds=5)
+    assert second.dispatch_once() == 1
+    assert first._finish('td1', '*', stale_lease, 1, False, "timed out") == 'lease_lost'
+    assert first.stats() == {"delivered": 1}
+
+
+def test_sweep_deletes_finished_rows_past_their_retention(tmp_path):
+    results = {'td-old': True, 'td-new': True, 'td-failed': False}
+    outbox = make_outbox(tmp_path / 'outbox.sqlite3', lambda td_uuid, *args: results[td_uuid], max_attempts=1,
+                         retention_seconds=60, failed_retention_seconds=600)
+    for td_uuid in results:
+        outbox.enqueue(td_uuid, '*', 'sub')
+    outbox.enqueue('td-pending', '*', 'sub')
+    outbox._connection().execute("UPDATE keypress_outbox SET next_attempt_at = next_attempt_at + 3600 "
+                                 "WHERE td_uuid = 'td-pending'")
+    outbox.dispatch_once()
+    conn = outbox._connection()
+    conn.execute("UPDATE keypress_outbox SET next_attempt_at = next_attempt_at - 120 "
+                 "WHERE td_uuid IN ('td-old', 'td-failed')")
+    assert outbox.sweep() == 1
+    assert outbox.stats() == {"delivered": 1, "failed": 1, "pending": 1}
+    # A retried webhook for a keypress still within retention is not queued again
+    assert not outbox.enqueue('td-new', '*', 'sub')
+    conn.execute("UPDATE keypress_outbox SET next_attempt_at = next_attempt_at - 600 WHERE td_uuid = 'td-failed'")
+    assert outbox.sweep() == 1
+    assert outbox.stats() == {"delivered": 1, "pending": 1}
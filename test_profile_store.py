@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+import pytest
+
+from profile_store import ProfileStore, store_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles.sqlite3"))
+
+
+def test_servable_profiles_round_trip(store):
+    now = time.time()
+    store.put("+15550102000", {"firstName": "Ada"}, "hit", 3, now + 60, now + 600)
+    assert store.get("+15550102000") == ({"firstName": "Ada"}, "hit", 3, now + 60, now + 600)
+    assert store.get("+15550109999") is None
+
+
+def test_profiles_past_their_stale_time_are_not_served_and_are_pruned(store):
+    now = time.time()
+    store.put("+1", {"firstName": "Old"}, "hit", 1, now - 20, now - 10)
+    store.put("+2", None, "miss", 0, now + 60, now + 600)
+    assert store.get("+1") is None
+    assert store.get("+2")[:2] == (None, "miss")
+    assert store.prune() == 1
+    assert store.prune() == 0
+
+
+def test_hot_lists_the_most_read_servable_hits(store):
+    now = time.time()
+    store.put("+1", {}, "hit", 5, now + 60, now + 600)
+    store.put("+2", {}, "hit", 50, now - 10, now + 600)
+    store.put("+3", None, "miss", 500, now + 60, now + 600)
+    store.put("+4", {}, "hit", 5000, now - 20, now - 10)
+    assert store.hot(10) == ["+2", "+1"]
+    assert store.hot(1) == ["+2"]
+
+
+def test_stores_share_profiles_through_the_file(tmp_path):
+    path = str(tmp_path / "profiles.sqlite3")
+    now = time.time()
+    ProfileStore(path).put("+1", {"state": "CA"}, "hit", 1, now + 60, now + 600)
+    assert ProfileStore(path).get("+1")[0] == {"state": "CA"}
+
+
+def test_put_failures_are_logged_not_raised(store, caplog):
+    store._connection().execute("DROP TABLE caller_profiles")
+    store.put("+1", {}, "hit", 1, time.time() + 60, time.time() + 600)
+    assert "Could not persist caller profile for +1" in caplog.text
+    with pytest.raises(sqlite3.Error):
+        store.get("+1")
+
+
+def test_claims_are_exclusive_until_the_lease_ends(tmp_path):
+    first = ProfileStore(str(tmp_path / "profiles.sqlite3"))
+    second = ProfileStore(str(tmp_path / "profiles.sqlite3"))
+    assert first.claim("+15550102000", lease=0.05)
+    assert not second.claim("+15550102000", lease=0.05)
+    assert second.claim("+15550103000", lease=0.05)
+    time.sleep(0.06)
+    assert second.claim("+15550102000", lease=0.05)
+
+
+def test_expired_claims_are_pruned(store):
+    assert store.claim("+15550102000", lease=-1)
+    assert store.claim("+15550103000", lease=60)
+    store.prune()
+    rows = store._connection().execute("SELECT phone FROM caller_profile_claims").fetchall()
+    assert rows == [("+15550103000",)]
+
+
+def test_apps_get_their_own_store_file():
+    assert store_path('index', 'data/caller_profiles.sqlite3') == 'data/caller_profiles.index.sqlite3'
+    assert store_path('index') != store_path('extracctname')
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from timing import (Histogram, RequestTimer, _current, pipeline_metrics, render_prometheus, set_call_id, span,
+                    timed_request)
+
+
+def route_lines(body, route):
+    return [line for line in body.splitlines() if f'route="{route}"' in line]
+
+
+def test_histogram_counts_are_cumulative_per_bucket():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.01, 0.05, 0.5, 2.0):
+        histogram.observe(seconds)
+    buckets, total, count = histogram.snapshot()
+    # An observation equal to a bound falls in that bucket (le)
+    assert buckets == [('0.01', 2), ('0.1', 3), ('1.0', 4), ('+Inf', 5)]
+    assert count == 5
+    assert total == pytest.approx(2.565)
+
+
+def test_span_outside_a_timed_request_is_a_no_op():
+    assert _current.get() is None
+    with span('parse'):
+        pass
+    set_call_id('call-1')
+    assert _current.get() is None
+
+
+def test_nested_and_repeated_spans_are_attributed_to_their_request():
+    seen = {}
+
+    @timed_request('test_nested')
+    def view():
+        set_call_id('call-nested')
+        with span('outer'):
+            time.sleep(0.02)
+            with span('inner'):
+                time.sleep(0.02)
+        with span('inner'):
+            time.sleep(0.02)
+        seen['timer'] = _current.get()
+        return 'ok', 201
+
+    assert view() == ('ok', 201)
+    timer = seen['timer']
+    assert timer.call_id == 'call-nested'
+    # An inner span also counts towards the span around it; a stage entered twice accumulates
+    assert timer.stages['outer'] >= 0.04
+    assert timer.stages['inner'] >= 0.04
+    assert _current.get() is None
+    assert pipeline_metrics.responses[('test_nested', 201)] == 1
+
+
+def test_concurrent_requests_keep_their_own_stages():
+    timers = {}
+    barrier = threading.Barrier(2)
+
+    @timed_request('test_threads')
+    def view(name, delay):
+        barrier.wait()
+        with span(name):
+            time.sleep(delay)
+        timers[name] = _current.get()
+        return 'ok'
+
+    threads = [threading.Thread(target=view, args=('fast', 0.01)), threading.Thread(target=view, args=('slow', 0.05))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(timers['fast'].stages) == ['fast']
+    assert list(timers['slow'].stages) == ['slow']
+    assert timers['slow'].stages['slow'] >= 0.05
+
+
+def test_async_view_is_timed_and_errors_record_their_status():
+    class Forbidden(Exception):
+        status = 403
+
+    @timed_request('test_async')
+    async def view(fail):
+        with span('work'):
+            await asyncio.sleep(0.01)
+        if fail:
+            raise Forbidden()
+        return 'ok'
+
+    assert asyncio.run(view(False)) == 'ok'
+    with pytest.raises(Forbidden):
+        asyncio.run(view(True))
+    assert pipeline_metrics.responses[('test_async', 200)] == 1
+    assert pipeline_metrics.responses[('test_async', 403)] == 1
+    assert pipeline_metrics.stages[('test_async', 'work')].count == 2
+
+
+def test_exposition_format():
+    timer = RequestTimer('test_exposition')
+    timer.add('call_index', 0.002)
+    pipeline_metrics.record(timer, 200, 0.3)
+    lines = route_lines(render_prometheus(), 'test_exposition')
+    assert 'klas_request_duration_seconds_bucket{route="test_exposition",le="0.25"} 0' in lines
+    assert 'klas_request_duration_seconds_bucket{route="test_exposition",le="0.5"} 1' in lines
+    assert 'klas_request_duration_seconds_bucket{route="test_exposition",le="+Inf"} 1' in lines
+    assert 'klas_request_duration_seconds_sum{route="test_exposition"} 0.3' in lines
+    assert 'klas_request_duration_seconds_count{route="test_exposition"} 1' in lines
+    assert 'klas_stage_duration_seconds_bucket{route="test_exposition",stage="call_index",le="0.005"} 1' in lines
+    assert 'klas_responses_total{route="test_exposition",status="200"} 1' in lines
+
+
+def test_metrics_endpoint_serves_the_exposition():
+    pytest.importorskip("flask")
+    import app
+
+    client = app.app.test_client()
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n')
+    for family in ('klas_request_duration_seconds histogram', 'klas_stage_duration_seconds histogram',
+                   'klas_responses_total counter', 'klas_tool_duration_seconds histogram',
+                   'klas_http_client_requests_total counter', 'klas_http_client_in_flight gauge'):
+        assert f'# TYPE {family}' in body
+    assert 'klas_tool_errors_total{tool="sendFinancialDetails"} 0' in body
+    assert 'klas_http_client_requests_total{client="trackdrive"}' in body
+    for line in body.splitlines():
+        assert line.startswith('# TYPE ') or len(line.rsplit(' ', 1)) == 2
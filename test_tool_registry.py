@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from tool_registry import ToolRegistry
+
+
+@pytest.fixture
+def tools():
+    registry = ToolRegistry()
+
+    @registry.register('sendKeypress', parameters={"type": "object", "required": ["digits"],
+                                                   "properties": {"digits": {"type": "string"}}},
+                       description="Press digits")
+    def send_keypress(parameters, td_uuid):
+        if td_uuid is None:
+            return {"status": "error"}, 400
+        return {"status": "success", "digits": parameters["digits"]}, 200
+
+    @registry.register('explode')
+    def explode(parameters):
+        raise RuntimeError("boom")
+
+    @registry.register('asyncTool')
+    async def async_tool(parameters):
+        return {"status": "success"}, 200
+
+    return registry
+
+
+def test_registered_tools_are_looked_up_by_name(tools):
+    assert tools.names() == ['sendKeypress', 'explode', 'asyncTool']
+    assert tools.get('missing') is None
+    assert tools.schemas()[0] == {"name": "sendKeypress", "description": "Press digits",
+                                  "parameters": tools.get('sendKeypress').parameters}
+    assert tools.schemas()[1]["parameters"] == {"type": "object", "properties": {}}
+
+
+def test_duplicate_registration_is_rejected(tools):
+    with pytest.raises(ValueError):
+        tools.register('explode')(lambda parameters: None)
+
+
+def test_calls_are_timed_and_failures_counted(tools):
+    tool = tools.get('sendKeypress')
+    assert tool({"digits": "1"}, "td-1") == ({"status": "success", "digits": "1"}, 200)
+    assert tool({"digits": "1"}, None)[1] == 400
+    with pytest.raises(RuntimeError):
+        tools.get('explode')({})
+    stats = tools.stats()
+    assert stats['sendKeypress']["calls"] == 2
+    assert stats['sendKeypress']["errors"] == 1
+    assert stats['sendKeypress']["exceptions"] == 0
+    assert stats['explode']["errors"] == stats['explode']["exceptions"] == 1
+
+
+def test_missing_required_parameters_are_logged_and_the_call_still_runs(tools, caplog):
+    with pytest.raises(KeyError):
+        tools.get('sendKeypress')({}, "td-1")
+    assert "sendKeypress called without required parameters: digits" in caplog.text
+    assert tools.get('sendKeypress').missing_parameters({"digits": "1"}) == []
+
+
+def test_async_handlers_are_awaited_and_timed(tools):
+    tool = tools.get('asyncTool')
+    assert tool.is_async
+    assert asyncio.run(tool({})) == ({"status": "success"}, 200)
+    assert tools.stats()['asyncTool']["calls"] == 1
+
+
+def test_tools_without_a_schema_follow_the_declared_definitions():
+    declared = {"lookup": {"name": "lookup", "description": "Look up a caller",
+                           "parameters": {"type": "object", "required": ["phone"]}}}
+    registry = ToolRegistry(definitions=lambda: declared)
+    registry.register('lookup')(lambda parameters: None)
+    registry.register('undeclared')(lambda parameters: None)
+    tool = registry.get('lookup')
+    assert tool.description == "Look up a caller"
+    assert tool.missing_parameters({}) == ["phone"]
+    # A reloaded definition takes effect without re-registering
+    declared["lookup"] = {"name": "lookup", "parameters": {"type": "object", "required": ["phone", "name"]}}
+    assert tool.missing_parameters({"phone": "+15550102000"}) == ["name"]
+    assert registry.get('undeclared').parameters == {"type": "object", "properties": {}}
+
+
+def test_financial_details_schema_declares_what_the_pipeline_reads():
+    from bench.payloads import FINANCIAL_DETAILS
+    from call_pipeline import SEND_FINANCIAL_DETAILS_SCHEMA, build_combined_data
+
+    assert sorted(SEND_FINANCIAL_DETAILS_SCHEMA["required"]) == sorted(FINANCIAL_DETAILS)
+    assert sorted(SEND_FINANCIAL_DETAILS_SCHEMA["properties"]) == sorted(FINANCIAL_DETAILS)
+    combined = build_combined_data({}, FINANCIAL_DETAILS)
+    assert {name: combined[name] for name in FINANCIAL_DETAILS} == FINANCIAL_DETAILS
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import traffic_capture
+from traffic_capture import CaptureWriter, capture_request, redact
+
+PHONE = "+15550102000"
+
+
+def vapi_body():
+    return {
+        "message": {
+            "type": "tool-calls",
+            "call": {"id": "call-1", "customer": {"number": PHONE, "name": "Ann Example"}},
+            "phoneNumber": {"twilioPhoneNumber": "+15550109999", "name": "Inbound line"},
+            "functionCall": {"name": "sendFinancialDetails", "parameters": {"first_name": "Ann", "debt_type": "card"}},
+            "toolCalls": [{"id": "tc-1", "function": {
+                "name": "extractCallerInfo",
+                "arguments": json.dumps({"name": "Ann Example", "phone": PHONE, "email": "ann@example.com",
+                                         "monthly_income": 4200}),
+            }}],
+            "artifact": {"messages": [{"role": "user", "message": "My number is 555 010 2000"}]},
+        }
+    }
+
+
+def test_redact_replaces_caller_details_and_keeps_the_rest():
+    message = redact(vapi_body())["message"]
+    customer = message["call"]["customer"]
+    assert customer["number"].startswith("+1555") and customer["number"] != PHONE
+    assert customer["name"] == "x" * len("Ann Example")
+    assert message["phoneNumber"]["twilioPhoneNumber"] != "+15550109999"
+    assert message["phoneNumber"]["name"] == "Inbound line"
+    assert message["functionCall"]["name"] == "sendFinancialDetails"
+    assert message["functionCall"]["parameters"] == {"first_name": "xxx", "debt_type": "card"}
+    assert message["artifact"]["messages"][0]["message"] == "x" * len("My number is 555 010 2000")
+    assert message["call"]["id"] == "call-1"
+
+
+def test_redact_decodes_string_encoded_tool_arguments():
+    function = redact(vapi_body())["message"]["toolCalls"][0]["function"]
+    assert function["name"] == "extractCallerInfo"
+    arguments = json.loads(function["arguments"])
+    assert arguments["name"] == "x" * len("Ann Example")
+    assert arguments["phone"] == redact({"number": PHONE})["number"]
+    assert arguments["email"].endswith("@example.invalid")
+    assert arguments["monthly_income"] == 4200
+
+
+def test_redact_replaces_arguments_that_are_not_json():
+    assert redact({"arguments": "call me at 5550102000"}) == {"arguments": "x" * len("call me at 5550102000")}
+
+
+def end_of_call_report():
+    recording = "https://storage.vapi.ai/call-1-mono.wav"
+    return {
+        "message": {
+            "type": "end-of-call-report",
+            "endedReason": "customer-ended-call",
+            "recordingUrl": recording,
+            "stereoRecordingUrl": "https://storage.vapi.ai/call-1-stereo.wav",
+            "summary": "Ann owes about 24k on cards",
+            "artifact": {
+                "recordingUrl": recording,
+                "recording": {"stereoUrl": "https://storage.vapi.ai/call-1-stereo.wav",
+                              "mono": {"combinedUrl": recording,
+                                       "customerUrl": "https://storage.vapi.ai/call-1-customer.wav"}},
+                "transcript": "AI: Hi. User: This is Ann.",
+            },
+            "call": {"id": "call-1", "customer": {"number": PHONE},
+                     "monitor": {"listenUrl": "wss://phone-call-websocket.vapi.ai/call-1/listen",
+                                 "controlUrl": "https://phone-call-websocket.vapi.ai/call-1/control"}},
+        }
+    }
+
+
+def test_redact_replaces_recording_and_call_control_urls():
+    body = end_of_call_report()
+    message = redact(body)["message"]
+    captured = json.dumps(message)
+    for host in ("storage.vapi.ai", "phone-call-websocket"):
+        assert host not in captured
+    assert message["recordingUrl"].startswith("https://redacted.invalid/")
+    assert message["artifact"]["recording"]["mono"]["customerUrl"].startswith("https://redacted.invalid/")
+    # The same recording maps to the same placeholder wherever it appears
+    assert message["recordingUrl"] == message["artifact"]["recordingUrl"]
+    assert message["artifact"]["transcript"] == "x" * len(body["message"]["artifact"]["transcript"])
+    assert (message["type"], message["endedReason"]) == ("end-of-call-report", "customer-ended-call")
+
+
+def test_redacted_phone_numbers_are_stable():
+    assert redact({"number": PHONE})["number"] == redact({"phone": PHONE})["phone"]
+    assert redact({"number": PHONE}) != redact({"number": "+15550103000"})
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    writer = CaptureWriter(path=str(tmp_path / "capture.jsonl"), headers=["content-type"])
+    monkeypatch.setattr(traffic_capture, "capture_writer", writer)
+    return writer
+
+
+def captured(writer, count):
+    deadline = time.monotonic() + 5
+    while writer.captured < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with open(writer.path, encoding='utf-8') as capture:
+        return [json.loads(line) for line in capture]
+
+
+def test_disabled_capture_returns_the_view_unchanged():
+    def view():
+        return "ok"
+
+    assert capture_request('route', enabled=False)(view) is view
+
+
+def test_flask_view_requests_are_captured_redacted(writer):
+    flask = pytest.importorskip("flask")
+    app = flask.Flask(__name__)
+
+    @app.route('/webhook', methods=['POST'])
+    @capture_request('webhook', enabled=True)
+    def webhook():
+        if flask.request.headers.get('X-Vapi-Secret') != 's3cret':
+            flask.abort(403)
+        return {"ok": True}, 201
+
+    client = app.test_client()
+    assert client.post('/webhook', json=vapi_body(), headers={'X-Vapi-Secret': 's3cret'}).status_code == 201
+    assert client.post('/webhook', json=vapi_body()).status_code == 403
+    accepted, rejected = captured(writer, 2)
+    assert accepted["route"] == "webhook" and accepted["status"] == 201
+    assert accepted["headers"] == {"content-type": "application/json"}
+    assert accepted["body"]["message"]["call"]["customer"]["name"] == "x" * len("Ann Example")
+    assert PHONE not in json.dumps(accepted)
+    # Rejected requests are recorded without reading their body
+    assert (rejected["status"], rejected["body"], rejected["body_bytes"]) == (403, None, 0)
+
+
+def test_aiohttp_view_requests_are_captured_redacted(writer):
+    web = pytest.importorskip("aiohttp.web")
+    from aiohttp.test_utils import TestClient, TestServer
+
+    @capture_request('webhook', enabled=True)
+    async def webhook(request):
+        await request.read()
+        return web.json_response({"ok": True})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post('/webhook', webhook)
+        async with TestClient(TestServer(app)) as client:
+            return (await client.post('/webhook', json=vapi_body())).status
+
+    assert asyncio.run(scenario()) == 200
+    record, = captured(writer, 1)
+    assert record["status"] == 200
+    assert record["body"]["message"]["phoneNumber"]["twilioPhoneNumber"] != "+15550109999"
+    assert PHONE not in json.dumps(record)
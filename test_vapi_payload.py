@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from vapi_payload import DEFAULT_PATHS, VapiPayload, extract
+
+
+def message(**fields):
+    return {"message": dict({"type": "function-call",
+                             "functionCall": {"id": "tc1", "name": "sendKeypress", "parameters": {"digits": "1"}},
+                             "call": {"id": "call-1", "customer": {"number": "+15550102000"}},
+                             "artifact": {"messages": [{"role": "user", "message": "hi"}] * 50}}, **fields)}
+
+
+def from_json_loads(body, path):
+    value = json.loads(body)
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def assert_matches_json_loads(body):
+    payload = VapiPayload(body)
+    for path in DEFAULT_PATHS:
+        assert payload.get(path) == from_json_loads(body, path), path
+
+
+def test_fields_match_json_loads_without_decoding_the_body():
+    body = json.dumps(message()).encode()
+    payload = VapiPayload(body)
+    assert payload.message_type == "function-call"
+    assert payload.function_call["name"] == "sendKeypress"
+    assert payload.call_id == "call-1"
+    assert payload.customer_number == "+15550102000"
+    assert not payload.decoded
+    assert_matches_json_loads(body)
+
+
+@pytest.mark.parametrize("body", [
+    # A repeated wanted leaf used to count as a second found field and stop the scan early
+    '{"message": {"type": "status-update", "type": "function-call", '
+    '"call": {"id": "call-1", "customer": {"number": "+15550102000"}}, "functionCall": {"name": "x"}}}',
+    '{"message": {"call": {"id": "a", "id": "b", "customer": {"number": "+1"}}, "type": "t", "functionCall": {}}}',
+    '{"message": {"call": {"id": "a"}, "call": {"customer": {"number": "+1"}}, "type": "t", "functionCall": {}}}',
+    '{"message": {"type": "t"}, "message": {"type": "u", "call": {"id": "c"}, "functionCall": null}}',
+])
+def test_duplicate_keys_match_json_loads(body):
+    assert_matches_json_loads(body)
+    assert_matches_json_loads(body.encode())
+
+
+def test_duplicate_keys_off_the_wanted_paths_keep_the_selective_scan():
+    body = ('{"message": {"artifact": 1, "artifact": 2, "type": "t", "functionCall": {"name": "x"}, '
+            '"call": {"orgId": "o", "orgId": "p", "id": "c", "customer": {"number": "+1"}}}}')
+    payload = VapiPayload(body)
+    assert payload.call_id == "c"
+    assert not payload.decoded
+    assert_matches_json_loads(body)
+
+
+def test_escaped_strings_match_json_loads():
+    body = json.dumps(message(type="function‐call \"quoted\" \\ \n",
+                              call={"id": "cé😀", "customer": {"number": "+1\t555"}},
+                              artifact={"transcript": "} { \" ] [ ,"}))
+    assert '\\u' in body
+    assert_matches_json_loads(body)
+    assert_matches_json_loads(body.encode())
+
+
+def test_escaped_keys_are_matched_by_their_decoded_value():
+    body = '{"message": {"\\u0074ype": "function-call", "functionCall": {}, "call": {"id": "c"}}}'
+    assert VapiPayload(body).message_type == "function-call"
+    assert_matches_json_loads(body)
+
+
+def test_nested_call_objects_only_match_at_their_path():
+    body = json.dumps(message(
+        artifact={"call": {"id": "not-this-one"}},
+        call={"customer": {"number": "+15550102000", "call": {"id": "nor-this-one"}}, "id": "call-1"}))
+    assert VapiPayload(body).call_id == "call-1"
+    assert_matches_json_loads(body)
+
+
+def test_call_that_is_not_an_object_matches_json_loads():
+    body = '{"message": {"type": "t", "call": "call-1", "functionCall": {}}}'
+    assert VapiPayload(body).call_id is None
+    assert_matches_json_loads(body)
+
+
+def test_missing_function_call():
+    fields = message()
+    del fields["message"]["functionCall"]
+    body = json.dumps(fields)
+    payload = VapiPayload(body)
+    assert payload.function_call == {}
+    assert payload.call_id == "call-1"
+    assert_matches_json_loads(body)
+
+
+def test_truncated_body_raises_value_error_like_json_loads():
+    body = json.dumps({"message": {"artifact": {"messages": ["x"] * 10}, "type": "function-call",
+                                   "functionCall": {}, "call": {"id": "call-1"}}})
+    truncated = body[:body.index('"type"') + 10]
+    with pytest.raises(ValueError):
+        json.loads(truncated)
+    with pytest.raises(ValueError):
+        VapiPayload(truncated).message_type
+
+
+def test_body_truncated_after_every_field_still_yields_them():
+    body = json.dumps(message())
+    truncated = body[:body.index('"artifact"') + 20]
+    assert extract(truncated)[("message", "call", "id")] == "call-1"
+    assert VapiPayload(truncated).call_id == "call-1"
+
+
+def test_non_object_body_raises_value_error():
+    with pytest.raises(ValueError):
+        VapiPayload(b"[1, 2]").message_type
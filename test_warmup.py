@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+
+from warmup import Warmup, origins, trackdrive_urls, warm_connections
+
+
+class FakeClient:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.requests.append((method, url))
+        if url in self.failing:
+            raise ConnectionError("refused")
+
+
+def test_origins_are_distinct_roots_of_set_urls():
+    assert origins(["https://a.example/v1/calls?x=1", "https://a.example/other", None, "",
+                    "http://b.example:8080/path"]) == ["http://b.example:8080/", "https://a.example/"]
+
+
+def test_trackdrive_urls_fill_in_each_subdomain():
+    assert trackdrive_urls("https://{subdomain}.trackdrive.com/api", ["one", "two"]) == [
+        "https://one.trackdrive.com/api", "https://two.trackdrive.com/api"]
+
+
+def test_warm_connections_touches_each_host_per_host_times():
+    client = FakeClient(failing={"https://down.example/"})
+    opened = warm_connections(client, ["https://up.example/a", "https://up.example/b", "https://down.example/x"],
+                              per_host=3)
+    assert opened == {"https://down.example/": 0, "https://up.example/": 3}
+    assert sorted(client.requests) == [("HEAD", "https://down.example/")] * 3 + [("HEAD", "https://up.example/")] * 3
+    assert warm_connections(client, [None], per_host=3) == {}
+
+
+def test_steps_run_in_order_and_failures_are_recorded():
+    warmup = Warmup("test", budget=5)
+    ran = []
+
+    @warmup.step("first")
+    def first():
+        ran.append("first")
+        raise RuntimeError("upstream down")
+
+    @warmup.step("second")
+    def second():
+        ran.append("second")
+        return {"loaded": 3}
+
+    assert warmup.status()["state"] == "not_started"
+    assert not warmup.ready
+    assert warmup.start().wait()
+    assert ran == ["first", "second"]
+    status = warmup.status()
+    assert status["ready"] and status["state"] == "done"
+    assert status["steps"]["first"]["ok"] is False
+    assert status["steps"]["first"]["detail"] == "upstream down"
+    assert status["steps"]["second"] == {"ok": True, "seconds": status["steps"]["second"]["seconds"],
+                                         "detail": {"loaded": 3}}
+
+
+def test_start_runs_once_per_process():
+    warmup = Warmup("test", budget=5)
+    runs = []
+    warmup.step("count")(lambda: runs.append(1))
+    warmup.start().wait()
+    warmup.start().wait()
+    assert runs == [1]
+
+
+def test_ready_once_the_budget_runs_out():
+    warmup = Warmup("test", budget=0.1)
+    release = threading.Event()
+    warmup.step("slow")(lambda: release.wait(5))
+    warmup.start()
+    try:
+        assert warmup.status()["state"] == "warming"
+        assert not warmup.ready
+        started = time.monotonic()
+        assert warmup.wait() is False
+        assert time.monotonic() - started < 1
+        assert warmup.ready
+        assert warmup.status()["state"] == "budget_expired"
+    finally:
+        release.set()
+
+
+def test_disabled_warmup_is_ready_without_running_steps():
+    warmup = Warmup("test", enabled=False)
+    runs = []
+    warmup.step("count")(lambda: runs.append(1))
+    assert warmup.start().wait()
+    assert warmup.ready
+    assert warmup.status()["state"] == "disabled"
+    assert runs == []
+
+
+def test_run_async_awaits_coroutines_and_runs_functions_in_the_executor():
+    warmup = Warmup("test", budget=5)
+    ran = []
+
+    @warmup.step("coroutine")
+    async def coroutine_step():
+        ran.append(("coroutine", threading.current_thread().name))
+
+    @warmup.step("function")
+    def function_step():
+        ran.append(("function", threading.current_thread().name))
+
+    asyncio.run(warmup.run_async())
+    assert [name for name, _ in ran] == ["coroutine", "function"]
+    assert ran[0][1] == threading.current_thread().name != ran[1][1]
+    assert warmup.status()["state"] == "done"
+
+
+def test_run_async_returns_when_the_budget_runs_out():
+    warmup = Warmup("test", budget=0.1)
+
+    @warmup.step("slow")
+    async def slow():
+        await asyncio.sleep(0.5)
+
+    async def scenario():
+        started = time.monotonic()
+        await warmup.run_async()
+        returned_after = time.monotonic() - started
+        state = warmup.status()["state"]
+        await asyncio.sleep(0.6)
+        return returned_after, state, warmup.status()["state"]
+
+    returned_after, state, later = asyncio.run(scenario())
+    assert returned_after < 0.4
+    assert state == "budget_expired"
+    assert later == "done"
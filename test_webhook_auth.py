@@ -0,0 +1,89 @@
+import asyncio
+import io
+
+import pytest
+
+from webhook_auth import WEBHOOK_SECRET_HEADER, admission_error, limit_body_size, require_webhook_auth, secret_matches
+
+SECRET = "s3cret"
+
+
+def test_secret_matches_only_the_expected_secret():
+    assert secret_matches(SECRET, SECRET)
+    assert not secret_matches("wrong", SECRET)
+    assert not secret_matches(None, SECRET)
+    assert not secret_matches(SECRET, None)
+    assert not secret_matches("", "")
+    assert secret_matches("sécret", "sécret")
+
+
+def test_admission_checks_the_secret_before_the_size():
+    assert admission_error({}, 10, SECRET) == (403, "secret validation failed")
+    assert admission_error({WEBHOOK_SECRET_HEADER: "wrong"}, 10 ** 9, SECRET, max_body_bytes=100)[0] == 403
+    assert admission_error({WEBHOOK_SECRET_HEADER: SECRET}, 101, SECRET, max_body_bytes=100)[0] == 413
+    assert admission_error({WEBHOOK_SECRET_HEADER: SECRET}, 100, SECRET, max_body_bytes=100) is None
+    assert admission_error({WEBHOOK_SECRET_HEADER: SECRET}, None, SECRET, max_body_bytes=100) is None
+
+
+@pytest.fixture
+def flask_client():
+    flask = pytest.importorskip("flask")
+    app = flask.Flask(__name__)
+    limit_body_size(app, max_body_bytes=100)
+    reads = []
+
+    @app.route('/webhook', methods=['POST'])
+    @require_webhook_auth(lambda: SECRET, max_body_bytes=100)
+    def webhook():
+        reads.append(flask.request.get_data())
+        return {"ok": True}
+
+    client = app.test_client()
+    client.reads = reads
+    return client
+
+
+def test_flask_view_admits_a_request_with_the_secret(flask_client):
+    response = flask_client.post('/webhook', data=b'{}', headers={WEBHOOK_SECRET_HEADER: SECRET})
+    assert response.status_code == 200
+    assert flask_client.reads == [b'{}']
+
+
+def test_flask_view_rejects_without_reading_the_body(flask_client):
+    assert flask_client.post('/webhook', data=b'{}', headers={WEBHOOK_SECRET_HEADER: "wrong"}).status_code == 403
+    assert flask_client.post('/webhook', data=b'x' * 101, headers={WEBHOOK_SECRET_HEADER: SECRET}).status_code == 413
+    assert flask_client.reads == []
+
+
+def test_flask_caps_chunked_bodies_without_a_content_length(flask_client):
+    # gunicorn decodes the chunks and marks the input as terminated, as set here. Werkzeug
+    # then stops reading at MAX_CONTENT_LENGTH, so the view sees a cut-off (invalid) body.
+    flask_client.post('/webhook', input_stream=io.BytesIO(b'x' * 120),
+                      headers={WEBHOOK_SECRET_HEADER: SECRET, 'Transfer-Encoding': 'chunked'},
+                      environ_overrides={'wsgi.input_terminated': True})
+    assert flask_client.reads == [b'x' * 100]
+
+
+def test_aiohttp_view_rejects_before_the_handler_runs():
+    web = pytest.importorskip("aiohttp.web")
+    from aiohttp.test_utils import TestClient, TestServer
+
+    handled = []
+
+    @require_webhook_auth(lambda: SECRET, max_body_bytes=100)
+    async def webhook(request):
+        handled.append(await request.read())
+        return web.json_response({"ok": True})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post('/webhook', webhook)
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+            for body, secret in ((b'{}', SECRET), (b'{}', "wrong"), (b'x' * 101, SECRET)):
+                response = await client.post('/webhook', data=body, headers={WEBHOOK_SECRET_HEADER: secret})
+                statuses.append(response.status)
+            return statuses
+
+    assert asyncio.run(scenario()) == [200, 403, 413]
+    assert handled == [b'{}']
@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# One structured record per timed request; route it to its own handler if needed
+timing_logger = logging.getLogger('request_timing')
+
+# Upper bounds (seconds) of latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class Histogram:
+    """Thread-safe Prometheus-style latency histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """([(upper bound label, cumulative count)], sum, count)."""
+        with self._lock:
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                cumulative += count
+                buckets.append(('+Inf' if bound == float('inf') else str(bound), cumulative))
+            return buckets, self.sum, self.count
+
+
+class RequestTimer:
+    """Stage durations of one request, keyed by the call it belongs to."""
+
+    __slots__ = ('route', 'call_id', 'start', 'stages')
+
+    def __init__(self, route):
+        self.route = route
+        self.call_id = None
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        # A stage entered twice (e.g. two lookups) accumulates
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class PipelineMetrics:
+    """Histograms of request and per-stage latency across all timed requests."""
+
+    def __init__(self):
+        self.stages = {}
+        self.requests = {}
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram())
+        return histogram
+
+    def record(self, timer, status, elapsed):
+        self._histogram(self.requests, timer.route).observe(elapsed)
+        for stage, seconds in timer.stages.items():
+            self._histogram(self.stages, (timer.route, stage)).observe(seconds)
+        with self._lock:
+            key = (timer.route, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def prometheus_lines(self):
+        with self._lock:
+            requests, stages, responses = list(self.requests.items()), list(self.stages.items()), list(self.responses.items())
+        lines = ["# TYPE klas_request_duration_seconds histogram"]
+        for route, histogram in sorted(requests, key=lambda item: item[0]):
+            lines += _histogram_lines("klas_request_duration_seconds", {"route": route}, histogram)
+        lines.append("# TYPE klas_stage_duration_seconds histogram")
+        for (route, stage), histogram in sorted(stages, key=lambda item: item[0]):
+            lines += _histogram_lines("klas_stage_duration_seconds", {"route": route, "stage": stage}, histogram)
+        lines.append("# TYPE klas_responses_total counter")
+        for (route, status), count in sorted(responses):
+            lines.append(f"klas_responses_total{_labels({'route': route, 'status': status})} {count}")
+        return lines
+
+
+pipeline_metrics = PipelineMetrics()
+
+
+@contextmanager
+def span(stage):
+    """Time a block as ``stage`` of the current request; a no-op outside a timed request."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage, time.perf_counter() - start)
+
+
+def set_call_id(call_id):
+    """Key the current request's timing record by this call id."""
+    timer = _current.get()
+    if timer is not None and call_id:
+        timer.call_id = call_id
+
+
+def timed_request(route):
+    """Decorator for a Flask or aiohttp view that records its stage timings.
+
+    Emits one JSON record on the ``request_timing`` logger per request and
+    feeds pipeline_metrics for /metrics.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                timer = RequestTimer(route)
+                token = _current.set(timer)
+                status = 500
+                try:
+                    result = await view(*args, **kwargs)
+                    status = status_of(result)
+                    return result
+                except Exception as e:
+                    status = status_of(e, 500)
+                    raise
+                finally:
+                    _current.reset(token)
+                    _finish(timer, status)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            timer = RequestTimer(route)
+            token = _current.set(timer)
+            status = 500
+            try:
+                result = view(*args, **kwargs)
+                status = status_of(result)
+                return result
+            except Exception as e:
+                status = status_of(e, 500)
+                raise
+            finally:
+                _current.reset(token)
+                _finish(timer, status)
+        return wrapper
+    return decorator
+
+
+def _finish(timer, status):
+    elapsed = time.perf_counter() - timer.start
+    pipeline_metrics.record(timer, status, elapsed)
+    if timing_logger.isEnabledFor(logging.INFO):
+        timing_logger.info(json.dumps({
+            "route": timer.route,
+            "call_id": timer.call_id,
+            "status": status,
+            "total_ms": round(elapsed * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timer.stages.items()},
+        }))
+
+
+def status_of(result, default=200):
+    """HTTP status of a Flask/aiohttp view result or HTTP exception."""
+    if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        return result[1]
+    for attribute in ('status_code', 'code', 'status'):
+        value = getattr(result, attribute, None)
+        if isinstance(value, int):
+            return value
+    return default
+
+
+def _labels(labels):
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _histogram_lines(name, labels, histogram):
+    buckets, total, count = histogram.snapshot()
+    lines = [f"{name}_bucket{_labels(dict(labels, le=bound))} {cumulative}" for bound, cumulative in buckets]
+    lines.append(f"{name}_sum{_labels(labels)} {total}")
+    lines.append(f"{name}_count{_labels(labels)} {count}")
+    return lines
+
+
+def render_prometheus(tools=None, http_stats=None):
+    """Prometheus text exposition of pipeline timings, tool registry timings and HTTP client counters."""
+    lines = pipeline_metrics.prometheus_lines()
+    if tools is not None:
+        lines.append("# TYPE klas_tool_duration_seconds histogram")
+        for tool in tools.tools():
+            lines += _histogram_lines("klas_tool_duration_seconds", {"tool": tool.name}, tool.latency)
+        lines.append("# TYPE klas_tool_errors_total counter")
+        for tool in tools.tools():
+            lines.append(f"klas_tool_errors_total{_labels({'tool': tool.name})} {tool.errors}")
+    if http_stats is not None:
+        for metric, kind in (("requests_total", "counter"), ("errors_total", "counter"),
+                             ("retries_total", "counter"), ("in_flight", "gauge")):
+            lines.append(f"# TYPE klas_http_client_{metric} {kind}")
+            for client, stats in sorted(http_stats.items()):
+                lines.append(f"klas_http_client_{metric}{_labels({'client': client})} {stats[metric]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,148 @@
+import inspect
+import logging
+import threading
+import time
+
+from timing import Histogram, status_of
+
+logger = logging.getLogger(__name__)
+
+
+class Tool:
+    """A registered Vapi function: its handler, declared parameter schema and timing.
+
+    Handlers take the function-call parameters as their first argument.
+    ``definition`` returns the function's Vapi definition, used for the
+    schema and description when they are not given here.
+    """
+
+    def __init__(self, name, handler, parameters=None, description=None, definition=None):
+        self.name = name
+        self.handler = handler
+        self._parameters = parameters
+        self._description = description
+        self.definition = definition
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self._lock = threading.Lock()
+        self.latency = Histogram()
+        self.errors = 0
+        self.exceptions = 0
+
+    def _declared(self, key):
+        definition = self.definition() if self.definition is not None else None
+        return (definition or {}).get(key)
+
+    @property
+    def parameters(self):
+        if self._parameters is not None:
+            return self._parameters
+        return self._declared("parameters") or {"type": "object", "properties": {}}
+
+    @property
+    def description(self):
+        if self._description is not None:
+            return self._description
+        return self._declared("description")
+
+    def missing_parameters(self, parameters):
+        return [name for name in self.parameters.get("required", []) if name not in (parameters or {})]
+
+    def __call__(self, parameters, *args, **kwargs):
+        missing = self.missing_parameters(parameters)
+        if missing:
+            logger.warning(f"{self.name} called without required parameters: {', '.join(missing)}")
+        if self.is_async:
+            return self._call_async(parameters, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = self.handler(parameters, *args, **kwargs)
+        except Exception:
+            self._observe(time.perf_counter() - start, None, raised=True)
+            raise
+        self._observe(time.perf_counter() - start, result)
+        return result
+
+    async def _call_async(self, parameters, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await self.handler(parameters, *args, **kwargs)
+        except Exception:
+            self._observe(time.perf_counter() - start, None, raised=True)
+            raise
+        self._observe(time.perf_counter() - start, result)
+        return result
+
+    def _observe(self, elapsed, result, raised=False):
+        failed = raised or status_of(result) >= 400
+        self.latency.observe(elapsed)
+        with self._lock:
+            if failed:
+                self.errors += 1
+            if raised:
+                self.exceptions += 1
+
+    def stats(self):
+        buckets, total, count = self.latency.snapshot()
+        return {
+            "calls": count,
+            "errors": self.errors,
+            "exceptions": self.exceptions,
+            "latency_seconds_sum": round(total, 6),
+            "latency_seconds_buckets": dict(buckets),
+        }
+
+
+class ToolRegistry:
+    """Name -> Tool table for Vapi function-calls.
+
+        tools = ToolRegistry()
+
+        @tools.register('sendKeypress', parameters={...})
+        def send_keypress(...):
+            ...
+
+        tool = tools.get(function_name)
+
+    Every call through a Tool is timed into a latency histogram, and calls
+    that raise or return a 4xx/5xx status are counted as errors.
+
+    ``definitions`` returns {name: Vapi function definition}, e.g. the
+    functions an assistant config hands to Vapi. Tools registered without
+    their own schema take it from there on every use, so the parameters
+    checked are always the ones Vapi was told about.
+    """
+
+    def __init__(self, definitions=None):
+        self._tools = {}
+        self._definitions = definitions
+
+    def register(self, name, parameters=None, description=None):
+        def decorator(handler):
+            if name in self._tools:
+                raise ValueError(f"Tool already registered: {name}")
+            definition = self._definition_of(name) if self._definitions is not None else None
+            self._tools[name] = Tool(name, handler, parameters, description, definition)
+            return handler
+        return decorator
+
+    def _definition_of(self, name):
+        def definition():
+            return self._definitions().get(name)
+        return definition
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def names(self):
+        return list(self._tools)
+
+    def tools(self):
+        return list(self._tools.values())
+
+    def schemas(self):
+        """Vapi function definitions for every registered tool."""
+        return [{"name": tool.name, "description": tool.description, "parameters": tool.parameters}
+                for tool in self._tools.values()]
+
+    def stats(self):
+        return {name: tool.stats() for name, tool in self._tools.items()}
@@ -0,0 +1,204 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from timing import status_of
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_ENABLED = os.getenv('CAPTURE_ENABLED', '0') == '1'
+CAPTURE_PATH = os.getenv('CAPTURE_PATH', os.path.join('captures', 'handle_incoming_call.jsonl'))
+CAPTURE_MAX_BYTES = int(os.getenv('CAPTURE_MAX_BYTES', str(50 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv('CAPTURE_BACKUPS', '5'))
+CAPTURE_QUEUE_SIZE = int(os.getenv('CAPTURE_QUEUE_SIZE', '10000'))
+# Only these headers are kept; X-Vapi-Secret and auth headers never are
+CAPTURE_HEADERS = [name.strip().lower() for name in
+                   os.getenv('CAPTURE_HEADERS', 'content-type,content-length,user-agent').split(',') if name.strip()]
+
+PHONE_KEYS = {'number', 'phone', 'caller_phone_number', 'caller_id', 'from', 'phoneNumber', 'twilioPhoneNumber'}
+EMAIL_KEYS = {'email'}
+# Personal details and free text; kept as same-length placeholders so payload sizes stay realistic
+TEXT_KEYS = {'first_name', 'last_name', 'firstName', 'lastName', 'fName', 'lName', 'address', 'message',
+             'content', 'transcript', 'summary', 'secondaryMessage'}
+# 'name' is a person's name only inside these objects; functionCall.name and function.name are tool names
+NAME_PARENT_KEYS = {'customer', 'arguments', 'parameters'}
+# Keys ending in these hold links to the caller's audio or to the live call: recordingUrl,
+# stereoRecordingUrl, artifact.recording.mono.customerUrl, call.monitor.listenUrl and controlUrl, ...
+URL_KEY_SUFFIXES = ('url', 'Url', 'URL')
+# Tool-call arguments Vapi sends as a JSON-encoded string
+JSON_STRING_KEYS = {'arguments'}
+# Statuses of requests rejected from their headers (see webhook_auth.py), whose body is never read
+UNREAD_STATUSES = {403, 413}
+
+
+def _digest(value):
+    return hashlib.sha256(str(value).encode()).hexdigest()
+
+
+def redact(value, key=None, parent=None):
+    """Copy of a webhook body with caller details replaced.
+
+    Phone numbers become stable fake numbers (the same caller maps to the
+    same number, so cache behaviour survives a replay). Emails, names and
+    free text are replaced with placeholders of the same length, and
+    recording and call-control URLs with unreachable ones. Tool-call
+    arguments sent as a JSON string are decoded, redacted and re-encoded;
+    ones that don't decode are replaced like free text.
+    """
+    if isinstance(value, dict):
+        return {k: redact(v, k, key) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(item, key, parent) for item in value]
+    if not isinstance(value, str) or not value:
+        return value
+    if key in JSON_STRING_KEYS:
+        try:
+            decoded = json.loads(value)
+        except ValueError:
+            return "x" * len(value)
+        return json.dumps(redact(decoded, key, parent), ensure_ascii=False)
+    if key in PHONE_KEYS:
+        return "+1555" + str(int(_digest(value)[:12], 16) % 10 ** 7).zfill(7)
+    if key in EMAIL_KEYS:
+        return f"user-{_digest(value)[:10]}@example.invalid"
+    if isinstance(key, str) and key.endswith(URL_KEY_SUFFIXES):
+        return f"https://redacted.invalid/{_digest(value)[:16]}"
+    if key in TEXT_KEYS or (key == 'name' and parent in NAME_PARENT_KEYS):
+        return "x" * len(value)
+    return value
+
+
+class CaptureWriter:
+    """Appends captured requests to a rotating JSONL file from a background thread.
+
+    The request path only enqueues the raw body; parsing, redaction and file
+    I/O happen on the writer thread. When the queue is full the request is
+    dropped from the capture rather than slowing the webhook down.
+    """
+
+    def __init__(self, path=CAPTURE_PATH, max_bytes=CAPTURE_MAX_BYTES, backups=CAPTURE_BACKUPS,
+                 queue_size=CAPTURE_QUEUE_SIZE, headers=CAPTURE_HEADERS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.headers = headers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._handler = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                                 backupCount=self.backups, encoding='utf-8')
+            self._handler.setFormatter(logging.Formatter('%(message)s'))
+            threading.Thread(target=self._run, name="traffic-capture", daemon=True).start()
+            self._pid = os.getpid()
+            logger.info(f"Capturing webhook traffic to {self.path}")
+
+    def submit(self, route, received_at, body, headers, status, duration):
+        self._ensure_started()
+        kept = {name: headers.get(name) for name in self.headers if headers.get(name) is not None}
+        try:
+            self._queue.put_nowait((route, received_at, body, kept, status, duration))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            route, received_at, body, headers, status, duration = self._queue.get()
+            try:
+                try:
+                    payload = redact(json.loads(body))
+                except ValueError:
+                    payload = None
+                line = json.dumps({
+                    "ts": received_at,
+                    "route": route,
+                    "headers": headers,
+                    "body": payload,
+                    "body_bytes": len(body),
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 3),
+                }, ensure_ascii=False)
+                self._handler.emit(logging.makeLogRecord({"msg": line}))
+                self.captured += 1
+            except Exception as e:
+                logger.error(f"❌ Failed to write captured request: {str(e)}")
+
+    def stats(self):
+        return {"captured": self.captured, "dropped": self.dropped, "queued": self._queue.qsize(), "path": self.path}
+
+
+capture_writer = CaptureWriter()
+
+
+def capture_request(route, enabled=None):
+    """Decorator for a Flask or aiohttp view that records its requests when CAPTURE_ENABLED=1.
+
+    Disabled, it returns the view unchanged so there is no per-request cost.
+    """
+    enabled = CAPTURE_ENABLED if enabled is None else enabled
+
+    def decorator(view):
+        if not enabled:
+            return view
+
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                received_at = time.time()
+                start = time.perf_counter()
+                status = 500
+                try:
+                    result = await view(request, *args, **kwargs)
+                    status = status_of(result)
+                    return result
+                except Exception as e:
+                    status = status_of(e, 500)
+                    raise
+                finally:
+                    # aiohttp caches the body once read, so this doesn't read it twice. Requests
+                    # rejected before their body was read are captured without it.
+                    body = b'' if status in UNREAD_STATUSES else await request.read()
+                    capture_writer.submit(route, received_at, body, request.headers, status,
+                                          time.perf_counter() - start)
+            return async_wrapper
+
+        # Imported here so the module stays usable without Flask (e.g. by async_app)
+        from flask import request as flask_request
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            received_at = time.time()
+            start = time.perf_counter()
+            status = 500
+            try:
+                result = view(*args, **kwargs)
+                status = status_of(result)
+                return result
+            except Exception as e:
+                status = status_of(e, 500)
+                raise
+            finally:
+                body = b'' if status in UNREAD_STATUSES else flask_request.get_data(cache=True)
+                capture_writer.submit(route, received_at, body, flask_request.headers, status,
+                                      time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -1,9 +1,12 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, jsonify
 import requests
 import os
 from dotenv import load_dotenv
+from http_client import get_client
+from webhook_auth import limit_body_size, require_webhook_auth
 load_dotenv()
 app = Flask(__name__)
+limit_body_size(app)
 
 SERVER_SECRET = os.getenv('SERVER_SECRET')
 
@@ -11,18 +14,14 @@ TEXTBACK_API_URL = os.getenv('TEXTBACK_API_URL')
 TEXTBACK_API_TOKEN = os.getenv('TEXTBACK_API_TOKEN')
 TEXTBACK_API_SECRET = os.getenv('TEXTBACK_API_SECRET')
 
+textback_client = get_client('textback')
+
 @app.route('/handle_incoming_call', methods=['POST'])
+@require_webhook_auth(lambda: SERVER_SECRET)
 def handle_incoming_call():
     data = request.json
 
     print(f"Incoming Request Data: {data}")
-    print(f"Headers: {request.headers}")
-
-    received_secret = request.headers.get('X-Vapi-Secret')
-    print(f"Received Secret: {received_secret}")
-
-    if received_secret != SERVER_SECRET:
-        abort(403)  # Forbidden if secrets do not match
 
     message_type = data.get('message', {}).get('type')
 
@@ -110,7 +109,11 @@ def get_contact_info(phone_number):
     params = {
         'phone': phone_number
     }
-    response = requests.get(TEXTBACK_API_URL, headers=headers, params=params)
+    try:
+        response = textback_client.get(TEXTBACK_API_URL, headers=headers, params=params)
+    except requests.RequestException as e:
+        print(f"Error fetching contact info: {e}")
+        return None
     if response.status_code == 200:
         return response.json().get('info', {})
     else:
@@ -118,4 +121,5 @@ def get_contact_info(phone_number):
         return None
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Development server only; run under gunicorn in production (see DEPLOYMENT.md)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5000)
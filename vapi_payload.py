@@ -0,0 +1,172 @@
+import json
+import re
+
+# Fields handle_incoming_call needs from a Vapi server message
+MESSAGE_TYPE = ('message', 'type')
+FUNCTION_CALL = ('message', 'functionCall')
+CALL_ID = ('message', 'call', 'id')
+CUSTOMER_NUMBER = ('message', 'call', 'customer', 'number')
+DEFAULT_PATHS = (MESSAGE_TYPE, FUNCTION_CALL, CALL_ID, CUSTOMER_NUMBER)
+
+_WS = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _Done(Exception):
+    """Raised once every wanted path has been found, to stop scanning early."""
+
+
+class _DuplicateKey(ValueError):
+    """Raised when a key on a wanted path repeats; the caller decodes the whole body instead."""
+
+
+def _expect(text, pos, token):
+    pos = _WS.match(text, pos).end()
+    if text[pos:pos + 1] != token:
+        raise ValueError(f"expected {token} at char {pos}")
+    return _WS.match(text, pos + 1).end()
+
+
+def _scan_object(text, pos, wanted, found, path):
+    """Walk the object at ``pos``, descending only into the keys of the ``wanted`` tree.
+
+    Values off the wanted paths are stepped over one at a time with the C
+    scanner and dropped straight away, so no more than one of them is alive
+    at once. Returns the position just past the object, or raises _Done as
+    soon as ``found['_missing']`` drops to zero. A wanted key that appears
+    twice raises _DuplicateKey, since json.loads keeps the last occurrence
+    and the scan may already have stopped looking.
+    """
+    pos = _expect(text, pos, '{')
+    if text[pos:pos + 1] == '}':
+        return pos + 1
+    seen = set()
+    while True:
+        key, pos = _decoder.raw_decode(text, pos)
+        if not isinstance(key, str):
+            raise ValueError(f"expected an object key before char {pos}")
+        pos = _expect(text, pos, ':')
+        subtree = wanted.get(key, False)
+        if subtree is not False:
+            if key in seen:
+                raise _DuplicateKey(f"duplicate key {'.'.join(path + (key,))} at char {pos}")
+            seen.add(key)
+        if subtree is None:
+            found[path + (key,)], pos = _decoder.raw_decode(text, pos)
+            found['_missing'] -= 1
+            if not found['_missing']:
+                raise _Done()
+        elif subtree and text[pos:pos + 1] == '{':
+            pos = _scan_object(text, pos, subtree, found, path + (key,))
+        else:
+            pos = _decoder.raw_decode(text, pos)[1]
+        pos = _WS.match(text, pos).end()
+        separator = text[pos:pos + 1]
+        if separator == '}':
+            return pos + 1
+        if separator != ',':
+            raise ValueError(f"expected , or }} at char {pos}")
+        pos = _WS.match(text, pos + 1).end()
+
+
+def extract(body, paths=DEFAULT_PATHS):
+    """{path: value} for the ``paths`` present in the JSON object ``body``.
+
+    Only the objects along the requested paths are walked. Everything else
+    (transcripts, message history, artifacts) is stepped over and discarded
+    value by value instead of being held as one object graph, and scanning
+    stops as soon as every path has been found. Raises ValueError if the body
+    is not valid JSON up to that point, or if a key along the requested paths
+    repeats before then (VapiPayload then falls back to json.loads, which
+    keeps the last value).
+    """
+    wanted = {}
+    for path in paths:
+        node = wanted
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = None
+    found = {'_missing': len(set(paths))}
+    try:
+        _scan_object(body.decode('utf-8') if isinstance(body, bytes) else body, 0, wanted, found, ())
+    except _Done:
+        pass
+    found.pop('_missing')
+    return found
+
+
+class VapiPayload:
+    """A Vapi server-message body that decodes only the fields the webhook reads.
+
+    The common fields are extracted on first access without building the
+    rest of the object graph; ``data`` decodes the whole body on demand and
+    caches it. If the selective scan fails, the payload falls back to the
+    full decode, which raises ValueError for a body that isn't valid JSON.
+
+        payload = VapiPayload(request.get_data(cache=True))
+        if payload.message_type == 'function-call': ...
+    """
+
+    __slots__ = ('body', 'paths', '_fields', '_data')
+
+    def __init__(self, body, paths=DEFAULT_PATHS):
+        self.body = body
+        self.paths = paths
+        self._fields = None
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.body)
+            if not isinstance(self._data, dict):
+                raise ValueError("Vapi payload is not a JSON object")
+        return self._data
+
+    @property
+    def decoded(self):
+        return self._data is not None
+
+    def get(self, path, default=None):
+        """Value at ``path`` (a tuple of keys), decoding the full body only for paths not in ``paths``."""
+        if self._data is None and path in self.paths:
+            if self._fields is None:
+                try:
+                    self._fields = extract(self.body, self.paths)
+                except ValueError:
+                    self._fields = self._fields_from_data()
+            return self._fields.get(path, default)
+        value = self.data
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    def _fields_from_data(self):
+        fields = {}
+        for path in self.paths:
+            value = self.data
+            for key in path:
+                if not isinstance(value, dict) or key not in value:
+                    break
+                value = value[key]
+            else:
+                fields[path] = value
+        return fields
+
+    @property
+    def message_type(self):
+        return self.get(MESSAGE_TYPE)
+
+    @property
+    def function_call(self):
+        return self.get(FUNCTION_CALL) or {}
+
+    @property
+    def call_id(self):
+        return self.get(CALL_ID)
+
+    @property
+    def customer_number(self):
+        return self.get(CUSTOMER_NUMBER)
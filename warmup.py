@@ -0,0 +1,216 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') == '1'
+# Longest a worker stays unready; warm-up steps still running afterwards finish in the background
+WARMUP_BUDGET_SECONDS = float(os.getenv('WARMUP_BUDGET_SECONDS', '15'))
+WARMUP_CONNECTIONS_PER_HOST = int(os.getenv('WARMUP_CONNECTIONS_PER_HOST', '4'))
+WARMUP_HOT_PROFILES = int(os.getenv('WARMUP_HOT_PROFILES', '500'))
+WARMUP_TRACKDRIVE_SUBDOMAINS = [subdomain.strip() for subdomain in
+                                os.getenv('WARMUP_TRACKDRIVE_SUBDOMAINS', 'global-telecom-investors').split(',')
+                                if subdomain.strip()]
+
+
+def origins(urls):
+    """Distinct scheme://host[:port]/ roots of ``urls``, skipping unset ones."""
+    roots = set()
+    for url in urls:
+        if url:
+            parts = urlsplit(url)
+            roots.add(f"{parts.scheme}://{parts.netloc}/")
+    return sorted(roots)
+
+
+def trackdrive_urls(template, subdomains=None):
+    """The keypress URL of every subdomain worth warming."""
+    return [template.format(subdomain=subdomain) for subdomain in (subdomains or WARMUP_TRACKDRIVE_SUBDOMAINS)]
+
+
+def warm_connections(client, urls, per_host=WARMUP_CONNECTIONS_PER_HOST):
+    """Open up to ``per_host`` keep-alive connections to each host of ``urls`` in an http_client pool.
+
+    Each connection is opened by a concurrent HEAD of the host root, so the
+    TCP and TLS handshakes are done before the first call needs them. The
+    response status doesn't matter; the connection goes back to the pool.
+    Returns {origin: connections that answered}.
+    """
+    roots = origins(urls)
+    if not roots or per_host <= 0:
+        return {}
+
+    def touch(root):
+        try:
+            client.request('HEAD', root, allow_redirects=False)
+            return True
+        except Exception as e:
+            logger.warning(f"Warm-up connection to {root} failed: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(roots) * per_host, thread_name_prefix="warmup-connect") as pool:
+        results = {root: [pool.submit(touch, root) for _ in range(per_host)] for root in roots}
+    return {root: sum(future.result() for future in futures) for root, futures in results.items()}
+
+
+async def warm_connections_async(session, urls, per_host=WARMUP_CONNECTIONS_PER_HOST):
+    """warm_connections() for an aiohttp ClientSession."""
+    roots = origins(urls)
+
+    async def touch(root):
+        try:
+            async with session.head(root, allow_redirects=False):
+                return True
+        except Exception as e:
+            logger.warning(f"Warm-up connection to {root} failed: {str(e)}")
+            return False
+
+    results = await asyncio.gather(*(touch(root) for root in roots for _ in range(per_host)))
+    return {root: sum(results[index * per_host:(index + 1) * per_host]) for index, root in enumerate(roots)}
+
+
+class Warmup:
+    """Warm-up steps a worker runs before it reports ready, and the readiness they gate.
+
+    Steps run in registration order, once per process (so a preloaded app
+    warms each forked worker, not the master). A step returns a short detail
+    for the status report; a step that raises is logged and the rest still
+    run. The worker is ready once every step finished or ``budget`` seconds
+    have passed since warm-up started, whichever is first.
+
+        warmup = Warmup('app')
+
+        @warmup.step('connections')
+        def warm_upstreams():
+            return warm_connections(omnia_client, [OMNIA_CALLS_URL])
+    """
+
+    def __init__(self, name, budget=WARMUP_BUDGET_SECONDS, enabled=WARMUP_ENABLED):
+        self.name = name
+        self.budget = budget
+        self.enabled = enabled
+        self._steps = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._started_at = None
+        self._finished_at = None
+        self._done = threading.Event()
+        self.results = {}
+
+    def step(self, name):
+        def decorator(fn):
+            self._steps.append((name, fn))
+            return fn
+        return decorator
+
+    def _begin(self):
+        """Reset state for this process. Returns False if warm-up already started here."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            self._started_at = time.monotonic()
+            self._finished_at = None
+            self._done = threading.Event()
+            self.results = {}
+        if not self.enabled:
+            self._finish()
+            return False
+        logger.info(f"Warming up {self.name} (budget {self.budget:g}s)")
+        return True
+
+    def _finish(self):
+        self._finished_at = time.monotonic()
+        self._done.set()
+        if self.enabled:
+            failed = [name for name, result in self.results.items() if not result["ok"]]
+            logger.info(f"{'✅' if not failed else '❌'} Warm-up of {self.name} finished in "
+                        f"{self._finished_at - self._started_at:.2f}s"
+                        + (f", failed steps: {', '.join(failed)}" if failed else ""))
+
+    def _record(self, name, start, detail=None, error=None):
+        self.results[name] = {"ok": error is None, "seconds": round(time.monotonic() - start, 3),
+                              "detail": detail if error is None else str(error)}
+        if error is not None:
+            logger.error(f"❌ Warm-up step {self.name}.{name} failed: {str(error)}")
+
+    def start(self):
+        """Run the steps on a background thread unless this process already started them."""
+        if self._begin():
+            threading.Thread(target=self._run, name=f"warmup-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        for name, fn in self._steps:
+            start = time.monotonic()
+            try:
+                self._record(name, start, fn())
+            except Exception as e:
+                self._record(name, start, error=e)
+        self._finish()
+
+    async def run_async(self):
+        """Run the steps on the running event loop, returning once done or out of budget.
+
+        Coroutine steps are awaited; plain functions run in the loop's executor.
+        """
+        if not self._begin():
+            return
+
+        async def run_steps():
+            loop = asyncio.get_running_loop()
+            for name, fn in self._steps:
+                start = time.monotonic()
+                try:
+                    if inspect.iscoroutinefunction(fn):
+                        detail = await fn()
+                    else:
+                        detail = await loop.run_in_executor(None, fn)
+                    self._record(name, start, detail)
+                except Exception as e:
+                    self._record(name, start, error=e)
+            self._finish()
+
+        task = asyncio.ensure_future(run_steps())
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.budget)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up of {self.name} still running after {self.budget:g}s; reporting ready")
+
+    def wait(self):
+        """Block until warm-up finished or its budget ran out. Returns True if it finished."""
+        if self._started_at is None:
+            return False
+        return self._done.wait(max(0.0, self._started_at + self.budget - time.monotonic()))
+
+    @property
+    def ready(self):
+        if self._done.is_set():
+            return True
+        return self._started_at is not None and time.monotonic() - self._started_at >= self.budget
+
+    def status(self):
+        if self._started_at is None:
+            state = "not_started"
+        elif not self.enabled:
+            state = "disabled"
+        elif self._done.is_set():
+            state = "done"
+        elif self.ready:
+            state = "budget_expired"
+        else:
+            state = "warming"
+        end = self._finished_at or time.monotonic()
+        return {
+            "ready": self.ready,
+            "state": state,
+            "elapsed_seconds": round(end - self._started_at, 3) if self._started_at is not None else None,
+            "budget_seconds": self.budget,
+            "steps": dict(self.results),
+        }
@@ -0,0 +1,77 @@
+import functools
+import hmac
+import inspect
+import logging
+import os
+
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_SECRET_HEADER = 'X-Vapi-Secret'
+# Largest webhook body accepted; end-of-call reports with long transcripts stay well under this
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv('WEBHOOK_MAX_BODY_BYTES', str(2 * 1024 * 1024)))
+
+
+def secret_matches(received, expected):
+    """Constant-time comparison of the received webhook secret. An unset expected secret never matches."""
+    if not expected or received is None:
+        return False
+    return hmac.compare_digest(received.encode('utf-8'), expected.encode('utf-8'))
+
+
+def admission_error(headers, content_length, expected_secret, max_body_bytes=WEBHOOK_MAX_BODY_BYTES):
+    """(status, reason) for a request that must be rejected from its headers alone, else None."""
+    if not secret_matches(headers.get(WEBHOOK_SECRET_HEADER), expected_secret):
+        return 403, "secret validation failed"
+    if content_length is not None and content_length > max_body_bytes:
+        return 413, f"body of {content_length} bytes exceeds {max_body_bytes}"
+    return None
+
+
+def require_webhook_auth(get_secret, max_body_bytes=WEBHOOK_MAX_BODY_BYTES):
+    """Decorator for a Flask or aiohttp webhook view that admits a request before its body is read.
+
+    ``get_secret`` returns the expected X-Vapi-Secret. The secret and the
+    declared Content-Length are checked from headers alone, so rejected
+    requests never have their body read or decoded. Bodies sent without a
+    Content-Length are capped by the framework limit (MAX_CONTENT_LENGTH in
+    Flask, client_max_size in aiohttp), which limit_body_size sets.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            from aiohttp import web
+
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                with span('auth'):
+                    rejected = admission_error(request.headers, request.content_length, get_secret(),
+                                               max_body_bytes)
+                if rejected:
+                    status, reason = rejected
+                    logger.warning(f"❌ Rejected webhook from {request.remote}: {reason}")
+                    if status == 413:
+                        raise web.HTTPRequestEntityTooLarge(max_size=max_body_bytes,
+                                                            actual_size=request.content_length)
+                    raise web.HTTPForbidden()
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        from flask import abort, request
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with span('auth'):
+                rejected = admission_error(request.headers, request.content_length, get_secret(), max_body_bytes)
+            if rejected:
+                status, reason = rejected
+                logger.warning(f"❌ Rejected webhook from {request.remote_addr}: {reason}")
+                abort(status)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def limit_body_size(app, max_body_bytes=WEBHOOK_MAX_BODY_BYTES):
+    """Cap request bodies for a Flask app, including chunked bodies without a Content-Length."""
+    app.config['MAX_CONTENT_LENGTH'] = max_body_bytes